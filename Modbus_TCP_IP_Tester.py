@@ -1,17 +1,70 @@
 import customtkinter as ctk
-from tkinter import messagebox
-from pymodbus.client import ModbusTcpClient
-from pymodbus.server import StartTcpServer
-from pymodbus.datastore import ModbusSequentialDataBlock, ModbusSlaveContext, ModbusServerContext
-import threading
+from tkinter import messagebox, filedialog
+from pymodbus.datastore import ModbusServerContext
+import ipaddress
 import logging
+import logging.handlers
 import time
-import socket
+import queue
+import sys
+
+from modbus_tester.alarms import AlarmEngine, append_event_log, parse_rules
+from modbus_tester.change_tracker import ChangeTracker
+from modbus_tester.client_metrics import ClientMetrics, MetricsHTTPServer, write_prometheus
+from modbus_tester.connection_pool import Device, parse_devices
+from modbus_tester.datastore import create_slave_context
+from modbus_tester.discovery import DiscoveryComplete, ListenerFound, NetworkScanner, UnitFound, parse_ranges
+from modbus_tester.export import COMPRESSION, PARQUET, ExportSink
+from modbus_tester.historian import Historian, lttb_decimate, minmax_decimate
+from modbus_tester import server_metrics
+from modbus_tester.server_metrics import ServerMetrics
+from modbus_tester.server_runner import ServerFailed, ServerRunner, ServerStarted, ServerStopped
+from modbus_tester.log_buffer import APP_LOGGER, RingBufferHandler
+from modbus_tester.pipeline import MAX_WINDOW
+from modbus_tester.plant import describe as describe_plant, parse_plant
+from modbus_tester.recorder import CLIENT, SERVER, TransactionRecorder
+from modbus_tester.register_grid import RegisterGrid
+from modbus_tester.scheduler import CATCH_UP, SKIP
+from modbus_tester.simulation import Simulator, parse_signals
+from modbus_tester.snapshot import load_context, save_context
+from modbus_tester.tags import TagMap, parse_tag_map
+from modbus_tester.polling import (
+    PollingEngine, ReadRequest, ConnectionStatus, ReadResult, WriteResult, VerifyResult, ScanComplete
+)
+from modbus_tester.write_planner import MAX_WRITE_COUNT
 
 logging.basicConfig(level=logging.INFO)
 
 __version__ = "1.0.0"
 
+# Modbus data model: each table spans addresses 0-65535.
+ADDRESS_SPACE = 65536
+
+# How often the Tk loop drains results produced by the polling engine and server change notifications.
+POLL_DRAIN_MS = 20
+
+# Register table -> function code that reads it from the server datastore.
+TABLE_FUNCTION_CODES = {"Coils": 1, "Discrete Inputs": 2, "Holding Registers": 3, "Input Registers": 4}
+
+# Log tab: records kept in memory / lines kept in the textbox, and flush period.
+LOG_CAPACITY = 5000
+LOG_FLUSH_MS = 250
+LOG_FILE = "modbus_tester.log"
+LOG_FILE_MAX_BYTES = 1_000_000
+LOG_FILE_BACKUPS = 5
+
+# Statistics tab refresh period and periodic export files.
+STATS_REFRESH_MS = 1000
+STATS_EXPORT_JSONL = "server_stats.jsonl"
+STATS_EXPORT_CSV = "server_stats.csv"
+
+# Trend tab redraw period, selectable time windows (None = all history) and line colours.
+TREND_REFRESH_MS = 1000
+TREND_WINDOWS = {"1 min": 60, "10 min": 600, "1 h": 3600, "All": None}
+TREND_COLORS = ["#1f77b4", "#d62728", "#2ca02c", "#ff7f0e", "#9467bd", "#8c564b", "#e377c2", "#17becf"]
+
+logger = logging.getLogger(APP_LOGGER)
+
 class ModbusTesterApp(ctk.CTk):
     def __init__(self):
         super().__init__()
@@ -21,15 +74,33 @@ class ModbusTesterApp(ctk.CTk):
         ctk.set_default_color_theme("blue")
         
 
-        self.client = None
+        self.poller = None
+        self.device_values = {}
+        self._pending_connects = 0
+        self._cells_changed = 0
+        self._last_refresh = None   # summary of the latest poll, shown in the Statistics tab
+
+        # Everything logged (ours and pymodbus') goes through the ring buffer.
+        self.log_handler = RingBufferHandler(capacity=LOG_CAPACITY, level=logging.INFO)
+        logging.getLogger().addHandler(self.log_handler)
+        self.log_file_handler = None
         self.is_running = False
-        self.server_thread = None
+        self.server = None
+        self.server_metrics = ServerMetrics()
+        self.client_metrics = ClientMetrics()
+        self.metrics_http = None
+        self.simulator = None
+        self.recorder = None
+        self.historian = Historian(retention=3600)
+        self.trend_tags = []
+        self.scanner = None
+        self.discovered = {}
+        self.tag_map = TagMap()
+        self.alarms = None
+        self.exporter = None
+        self._stats_last_export = 0.0
         self.auto_interval = 0
-
-        self.start_addr_holding = 0
-        self.start_addr_input = 0
-        self.start_addr_coils = 0
-        self.start_addr_Dis_input = 0
+        self.server_changes = ChangeTracker()
         self._ip = "127.0.0.1"
         self._port = 1024
 
@@ -40,6 +111,9 @@ class ModbusTesterApp(ctk.CTk):
         self.tabview = ctk.CTkTabview(self)
         self.tab_main = self.tabview.add("Main")
         self.tab_log = self.tabview.add("Log")
+        self.tab_trend = self.tabview.add("Trend")
+        self.tab_discovery = self.tabview.add("Discovery")
+        self.tab_stats = self.tabview.add("Statistics")
         self.tab_settings = self.tabview.add("Settings")
         self.tabview.pack(expand=True, fill="both", padx=10, pady=10)
 
@@ -130,7 +204,8 @@ class ModbusTesterApp(ctk.CTk):
         self.reg_frame.pack(padx=10, pady=10, fill="both", expand=True)
 
         self.reg_types = ["Coils", "Discrete Inputs", "Holding Registers", "Input Registers"]
-        self.reg_entries = {}
+        self.reg_grids = {}
+        self.reg_ranges = {}
         self.watch_vars = {}
 
         self.create_register_section()
@@ -145,6 +220,8 @@ class ModbusTesterApp(ctk.CTk):
         
         # --- Buttons for Server ---
         self.write_to_server_btn = ctk.CTkButton(bottom_frame, text="Write To Server", width=120,  command=self.write_to_server )
+        self.save_snapshot_btn = ctk.CTkButton(bottom_frame, text="Save Snapshot", width=120, command=self.save_snapshot)
+        self.load_snapshot_btn = ctk.CTkButton(bottom_frame, text="Load Snapshot", width=120, command=self.load_snapshot)
 
         self.write_btn.pack(side="right", padx=20)
         self.refresh_btn.pack(side="right", padx=20)
@@ -152,10 +229,54 @@ class ModbusTesterApp(ctk.CTk):
         self.status_label = ctk.CTkLabel(bottom_frame, text="● Disconnected", text_color="red")
         self.status_label.pack(side="left", padx=10)
 
+        # --- Device shown in the register grid (Client) ---
+        self.device_var = ctk.StringVar(value="Main")
+        self.device_menu = ctk.CTkOptionMenu(
+            bottom_frame,
+            variable=self.device_var,
+            values=["Main"],
+            width=160,
+            command=self.on_device_select
+        )
+        self.device_menu.pack(side="left", padx=10)
+
         # --- Log Tab ---
+        log_top_frame = ctk.CTkFrame(self.tab_log)
+        log_top_frame.pack(fill="x", padx=10, pady=(10, 0))
+
+        ctk.CTkLabel(log_top_frame, text="Level:").pack(side="left", padx=(10, 5))
+        self.log_level_var = ctk.StringVar(value="INFO")
+        ctk.CTkOptionMenu(
+            log_top_frame,
+            variable=self.log_level_var,
+            values=["DEBUG", "INFO", "WARNING", "ERROR"],
+            width=110,
+            command=self.change_log_level
+        ).pack(side="left", padx=5)
+
+        self.log_to_file_var = ctk.BooleanVar(value=False)
+        ctk.CTkSwitch(
+            log_top_frame,
+            text=f"Save to {LOG_FILE}",
+            variable=self.log_to_file_var,
+            onvalue=True,
+            offvalue=False,
+            command=self.toggle_log_file
+        ).pack(side="left", padx=20)
+
         self.log_text = ctk.CTkTextbox(self.tab_log, font=("Consolas", 14))
         self.log_text.pack(expand=True, fill="both", padx=10, pady=10)
         self.log("Ready.")
+        self.after(LOG_FLUSH_MS, self._flush_log)
+
+        # --- Trend Tab ---
+        self.create_trend_tab()
+
+        # --- Discovery Tab ---
+        self.create_discovery_tab()
+
+        # --- Statistics Tab ---
+        self.create_statistics_tab()
 
         
         # --- Container for vertical layout ---
@@ -168,10 +289,264 @@ class ModbusTesterApp(ctk.CTk):
         self.settings_reg_entries = {}
         self.settings_create_register_section()
 
-        # --- Main Content ---
-        settings_content_frame = ctk.CTkFrame(settings_main_frame)
+        # --- Main Content (scrolls, so the Apply Settings row below stays on screen) ---
+        settings_content_frame = ctk.CTkScrollableFrame(settings_main_frame)
         settings_content_frame.pack(expand=True, fill="both", pady=(5, 10))
 
+        # --- Polling Options ---
+        ctk.CTkLabel(settings_content_frame, text="Read Gap Tolerance:", anchor="w").grid(row=0, column=0, padx=10, pady=10, sticky="w")
+        self.gap_entry = ctk.CTkEntry(
+            settings_content_frame,
+            width=80,
+            validate="key",
+            validatecommand=(self.register(lambda P: P == "" or (P.isdigit() and int(P) <= 2000)), "%P")
+        )
+        self.gap_entry.insert(0, "0")
+        self.gap_entry.grid(row=0, column=1, padx=5, pady=10, sticky="w")
+        ctk.CTkLabel(
+            settings_content_frame,
+            text="Unwatched addresses allowed between ranges before they are read as one request.",
+            anchor="w"
+        ).grid(row=0, column=2, padx=5, pady=10, sticky="w")
+
+        ctk.CTkLabel(settings_content_frame, text="Max In-Flight / Device:", anchor="w").grid(row=1, column=0, padx=10, pady=10, sticky="w")
+        self.in_flight_entry = ctk.CTkEntry(
+            settings_content_frame,
+            width=80,
+            validate="key",
+            validatecommand=(self.register(lambda P: P == "" or (P.isdigit() and 1 <= int(P) <= 64)), "%P")
+        )
+        self.in_flight_entry.insert(0, "1")
+        self.in_flight_entry.grid(row=1, column=1, padx=5, pady=10, sticky="w")
+        ctk.CTkLabel(
+            settings_content_frame,
+            text="Requests a single device may have outstanding at once.",
+            anchor="w"
+        ).grid(row=1, column=2, padx=5, pady=10, sticky="w")
+
+        # --- Extra Devices (polled alongside the Main IP/Port) ---
+        ctk.CTkLabel(settings_content_frame, text="Extra Devices:", anchor="nw").grid(row=2, column=0, padx=10, pady=10, sticky="nw")
+        self.devices_text = ctk.CTkTextbox(settings_content_frame, height=110, font=("Consolas", 13))
+        self.devices_text.grid(row=2, column=1, columnspan=2, padx=5, pady=10, sticky="ew")
+        self.devices_text.insert("1.0", "# One per line: [name=]host[:port][/unit]\n")
+        settings_content_frame.grid_columnconfigure(2, weight=1)
+
+        # --- Transaction Recording ---
+        self.record_var = ctk.BooleanVar(value=False)
+        ctk.CTkSwitch(
+            settings_content_frame,
+            text="Record Transactions",
+            variable=self.record_var,
+            onvalue=True,
+            offvalue=False
+        ).grid(row=3, column=0, padx=10, pady=10, sticky="w")
+        self.record_path_entry = ctk.CTkEntry(settings_content_frame, width=220)
+        self.record_path_entry.insert(0, "capture.mbtr")
+        self.record_path_entry.grid(row=3, column=1, padx=5, pady=10, sticky="w")
+        ctk.CTkLabel(
+            settings_content_frame,
+            text="Every request/response is written to this file on Start (replay with: python Modbus_TCP_IP_Tester.py replay <file> <host> [-p port]).",
+            anchor="w"
+        ).grid(row=3, column=2, padx=5, pady=10, sticky="w")
+
+        # --- Historian ---
+        ctk.CTkLabel(settings_content_frame, text="History Retention (min):", anchor="w").grid(row=4, column=0, padx=10, pady=10, sticky="w")
+        self.retention_entry = ctk.CTkEntry(
+            settings_content_frame,
+            width=80,
+            validate="key",
+            validatecommand=(self.register(lambda P: P == "" or (P.isdigit() and int(P) <= 1440)), "%P")
+        )
+        self.retention_entry.insert(0, "60")
+        self.retention_entry.grid(row=4, column=1, padx=5, pady=10, sticky="w")
+        ctk.CTkLabel(
+            settings_content_frame,
+            text="How long the Trend tab's tags are kept, from when they are added (0 = don't record).",
+            anchor="w"
+        ).grid(row=4, column=2, padx=5, pady=10, sticky="w")
+
+        # --- Server Signal Simulation ---
+        self.simulate_var = ctk.BooleanVar(value=False)
+        ctk.CTkSwitch(
+            settings_content_frame,
+            text="Simulate Signals",
+            variable=self.simulate_var,
+            onvalue=True,
+            offvalue=False
+        ).grid(row=5, column=0, padx=10, pady=10, sticky="w")
+        self.sim_tick_entry = ctk.CTkEntry(
+            settings_content_frame,
+            width=80,
+            validate="key",
+            validatecommand=(self.register(lambda P: P == "" or (P.isdigit() and int(P) <= 60000)), "%P")
+        )
+        self.sim_tick_entry.insert(0, "100")
+        self.sim_tick_entry.grid(row=5, column=1, padx=5, pady=10, sticky="w")
+        ctk.CTkLabel(
+            settings_content_frame,
+            text="Server mode: tick (ms) at which the signals below are written into the datastore.",
+            anchor="w"
+        ).grid(row=5, column=2, padx=5, pady=10, sticky="w")
+        self.signals_text = ctk.CTkTextbox(settings_content_frame, height=90, font=("Consolas", 13))
+        self.signals_text.grid(row=6, column=1, columnspan=2, padx=5, pady=(0, 10), sticky="ew")
+        self.signals_text.insert(
+            "1.0",
+            "# <hr|ir|co|di> <start>[-<end>] <ramp|sine|noise|step|counter> [period= low= high= step= duty= spread=]\n"
+            "hr 0-999 sine period=10 low=0 high=1000\n"
+        )
+
+        # --- Typed Tags ---
+        ctk.CTkLabel(settings_content_frame, text="Tag Map:", anchor="nw").grid(row=7, column=0, padx=10, pady=10, sticky="nw")
+        self.tag_map_text = ctk.CTkTextbox(settings_content_frame, height=90, font=("Consolas", 13))
+        self.tag_map_text.grid(row=7, column=1, columnspan=2, padx=5, pady=10, sticky="ew")
+        self.tag_map_text.insert(
+            "1.0",
+            "# <hr|ir> <address> <int16|uint16|int32|uint32|int64|uint64|float32|float64|bitfield|string>[*count]"
+            " [order=ABCD|CDAB|BADC|DCBA] [name=..]\n"
+        )
+
+        # --- Poll Scheduling ---
+        ctk.CTkLabel(settings_content_frame, text="Overrun Policy:", anchor="w").grid(row=8, column=0, padx=10, pady=10, sticky="w")
+        self.overrun_policy_var = ctk.StringVar(value="Skip")
+        ctk.CTkOptionMenu(
+            settings_content_frame,
+            variable=self.overrun_policy_var,
+            values=["Skip", "Catch Up"],
+            width=110
+        ).grid(row=8, column=1, padx=5, pady=10, sticky="w")
+        ctk.CTkLabel(
+            settings_content_frame,
+            text="When a poll takes longer than its rate: skip the missed polls, or run them back to back.",
+            anchor="w"
+        ).grid(row=8, column=2, padx=5, pady=10, sticky="w")
+
+        ctk.CTkLabel(settings_content_frame, text="Pipeline Window:", anchor="w").grid(row=9, column=0, padx=10, pady=10, sticky="w")
+        self.pipeline_window_entry = ctk.CTkEntry(
+            settings_content_frame,
+            width=80,
+            validate="key",
+            validatecommand=(self.register(lambda P: P == "" or (P.isdigit() and 1 <= int(P) <= MAX_WINDOW)), "%P")
+        )
+        self.pipeline_window_entry.insert(0, "1")
+        self.pipeline_window_entry.grid(row=9, column=1, padx=5, pady=10, sticky="w")
+        ctk.CTkLabel(
+            settings_content_frame,
+            text="Transactions outstanding per connection (1 = one at a time). Set Max In-Flight at least as high.",
+            anchor="w"
+        ).grid(row=9, column=2, padx=5, pady=10, sticky="w")
+
+        # --- Writes ---
+        self.verify_writes_var = ctk.BooleanVar(value=False)
+        ctk.CTkSwitch(
+            settings_content_frame,
+            text="Verify Writes",
+            variable=self.verify_writes_var,
+            onvalue=True,
+            offvalue=False
+        ).grid(row=10, column=0, padx=10, pady=10, sticky="w")
+        ctk.CTkLabel(
+            settings_content_frame,
+            text="Read edited values back after Write Values (batched) and log any that differ.",
+            anchor="w"
+        ).grid(row=10, column=2, padx=5, pady=10, sticky="w")
+
+        # --- Client Metrics Export ---
+        ctk.CTkLabel(settings_content_frame, text="Prometheus File:", anchor="w").grid(row=11, column=0, padx=10, pady=10, sticky="w")
+        self.prometheus_path_entry = ctk.CTkEntry(settings_content_frame, width=220)
+        self.prometheus_path_entry.grid(row=11, column=1, padx=5, pady=10, sticky="w")
+        ctk.CTkLabel(
+            settings_content_frame,
+            text="Client request metrics rewritten here every second, e.g. for node_exporter's textfile collector (blank = off).",
+            anchor="w"
+        ).grid(row=11, column=2, padx=5, pady=10, sticky="w")
+
+        ctk.CTkLabel(settings_content_frame, text="Metrics HTTP Port:", anchor="w").grid(row=12, column=0, padx=10, pady=10, sticky="w")
+        self.metrics_port_entry = ctk.CTkEntry(
+            settings_content_frame,
+            width=80,
+            validate="key",
+            validatecommand=(self.register(lambda P: P == "" or (P.isdigit() and int(P) <= 65535)), "%P")
+        )
+        self.metrics_port_entry.grid(row=12, column=1, padx=5, pady=10, sticky="w")
+        ctk.CTkLabel(
+            settings_content_frame,
+            text="Serve the same metrics at http://127.0.0.1:<port>/metrics while Client mode runs (blank = off).",
+            anchor="w"
+        ).grid(row=12, column=2, padx=5, pady=10, sticky="w")
+
+        # --- Simulated Plant ---
+        ctk.CTkLabel(settings_content_frame, text="Plant Devices:", anchor="nw").grid(row=13, column=0, padx=10, pady=10, sticky="nw")
+        self.plant_text = ctk.CTkTextbox(settings_content_frame, height=90, font=("Consolas", 13))
+        self.plant_text.grid(row=13, column=1, columnspan=2, padx=5, pady=10, sticky="ew")
+        self.plant_text.insert(
+            "1.0",
+            "# Server mode: extra ports on the same IP, each with its own unit IDs and datastores\n"
+            "# <ports> <units> [size=N] [delay=ms] [jitter=ms] [errors=fraction] [code=N] [drop=fraction]\n"
+            "# 1502 1-247 size=1000\n"
+            "# 5020-5029 1 delay=20 jitter=30 errors=0.01\n"
+        )
+
+        # --- Alarms ---
+        ctk.CTkLabel(settings_content_frame, text="Alarm Rules:", anchor="nw").grid(row=14, column=0, padx=10, pady=10, sticky="nw")
+        self.alarm_rules_text = ctk.CTkTextbox(settings_content_frame, height=90, font=("Consolas", 13))
+        self.alarm_rules_text.grid(row=14, column=1, columnspan=2, padx=5, pady=10, sticky="ew")
+        self.alarm_rules_text.insert(
+            "1.0",
+            "# Client mode, checked on every poll of a watched range:\n"
+            "# alarm <name> <expression> [deadband=x] [write=hr<addr>:<value>] [log=<file>]\n"
+            "# cov <name> <symbol> [deadband=x] [write=..] [log=..]\n"
+            "# alarm high_temp temp > 80 deadband=2 write=co10:1\n"
+            "# alarm pump_fault hr5 & 0x04\n"
+        )
+
+        # --- Sample Export ---
+        self.export_var = ctk.BooleanVar(value=False)
+        ctk.CTkSwitch(
+            settings_content_frame,
+            text="Export Samples",
+            variable=self.export_var,
+            onvalue=True,
+            offvalue=False
+        ).grid(row=15, column=0, padx=10, pady=10, sticky="w")
+        self.export_path_entry = ctk.CTkEntry(settings_content_frame, width=220)
+        self.export_path_entry.insert(0, "samples.csv")
+        self.export_path_entry.grid(row=15, column=1, padx=5, pady=10, sticky="w")
+        ctk.CTkLabel(
+            settings_content_frame,
+            text="Client mode: every polled value is streamed to .csv, .csv.gz or .parquet files named by start time.",
+            anchor="w"
+        ).grid(row=15, column=2, padx=5, pady=10, sticky="w")
+
+        ctk.CTkLabel(settings_content_frame, text="Export Rotation (MB / min):", anchor="w").grid(row=16, column=0, padx=10, pady=10, sticky="w")
+        rotation_frame = ctk.CTkFrame(settings_content_frame, fg_color="transparent")
+        rotation_frame.grid(row=16, column=1, padx=5, pady=10, sticky="w")
+        digits = (self.register(lambda P: P == "" or P.isdigit()), "%P")
+        self.export_mb_entry = ctk.CTkEntry(rotation_frame, width=70, validate="key", validatecommand=digits)
+        self.export_mb_entry.insert(0, "100")
+        self.export_mb_entry.pack(side="left")
+        self.export_min_entry = ctk.CTkEntry(rotation_frame, width=70, validate="key", validatecommand=digits)
+        self.export_min_entry.insert(0, "60")
+        self.export_min_entry.pack(side="left", padx=(10, 0))
+        ctk.CTkLabel(
+            settings_content_frame,
+            text="Start a new export file at this size or age (blank or 0 = never).",
+            anchor="w"
+        ).grid(row=16, column=2, padx=5, pady=10, sticky="w")
+
+        ctk.CTkLabel(settings_content_frame, text="Export Compression:", anchor="w").grid(row=17, column=0, padx=10, pady=10, sticky="w")
+        self.export_compression_var = ctk.StringVar(value="none")
+        ctk.CTkOptionMenu(
+            settings_content_frame,
+            variable=self.export_compression_var,
+            values=list(COMPRESSION[PARQUET]),
+            width=110
+        ).grid(row=17, column=1, padx=5, pady=10, sticky="w")
+        ctk.CTkLabel(
+            settings_content_frame,
+            text="CSV: none or gzip. Parquet (needs pyarrow): any.",
+            anchor="w"
+        ).grid(row=17, column=2, padx=5, pady=10, sticky="w")
+
         # --- Bottom Controls ---
         settings_bottom_frame = ctk.CTkFrame(settings_main_frame)
         settings_bottom_frame.pack(side="bottom", fill="x", pady=5)
@@ -193,6 +568,463 @@ class ModbusTesterApp(ctk.CTk):
         theme_label = ctk.CTkLabel(settings_bottom_frame, text="Theme:")
         theme_label.pack(side="right", padx=(0, 5))
 
+    def create_trend_tab(self):
+        """Historian charts: pick tags, a time window and a decimation method."""
+        controls = ctk.CTkFrame(self.tab_trend)
+        controls.pack(fill="x", padx=10, pady=(10, 5))
+
+        self.trend_device_var = ctk.StringVar(value="Main")
+        self.trend_device_menu = ctk.CTkOptionMenu(controls, variable=self.trend_device_var, values=["Main"], width=120)
+        self.trend_device_menu.pack(side="left", padx=(10, 5))
+        self.trend_type_var = ctk.StringVar(value="Holding Registers")
+        ctk.CTkOptionMenu(controls, variable=self.trend_type_var, values=self.reg_types, width=160).pack(side="left", padx=5)
+        ctk.CTkLabel(controls, text="Address:").pack(side="left", padx=(10, 5))
+        self.trend_addr_entry = ctk.CTkEntry(
+            controls,
+            width=70,
+            validate="key",
+            validatecommand=(self.register(lambda P: P == "" or (P.isdigit() and int(P) <= 65535)), "%P")
+        )
+        self.trend_addr_entry.insert(0, "0")
+        self.trend_addr_entry.pack(side="left", padx=5)
+        ctk.CTkButton(controls, text="Add", width=60, command=self.add_trend_tag).pack(side="left", padx=5)
+        ctk.CTkButton(controls, text="Clear", width=60, command=self.clear_trend_tags).pack(side="left", padx=5)
+        ctk.CTkButton(controls, text="Clear History", width=110, command=self.historian.clear).pack(side="left", padx=5)
+
+        self.trend_method_var = ctk.StringVar(value="Min/Max")
+        ctk.CTkOptionMenu(controls, variable=self.trend_method_var, values=["Min/Max", "LTTB"], width=100,
+                          command=lambda _: self.draw_trend()).pack(side="right", padx=(5, 10))
+        self.trend_window_var = ctk.StringVar(value="10 min")
+        ctk.CTkOptionMenu(controls, variable=self.trend_window_var, values=list(TREND_WINDOWS), width=90,
+                          command=lambda _: self.draw_trend()).pack(side="right", padx=5)
+        ctk.CTkLabel(controls, text="Window:").pack(side="right", padx=(10, 0))
+
+        self.trend_canvas = ctk.CTkCanvas(self.tab_trend, highlightthickness=0)
+        self.trend_canvas.pack(expand=True, fill="both", padx=10, pady=5)
+        self.trend_info = ctk.CTkLabel(self.tab_trend, text="", anchor="w")
+        self.trend_info.pack(fill="x", padx=10, pady=(0, 10))
+
+        self.after(TREND_REFRESH_MS, self._refresh_trend)
+
+    def add_trend_tag(self):
+        try:
+            address = int(self.trend_addr_entry.get())
+        except ValueError:
+            self.log("Trend: enter an address first.", logging.WARNING)
+            return
+        tag = (self.trend_device_var.get(), self.trend_type_var.get(), address)
+        if tag in self.trend_tags:
+            return
+        if len(self.trend_tags) >= len(TREND_COLORS):
+            self.log(f"Trend: at most {len(TREND_COLORS)} tags can be shown at once.", logging.WARNING)
+            return
+        self.trend_tags.append(tag)
+        self.historian.watch(tag)
+        self.draw_trend()
+
+    def clear_trend_tags(self):
+        self.trend_tags.clear()
+        self.historian.set_watched(())
+        self.draw_trend()
+
+    def _refresh_trend(self):
+        if self.tabview.get() == "Trend":
+            self.draw_trend()
+        self.after(TREND_REFRESH_MS, self._refresh_trend)
+
+    def draw_trend(self):
+        """Redraw the selected tags, decimated to roughly one point per horizontal pixel."""
+        canvas = self.trend_canvas
+        dark = ctk.get_appearance_mode() == "Dark"
+        bg, fg, grid_color = ("#2b2b2b", "#dce4ee", "#444444") if dark else ("white", "#1a1a1a", "#dddddd")
+        canvas.configure(bg=bg)
+        canvas.delete("all")
+        width, height = canvas.winfo_width(), canvas.winfo_height()
+        left, right, top, bottom = 70, 15, 30, 30
+        plot_w, plot_h = width - left - right, height - top - bottom
+        if plot_w < 50 or plot_h < 50:
+            return
+
+        window = TREND_WINDOWS[self.trend_window_var.get()]
+        now = time.time()
+        start = now - window if window else None
+        started = time.perf_counter()
+        samples = 0
+        series = []
+        for tag in self.trend_tags:
+            times, values = self.historian.query(tag, start)
+            samples += len(times)
+            if self.trend_method_var.get() == "LTTB":
+                times, values = lttb_decimate(times, values, plot_w)
+            else:
+                times, values = minmax_decimate(times, values, plot_w // 2)
+            series.append((tag, times, values))
+        drawn = [entry for entry in series if entry[1]]
+
+        if not drawn:
+            canvas.create_text(width // 2, height // 2, fill=fg,
+                               text="Add a tag above and start polling it" if not self.trend_tags else "No samples yet")
+            self.trend_info.configure(text=f"{self.historian.sample_count()} samples in history")
+            return
+
+        t_lo = start if start is not None else min(times[0] for _, times, _ in drawn)
+        t_hi = now if start is not None else max(times[-1] for _, times, _ in drawn)
+        v_lo = min(min(values) for _, _, values in drawn)
+        v_hi = max(max(values) for _, _, values in drawn)
+        if v_hi == v_lo:
+            v_lo, v_hi = v_lo - 1, v_hi + 1
+        if t_hi <= t_lo:
+            t_hi = t_lo + 1
+        x_scale = plot_w / (t_hi - t_lo)
+        y_scale = plot_h / (v_hi - v_lo)
+
+        # Grid, value axis and time axis
+        for i in range(5):
+            y = top + plot_h * i / 4
+            canvas.create_line(left, y, left + plot_w, y, fill=grid_color)
+            canvas.create_text(left - 5, y, anchor="e", fill=fg, text=f"{v_hi - (v_hi - v_lo) * i / 4:g}")
+        for i in range(5):
+            x = left + plot_w * i / 4
+            canvas.create_line(x, top, x, top + plot_h, fill=grid_color)
+            stamp = time.strftime("%H:%M:%S", time.localtime(t_lo + (t_hi - t_lo) * i / 4))
+            canvas.create_text(x, top + plot_h + 5, anchor="n", fill=fg, text=stamp)
+        canvas.create_rectangle(left, top, left + plot_w, top + plot_h, outline=fg)
+
+        points = 0
+        legend_x = left
+        for index, (tag, times, values) in enumerate(series):
+            color = TREND_COLORS[index % len(TREND_COLORS)]
+            device, reg_type, address = tag
+            label = f"{device} {self.complete_address(reg_type=reg_type, start=address)}"
+            item = canvas.create_text(legend_x, top - 8, anchor="sw", fill=color, text=label)
+            legend_x = canvas.bbox(item)[2] + 15
+            coords = []
+            for t, v in zip(times, values):
+                coords.append(left + (t - t_lo) * x_scale)
+                coords.append(top + (v_hi - v) * y_scale)
+            points += len(times)
+            if len(times) > 1:
+                canvas.create_line(*coords, fill=color, width=1.5)
+            elif times:
+                x, y = coords
+                canvas.create_oval(x - 2, y - 2, x + 2, y + 2, fill=color, outline=color)
+
+        self.trend_info.configure(
+            text=f"{samples} samples in window → {points} points drawn "
+                 f"({(time.perf_counter() - started) * 1000:.1f} ms)"
+        )
+
+    def create_discovery_tab(self):
+        """Scan a network for Modbus TCP listeners and the unit IDs that answer behind them."""
+        controls = ctk.CTkFrame(self.tab_discovery)
+        controls.pack(fill="x", padx=10, pady=(10, 5))
+
+        self.discovery_entries = {}
+        fields = [
+            ("network", "Network:", f"{self._ip}/24", 160),
+            ("ports", "Ports:", "502", 110),
+            ("units", "Unit IDs:", "1-247", 80),
+            ("concurrency", "Concurrency:", "256", 60),
+            ("timeout", "Timeout (ms):", "500", 60),
+        ]
+        for key, text, default, width in fields:
+            ctk.CTkLabel(controls, text=text).pack(side="left", padx=(10, 5))
+            entry = ctk.CTkEntry(controls, width=width)
+            entry.insert(0, default)
+            entry.pack(side="left", padx=(0, 5))
+            self.discovery_entries[key] = entry
+
+        self.scan_stop_btn = ctk.CTkButton(controls, text="Stop", width=70, fg_color="red", state="disabled",
+                                           command=self.stop_discovery)
+        self.scan_stop_btn.pack(side="right", padx=(5, 10))
+        self.scan_btn = ctk.CTkButton(controls, text="Scan", width=70, fg_color="green", command=self.start_discovery)
+        self.scan_btn.pack(side="right", padx=5)
+
+        self.discovery_text = ctk.CTkTextbox(self.tab_discovery, font=("Consolas", 14))
+        self.discovery_text.pack(expand=True, fill="both", padx=10, pady=5)
+
+        discovery_bottom = ctk.CTkFrame(self.tab_discovery)
+        discovery_bottom.pack(side="bottom", fill="x", padx=10, pady=(5, 10))
+        self.discovery_status = ctk.CTkLabel(discovery_bottom, text="Idle", anchor="w")
+        self.discovery_status.pack(side="left", padx=10)
+        ctk.CTkButton(discovery_bottom, text="Add to Extra Devices", width=160,
+                      command=self.add_discovered_devices).pack(side="right", padx=10)
+
+    def start_discovery(self):
+        entries = {key: entry.get().strip() for key, entry in self.discovery_entries.items()}
+        try:
+            timeout = max(10, int(entries["timeout"])) / 1000
+            self.scanner = NetworkScanner(
+                entries["network"],
+                ports=parse_ranges(entries["ports"]),
+                units=parse_ranges(entries["units"], 0, 255, "unit ID") if entries["units"] else [],
+                concurrency=max(1, int(entries["concurrency"])),
+                connect_timeout=timeout,
+                probe_timeout=timeout,
+            )
+        except ValueError as e:
+            self.log(f"Discovery: {e}", logging.ERROR)
+            return
+        self.discovered = {}
+        self._render_discovery()
+        self.scan_btn.configure(state="disabled")
+        self.scan_stop_btn.configure(state="normal")
+        self.log(f"Discovery: scanning {self.scanner.total} host/port combinations in {entries['network']}")
+        self.scanner.start()
+        self.after(POLL_DRAIN_MS, self._drain_discovery_queue)
+
+    def stop_discovery(self):
+        if self.scanner:
+            self.scanner.stop()
+
+    def _drain_discovery_queue(self):
+        """Stream scanner events into the Discovery tab (runs on the Tk thread)."""
+        scanner = self.scanner
+        if scanner is None:
+            return
+        changed = False
+        done = None
+        try:
+            while True:
+                event = scanner.results.get_nowait()
+                if isinstance(event, ListenerFound):
+                    self.discovered.setdefault((event.host, event.port), {})
+                    changed = True
+                elif isinstance(event, UnitFound):
+                    self.discovered.setdefault((event.host, event.port), {})[event.unit_id] = event.detail
+                    changed = True
+                elif isinstance(event, DiscoveryComplete):
+                    done = event
+        except queue.Empty:
+            pass
+        if changed:
+            self._render_discovery()
+        self.discovery_status.configure(
+            text=f"Scanned {scanner.scanned}/{scanner.total} · {scanner.listeners} listeners · "
+                 f"{scanner.units_found} units"
+        )
+        if done is None:
+            self.after(POLL_DRAIN_MS, self._drain_discovery_queue)
+            return
+        self.scanner = None
+        self.scan_btn.configure(state="normal")
+        self.scan_stop_btn.configure(state="disabled")
+        if done.error:
+            self.log(f"Discovery failed: {done.error}", logging.ERROR)
+        else:
+            self.log(
+                f"Discovery {'cancelled' if done.cancelled else 'finished'} in {done.duration:.1f} s: "
+                f"{done.listeners} listeners, {done.units} units."
+            )
+
+    def _render_discovery(self):
+        lines = []
+        def by_address(item):
+            (host, port), _ = item
+            ip = ipaddress.ip_address(host)
+            return ip.version, int(ip), port
+
+        for (host, port), units in sorted(self.discovered.items(), key=by_address):
+            ids = sorted(units)
+            spans = []
+            for unit in ids:
+                if spans and unit == spans[-1][1] + 1:
+                    spans[-1][1] = unit
+                else:
+                    spans.append([unit, unit])
+            text = ", ".join(f"{lo}" if lo == hi else f"{lo}-{hi}" for lo, hi in spans) or "none answered"
+            exceptions = sum(1 for detail in units.values() if detail != "ok")
+            suffix = f"  ({exceptions} with exception replies)" if exceptions else ""
+            lines.append(f"{host + ':' + str(port):<22} units: {text}{suffix}")
+        self.discovery_text.delete("1.0", "end")
+        self.discovery_text.insert("1.0", "\n".join(lines))
+
+    def add_discovered_devices(self):
+        """Append every discovered unit to the Settings tab's Extra Devices list."""
+        existing = set(self.devices_text.get("1.0", "end").split())
+        added = 0
+        for (host, port), units in sorted(self.discovered.items()):
+            for unit in sorted(units):
+                line = f"{host}:{port}/{unit}"
+                if line not in existing:
+                    self.devices_text.insert("end", line + "\n")
+                    added += 1
+        self.log(f"Added {added} discovered device(s) to Extra Devices.")
+
+    def create_statistics_tab(self):
+        """Server-mode request counters, client request latency, handling times and export controls."""
+        summary_frame = ctk.CTkFrame(self.tab_stats)
+        summary_frame.pack(fill="x", padx=10, pady=(10, 5))
+
+        self.stats_labels = {}
+        fields = [
+            ("requests", "Requests"), ("requests_per_s", "Req/s"),
+            ("active_connections", "Active Conns"), ("total_connections", "Total Conns"),
+            ("bytes_in", "Bytes In"), ("bytes_out", "Bytes Out"),
+            ("exceptions", "Exceptions"), ("handle_time", "Handle p50/p95/p99/max (ms)"),
+        ]
+        for i, (key, text) in enumerate(fields):
+            row, col = divmod(i, 4)
+            summary_frame.grid_columnconfigure(col * 2 + 1, weight=1)
+            ctk.CTkLabel(summary_frame, text=f"{text}:", font=("Consolas", 14, "bold"), anchor="e").grid(
+                row=row, column=col * 2, padx=(10, 5), pady=5, sticky="e")
+            label = ctk.CTkLabel(summary_frame, text="0", font=("Consolas", 14), anchor="w")
+            label.grid(row=row, column=col * 2 + 1, padx=5, pady=5, sticky="w")
+            self.stats_labels[key] = label
+
+        self.stats_text = ctk.CTkTextbox(self.tab_stats, font=("Consolas", 14))
+        self.stats_text.pack(expand=True, fill="both", padx=10, pady=5)
+
+        stats_bottom_frame = ctk.CTkFrame(self.tab_stats)
+        stats_bottom_frame.pack(side="bottom", fill="x", padx=10, pady=(5, 10))
+
+        ctk.CTkButton(stats_bottom_frame, text="Export JSON", width=120, command=lambda: self.export_stats("json")).pack(side="left", padx=10)
+        ctk.CTkButton(stats_bottom_frame, text="Export CSV", width=120, command=lambda: self.export_stats("csv")).pack(side="left", padx=10)
+        ctk.CTkButton(stats_bottom_frame, text="Reset", width=80, command=self.reset_stats).pack(side="left", padx=10)
+
+        self.stats_auto_export_var = ctk.BooleanVar(value=False)
+        ctk.CTkSwitch(
+            stats_bottom_frame,
+            text="Auto-export",
+            variable=self.stats_auto_export_var,
+            onvalue=True,
+            offvalue=False
+        ).pack(side="right", padx=10)
+        self.stats_export_format = ctk.StringVar(value="CSV")
+        ctk.CTkOptionMenu(stats_bottom_frame, variable=self.stats_export_format, values=["CSV", "JSON"], width=80).pack(side="right", padx=5)
+        self.stats_export_interval = ctk.CTkEntry(stats_bottom_frame, width=50)
+        self.stats_export_interval.insert(0, "10")
+        self.stats_export_interval.pack(side="right", padx=5)
+        ctk.CTkLabel(stats_bottom_frame, text="Every (s):").pack(side="right", padx=(10, 0))
+
+        self.after(STATS_REFRESH_MS, self._refresh_stats)
+
+    def _refresh_stats(self):
+        """Redraw the Statistics tab and run the periodic export if it is due."""
+        snap = self.server_metrics.snapshot()
+        handle = snap["handle_time_ms"]
+        values = {
+            "requests": snap["requests"],
+            "requests_per_s": snap["requests_per_s"],
+            "active_connections": snap["active_connections"],
+            "total_connections": snap["total_connections"],
+            "bytes_in": snap["bytes_in"],
+            "bytes_out": snap["bytes_out"],
+            "exceptions": sum(snap["exceptions"].values()),
+            "handle_time": f"{handle['p50']} / {handle['p95']} / {handle['p99']} / {handle['max']}",
+        }
+        for key, val in values.items():
+            self.stats_labels[key].configure(text=str(val))
+
+        lines = ["By function code:"]
+        lines += [f"  FC{fc:<4} {n}" for fc, n in snap["by_function"].items()]
+        lines += ["", "By unit ID:"]
+        lines += [f"  {unit:<6} {n}" for unit, n in snap["by_unit"].items()]
+        lines += ["", "By client:"]
+        lines += [f"  {client:<22} {n}" for client, n in snap["by_client"].items()]
+        if snap["exceptions"]:
+            lines += ["", "Exception responses:"]
+            lines += [f"  code {code:<3} {n}" for code, n in snap["exceptions"].items()]
+        if self.poller:
+            groups = self.poller.schedule_stats()
+            if groups:
+                lines += ["", "Client poll groups (device, rate, priority: runs / overruns / skipped / deferred, "
+                              "jitter p50/p99/max ms, last poll ms):"]
+            for group in groups:
+                jitter = group["jitter_ms"]
+                backoff = f"  backing off {group['backoff_s']:.1f} s" if group["backoff_s"] else ""
+                lines.append(
+                    f"  {group['device']:<16} {group['interval_ms']:>8} ms  p{group['priority']:<3} "
+                    f"{group['runs']} / {group['overruns']} / {group['skipped']} / {group['deferred']}  "
+                    f"{jitter['p50']}/{jitter['p99']}/{jitter['max']}  {group['last_ms']}{backoff}"
+                )
+            if self._last_refresh:
+                lines += ["", f"Last poll: {self._last_refresh}"]
+        lines += self._client_metrics_lines()
+        if self.alarms:
+            active = self.alarms.active()
+            lines += ["", f"Alarms ({len(active)} active, {self.alarms.evaluations} rule evaluations, "
+                          f"{self.alarms.errors} evaluation errors):"]
+            lines += [
+                f"  {device:<16} {name:<24} since {time.strftime('%H:%M:%S', time.localtime(since))}"
+                for device, name, since in active
+            ]
+        if self.exporter:
+            lines += ["", f"Export: {self.exporter.rows} samples written, {self.exporter.dropped} dropped, "
+                          f"{len(self.exporter.paths)} file(s), now {self.exporter.path}"]
+        self.stats_text.delete("1.0", "end")
+        self.stats_text.insert("1.0", "\n".join(lines))
+
+        prometheus_path = self.prometheus_path_entry.get().strip()
+        if prometheus_path and self.poller:
+            try:
+                write_prometheus(prometheus_path, self.client_metrics)
+            except OSError as e:
+                self.prometheus_path_entry.delete(0, "end")
+                self.log(f"Error writing {prometheus_path}: {e}; Prometheus file export disabled.", logging.ERROR)
+
+        if self.stats_auto_export_var.get():
+            try:
+                period = max(1.0, float(self.stats_export_interval.get()))
+            except ValueError:
+                period = 10.0
+            if time.time() - self._stats_last_export >= period:
+                self._stats_last_export = time.time()
+                try:
+                    if self.stats_export_format.get() == "CSV":
+                        server_metrics.append_csv(STATS_EXPORT_CSV, snap)
+                    else:
+                        server_metrics.append_jsonl(STATS_EXPORT_JSONL, snap)
+                except OSError as e:
+                    self.stats_auto_export_var.set(False)
+                    self.log(f"Error exporting statistics: {e}", logging.ERROR)
+
+        self.after(STATS_REFRESH_MS, self._refresh_stats)
+
+    def _client_metrics_lines(self):
+        """Per-device, per-function-code client latency and error counters for the Statistics tab."""
+        devices = self.client_metrics.snapshot()["devices"]
+        if not devices:
+            return []
+        lines = ["", "Client requests (device, FC: requests, p50/p99/max ms, timeouts, exceptions):"]
+        for name, device in devices.items():
+            lines.append(
+                f"  {name:<16} connects {device['connects']}  reconnects {device['reconnects']}  "
+                f"failed connects {device['connect_failures']}"
+            )
+            for fc, entry in device["functions"].items():
+                latency = entry["latency_ms"]
+                exceptions = ", ".join(f"{code}x{n}" for code, n in entry["exceptions"].items()) or "0"
+                errors = f"  errors {entry['errors']}" if entry["errors"] else ""
+                lines.append(
+                    f"    FC{fc:<4} {entry['requests']:>8}  {latency['p50']}/{latency['p99']}/{latency['max']}  "
+                    f"timeouts {entry['timeouts']}  exceptions {exceptions}{errors}"
+                )
+        return lines
+
+    def reset_stats(self):
+        self.server_metrics.reset()
+        self.client_metrics.reset()
+
+    def export_stats(self, fmt):
+        """Save the current statistics snapshot to a file chosen by the user."""
+        path = filedialog.asksaveasfilename(
+            defaultextension=f".{fmt}",
+            filetypes=[(fmt.upper(), f"*.{fmt}")],
+            initialfile=f"server_stats.{fmt}"
+        )
+        if not path:
+            return
+        snap = self.server_metrics.snapshot()
+        try:
+            if fmt == "json":
+                server_metrics.write_json(path, snap)
+            else:
+                server_metrics.append_csv(path, snap)
+            self.log(f"Statistics exported to {path}")
+        except OSError as e:
+            self.log(f"Error exporting statistics: {e}", logging.ERROR)
+
     def change_appearance_mode(self, mode):
         ctk.set_appearance_mode(mode.lower())
         self.log(f"Appearance changed to {mode} Mode")
@@ -203,8 +1035,18 @@ class ModbusTesterApp(ctk.CTk):
         for widget in self.reg_frame.winfo_children():
             widget.destroy()
 
+        try:
+            self.tag_map = parse_tag_map(self.tag_map_text.get("1.0", "end"))
+        except ValueError as e:
+            self.log(f"Invalid tag map, showing raw registers: {e}", logging.ERROR)
+            self.tag_map = TagMap()
+
         # Recreate register section based on updated settings
         self.create_register_section()
+        self._refresh_server_view()
+        if self.poller and self.is_running:
+            # The running poller still has the old ranges; give it the rebuilt (unwatched) tables.
+            self.poller.set_requests(self._watched_read_requests())
 
         self.log("Settings applied to main register view.")
 
@@ -217,7 +1059,7 @@ class ModbusTesterApp(ctk.CTk):
                 return True  # allow clearing
             if P.isdigit():
                 val = int(P)
-                return 0 <= val <= 9999
+                return 0 <= val < ADDRESS_SPACE
             return False
 
         def validate_range(P):
@@ -225,12 +1067,20 @@ class ModbusTesterApp(ctk.CTk):
                 return True
             if P.isdigit():
                 val = int(P)
-                return 1 <= val <= 10
+                return 1 <= val <= ADDRESS_SPACE
             return False
 
+        def validate_rate(P):
+            return P == "" or (P.isdigit() and int(P) <= 3600000)
+
+        def validate_priority(P):
+            return P in ("", "-") or P.lstrip("-").isdigit()
+
         # Register these validation commands with tkinter
         validate_start_cmd = self.register(validate_start_addr)
         validate_range_cmd = self.register(validate_range)
+        validate_rate_cmd = self.register(validate_rate)
+        validate_priority_cmd = self.register(validate_priority)
 
         # --- Now create one column per register type ---
         for col, reg_type in enumerate(self.reg_types):
@@ -279,6 +1129,29 @@ class ModbusTesterApp(ctk.CTk):
             range_entry.grid(row=2, column=1, padx=5, pady=5, sticky="w")
             self.settings_reg_entries[reg_type]["addr_range"] = range_entry
 
+            # --- Poll Rate / Priority (Client) ---
+            ctk.CTkLabel(frame, text="Poll (ms):", anchor="w").grid(row=3, column=0, padx=5, pady=5, sticky="ew")
+            rate_entry = ctk.CTkEntry(
+                frame,
+                width=80,
+                placeholder_text="Refresh",
+                validate="key",
+                validatecommand=(validate_rate_cmd, "%P")
+            )
+            rate_entry.grid(row=3, column=1, padx=5, pady=5, sticky="w")
+            self.settings_reg_entries[reg_type]["poll_ms"] = rate_entry
+
+            ctk.CTkLabel(frame, text="Priority:", anchor="w").grid(row=4, column=0, padx=5, pady=5, sticky="ew")
+            priority_entry = ctk.CTkEntry(
+                frame,
+                width=80,
+                validate="key",
+                validatecommand=(validate_priority_cmd, "%P")
+            )
+            priority_entry.insert(0, "0")
+            priority_entry.grid(row=4, column=1, padx=5, pady=5, sticky="w")
+            self.settings_reg_entries[reg_type]["priority"] = priority_entry
+
     def create_register_section(self):
         """Create register rows in the main tab (uses settings for start and range)."""
         for col, reg_type in enumerate(self.reg_types):
@@ -309,6 +1182,7 @@ class ModbusTesterApp(ctk.CTk):
                 height=25,
                 switch_width=30,
                 switch_height=15,
+                command=self._on_watch_toggle
             ).grid(row=1, column=0, columnspan=2, pady=(0, 10))
 
             # Read range and start address (default 0, 10)
@@ -318,17 +1192,23 @@ class ModbusTesterApp(ctk.CTk):
             except Exception:
                 start_addr, count = 0, 10
 
-            # Register rows
-            entries = []
-            for i in range(count):
-                Reg_type_addr = self.complete_address(reg_type=reg_type, start=start_addr + i)
-                ctk.CTkLabel(frame, text=f"{Reg_type_addr}:").grid(row=i + 2, column=0, padx=5, pady=2, sticky="ew")
+            # Never run past the end of the address space
+            count = max(1, min(count, ADDRESS_SPACE - start_addr))
 
-                entry = ctk.CTkEntry(frame)
-                entry.grid(row=i + 2, column=1, padx=5, pady=5, sticky="w")
-                entries.append(entry)
+            # Register table (only the visible rows get widgets)
+            frame.grid_rowconfigure(2, weight=1)
+            grid = RegisterGrid(
+                frame,
+                start=start_addr,
+                count=count,
+                bits=reg_type in ("Coils", "Discrete Inputs"),
+                address_format=lambda addr, t=reg_type: self.complete_address(reg_type=t, start=addr),
+                layout=self.tag_map.layout(reg_type, start_addr, count)
+            )
+            grid.grid(row=2, column=0, columnspan=2, padx=5, pady=5, sticky="nsew")
 
-            self.reg_entries[reg_type] = entries
+            self.reg_grids[reg_type] = grid
+            self.reg_ranges[reg_type] = (start_addr, count)
 
         self.reg_frame.grid_rowconfigure(0, weight=1)
 
@@ -349,13 +1229,51 @@ class ModbusTesterApp(ctk.CTk):
             case "Input Registers":
                 Reg_type_addr = 30000+start
             case _:
-                self.log("error : unknown value.")
+                self.log("error : unknown value.", logging.ERROR)
         
         return Reg_type_addr
 
-    def log(self, message):
-        self.log_text.insert("end", message + "\n")
-        self.log_text.see("end")
+    def log(self, message, level=logging.INFO):
+        logger.log(level, message)
+
+    def _flush_log(self):
+        """Append buffered log records to the Log tab in one batch, keeping at most LOG_CAPACITY lines."""
+        records = self.log_handler.drain()
+        if records:
+            self.log_text.insert("end", "\n".join(line for _, _, line in records) + "\n")
+            excess = int(self.log_text.index("end-1c").split(".")[0]) - 1 - LOG_CAPACITY
+            if excess > 0:
+                self.log_text.delete("1.0", f"{excess + 1}.0")
+            self.log_text.see("end")
+        self.after(LOG_FLUSH_MS, self._flush_log)
+
+    def change_log_level(self, level_name):
+        level = getattr(logging, level_name)
+        self.log_handler.setLevel(level)
+        logging.getLogger().setLevel(min(level, logging.INFO))
+        self.log(f"Log level set to {level_name}")
+
+    def toggle_log_file(self):
+        """Start or stop mirroring the log to a size-rotated file on disk."""
+        root = logging.getLogger()
+        if self.log_to_file_var.get():
+            try:
+                self.log_file_handler = logging.handlers.RotatingFileHandler(
+                    LOG_FILE, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding="utf-8"
+                )
+            except OSError as e:
+                self.log_to_file_var.set(False)
+                self.log(f"Unable to open {LOG_FILE}: {e}", logging.ERROR)
+                return
+            self.log_file_handler.setFormatter(self.log_handler.formatter)
+            self.log_file_handler.setLevel(self.log_handler.level)
+            root.addHandler(self.log_file_handler)
+            self.log(f"Logging to {LOG_FILE}")
+        elif self.log_file_handler is not None:
+            self.log(f"Stopped logging to {LOG_FILE}")
+            root.removeHandler(self.log_file_handler)
+            self.log_file_handler.close()
+            self.log_file_handler = None
 
     def on_mode_change(self, mode):
         if mode == "Client":
@@ -364,30 +1282,34 @@ class ModbusTesterApp(ctk.CTk):
             self.interval_entry.delete(0, "end")
             self.interval_entry.insert(0, "00")
             self.write_to_server_btn.pack_forget()
+            self.save_snapshot_btn.pack_forget()
+            self.load_snapshot_btn.pack_forget()
+            self.device_menu.pack(side="left", padx=10)
         else:
             self.auto_interval = 2
             self.interval_entry.delete(0, "end")
             self.interval_entry.insert(0, self.auto_interval)
             self.write_btn.pack_forget()
             self.refresh_btn.pack_forget()
+            self.device_menu.pack_forget()
 
             self.write_to_server_btn.pack(side="right", padx=20)
+            self.load_snapshot_btn.pack(side="right", padx=10)
+            self.save_snapshot_btn.pack(side="right", padx=10)
 
     def clear_all_entries(self):
-        """Clear all register entry boxes (set to 0)."""
-        for self.reg_type, entries in self.reg_entries.items(): 
-            for entry in entries: 
-                entry.delete(0, "end")
+        """Clear all register entry boxes."""
+        for grid in self.reg_grids.values():
+            grid.clear()
 
 
     def disable_or_enable_all_entries(self, in_state="disabled"):
-        """Disable or enable all entry widgets stored in self.reg_entries."""
+        """Disable or enable all register tables stored in self.reg_grids."""
         if in_state == "enable":
             in_state = "normal"
 
-        for self.reg_type, entries in self.reg_entries.items(): 
-            for entry in entries: 
-                entry.configure(state=in_state)
+        for grid in self.reg_grids.values():
+            grid.set_state(in_state)
 
 
     def start_communication(self):
@@ -405,69 +1327,355 @@ class ModbusTesterApp(ctk.CTk):
         else:
             self.start_server(ip=ip, port=port)
 
-    def is_port_open(self, ip, port, timeout=2):
-        """Server check if the port is open and server has started"""
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.settimeout(timeout)
+    def _open_recorder(self):
+        """Start a new capture file if transaction recording is enabled."""
+        self._close_recorder()
+        if not self.record_var.get():
+            return
+        path = self.record_path_entry.get().strip() or "capture.mbtr"
         try:
-            s.connect((ip, port))
-            s.close()
-            return True
-        except (socket.error, ConnectionRefusedError):
-            return False
-        
+            self.recorder = TransactionRecorder(path)
+            self.log(f"Recording transactions to {path}")
+        except OSError as e:
+            self.log(f"Unable to open capture file {path}: {e}", logging.ERROR)
+
+    def _close_recorder(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.log(f"Recorded {self.recorder.count} PDUs to {self.recorder.path}")
+            self.recorder = None
+
+    def _open_exporter(self):
+        """Start streaming polled samples to files if sample export is enabled."""
+        self._close_exporter()
+        if not self.export_var.get():
+            return
+        path = self.export_path_entry.get().strip() or "samples.csv"
+        try:
+            self.exporter = ExportSink(
+                path,
+                compression=self.export_compression_var.get(),
+                max_bytes=int(self.export_mb_entry.get() or 0) * 1024 * 1024,
+                max_seconds=int(self.export_min_entry.get() or 0) * 60,
+            )
+            self.log(f"Exporting samples to {self.exporter.path}")
+        except (OSError, ValueError) as e:
+            self.log(f"Unable to export samples to {path}: {e}", logging.ERROR)
+
+    def _close_exporter(self):
+        if self.exporter is not None:
+            exporter, self.exporter = self.exporter, None
+            exporter.close()
+            dropped = f", {exporter.dropped} dropped (disk too slow)" if exporter.dropped else ""
+            self.log(f"Exported {exporter.rows} samples to {len(exporter.paths)} file(s){dropped}")
+            if exporter.error:
+                self.log(f"Export to {exporter.path} stopped: {exporter.error}", logging.ERROR)
+
     def start_client(self, ip, port):
-            self.client = ModbusTcpClient(ip, port=port)
-            if self.client.connect():
+            """Start the background polling engine; connection status arrives via the result queue."""
+            try:
+                gap_tolerance = int(self.gap_entry.get())
+            except ValueError:
+                gap_tolerance = 0
+            try:
+                max_in_flight = int(self.in_flight_entry.get())
+            except ValueError:
+                max_in_flight = 1
+            try:
+                pipeline_window = int(self.pipeline_window_entry.get())
+            except ValueError:
+                pipeline_window = 1
+
+            try:
+                devices = [Device("Main", ip, port)] + parse_devices(self.devices_text.get("1.0", "end"), default_port=port)
+            except ValueError as e:
+                self.log(f"Invalid device list: {e}", logging.ERROR)
+                return
+            names = [device.name for device in devices]
+            if len(set(names)) != len(names):
+                self.log("Invalid device list: device names must be unique.", logging.ERROR)
+                return
+
+            self._open_recorder()
+            self.poller = PollingEngine(
+                devices,
+                interval=self.auto_interval,
+                gap_tolerance=gap_tolerance,
+                max_in_flight=max_in_flight,
+                trace_pdu=self.recorder.trace_pdu(CLIENT) if self.recorder else None,
+                overrun_policy=CATCH_UP if self.overrun_policy_var.get() == "Catch Up" else SKIP,
+                pipeline_window=pipeline_window,
+                metrics=self.client_metrics
+            )
+            self.client_metrics.reset()
+            self._start_metrics_http()
+            try:
+                rules = parse_rules(self.alarm_rules_text.get("1.0", "end"), self.tag_map)
+            except ValueError as e:
+                rules = []
+                self.log(f"Invalid alarm rules, alarms disabled: {e}", logging.ERROR)
+            self.alarms = AlarmEngine(rules, self.tag_map) if rules else None
+            if rules:
+                self.log(f"Checking {len(rules)} alarm rule(s) on every poll.")
+            self._open_exporter()
+            self.poller.set_requests(self._watched_read_requests())
+            self.poller.start()
+            self.device_values = {name: {} for name in names}
+            self._pending_connects = len(devices)
+            self.device_menu.configure(values=names)
+            self.trend_device_menu.configure(values=names)
+            try:
+                self.historian.retention = int(self.retention_entry.get()) * 60
+            except ValueError:
+                self.historian.retention = 3600
+            self.device_var.set("Main")
+            self.start_btn.configure(state="disabled")
+            self.status_label.configure(text="● Connecting", text_color="orange")
+            self.log(f"Connecting as Client to {len(devices)} device(s)...")
+            self.after(POLL_DRAIN_MS, self._drain_poll_queue)
+
+    def _handle_alarm(self, event):
+        """Log an alarm transition or value change and run the rule's actions."""
+        stamp = time.strftime("%H:%M:%S", time.localtime(event.timestamp))
+        if event.kind == "alarm":
+            state = "RAISED" if event.active else "cleared"
+            self.log(f"Alarm {event.name} {state} on {event.device} at {stamp} ({event.rule.expression})",
+                     logging.WARNING if event.active else logging.INFO)
+        else:
+            self.log(f"{event.name} on {event.device} changed to {event.value} at {stamp}")
+        if event.active and self.poller:
+            for reg_type, address, value in event.rule.writes:
+                self.poller.write_runs(event.device, reg_type, [(address, [value])])
+        if event.rule.log_path:
+            try:
+                append_event_log(event.rule.log_path, event)
+            except OSError as e:
+                self.log(f"Error writing alarm log {event.rule.log_path}: {e}", logging.ERROR)
+
+    def on_device_select(self, name):
+        """Show the last values polled from the selected device."""
+        for grid in self.reg_grids.values():
+            grid.mark_clean()   # edits were meant for the previous device
+        for reg_type, (address, values) in self.device_values.get(name, {}).items():
+            self._update_entries(reg_type, address, values)
+
+    def _watched_read_requests(self):
+        """Build the read list for every register type whose Watch switch is on."""
+        requests = []
+        for reg_type in self.reg_types:
+            if not self.watch_vars[reg_type].get():
+                continue
+            entries = self.settings_reg_entries[reg_type]
+            poll_ms = entries["poll_ms"].get()
+            try:
+                priority = int(entries["priority"].get())
+            except ValueError:
+                priority = 0
+            requests.append(ReadRequest(
+                reg_type,
+                *self.reg_ranges[reg_type],
+                interval=int(poll_ms) / 1000 if poll_ms else None,
+                priority=priority
+            ))
+        return requests
+
+    def _start_metrics_http(self):
+        """Serve client metrics over HTTP if a port is configured."""
+        port = self.metrics_port_entry.get().strip()
+        if not port or int(port) == 0:
+            return
+        try:
+            self.metrics_http = MetricsHTTPServer(self.client_metrics, port=int(port))
+        except OSError as e:
+            self.log(f"Unable to serve metrics on port {port}: {e}", logging.ERROR)
+            return
+        self.metrics_http.start()
+        self.log(f"Client metrics at http://127.0.0.1:{port}/metrics")
+
+    def _on_watch_toggle(self):
+        if self.poller and self.is_running:
+            self.poller.set_requests(self._watched_read_requests())
+
+    def _drain_poll_queue(self):
+        """Apply everything the polling engine produced since the last call (runs on the Tk thread)."""
+        poller = self.poller
+        if poller is None:
+            return
+        try:
+            while True:
+                self._handle_poll_event(poller.results.get_nowait())
+        except queue.Empty:
+            pass
+        if self.poller is poller:
+            self.after(POLL_DRAIN_MS, self._drain_poll_queue)
+
+    def _handle_poll_event(self, event):
+        if isinstance(event, ReadResult):
+            if event.error:
+                self.log(f"Error reading {event.reg_type} from {event.device}: {event.error}", logging.ERROR)
+                return
+            self.device_values.setdefault(event.device, {})[event.reg_type] = (event.address, event.values)
+            self.historian.record(event.device, event.reg_type, event.address, event.timestamp, event.values)
+            if self.exporter and not self.exporter.write(event.device, event.reg_type, event.address,
+                                                         event.timestamp, event.values):
+                self._close_exporter()      # logs the error
+            if self.alarms:
+                for alarm in self.alarms.process(event.device, event.reg_type, event.address, event.values,
+                                                 event.timestamp):
+                    self._handle_alarm(alarm)
+            if event.device == self.device_var.get():
+                self._cells_changed += self._update_entries(event.reg_type, event.address, event.values)
+
+        elif isinstance(event, ScanComplete):
+            changed, self._cells_changed = self._cells_changed, 0
+            if len(event.device_durations) > 1:
+                slowest = max(event.device_durations, key=event.device_durations.get)
+                self._last_refresh = (
+                    f"Registers refreshed: {len(event.device_durations)} devices in {event.duration * 1000:.1f} ms "
+                    f"(slowest {slowest}: {event.device_durations[slowest] * 1000:.1f} ms), {changed} cells updated."
+                )
+            else:
+                self._last_refresh = f"Registers refreshed in {event.duration * 1000:.1f} ms, {changed} cells updated."
+            # Every poll group completes a scan, so this would flood the Log tab at INFO.
+            self.log(self._last_refresh, logging.DEBUG)
+
+        elif isinstance(event, WriteResult):
+            if event.error:
+                self.log(f"Error writing {event.reg_type} to {event.device}: {event.error}", logging.ERROR)
+                grid = self.reg_grids.get(event.reg_type)
+                if grid is not None and event.device == self.device_var.get():
+                    grid.mark_dirty(event.address - grid.start, event.count)    # keep for the next write
+            else:
+                self.log(
+                    f"Wrote {event.count} values to {event.reg_type} on {event.device} starting at "
+                    f"{event.address} (FC{event.function_code})"
+                )
+
+        elif isinstance(event, VerifyResult):
+            if event.error:
+                self.log(f"Verify of {event.reg_type} on {event.device} failed: {event.error}", logging.ERROR)
+            elif event.mismatches:
+                shown = ", ".join(f"{a}: wrote {w}, read {r}" for a, w, r in event.mismatches[:5])
+                more = f" (+{len(event.mismatches) - 5} more)" if len(event.mismatches) > 5 else ""
+                self.log(
+                    f"Verify {event.reg_type} on {event.device}: {len(event.mismatches)} of {event.checked} "
+                    f"values differ - {shown}{more}", logging.WARNING
+                )
+            else:
+                self.log(f"Verified {event.checked} {event.reg_type} values on {event.device}.")
+
+        elif isinstance(event, ConnectionStatus):
+            self._pending_connects -= 1
+            self.log(f"{event.device}: {event.message}", logging.INFO if event.connected else logging.WARNING)
+            if event.connected and not self.is_running:
                 self.disable_or_enable_all_entries("normal")
-                self.start_btn.configure(state="disabled")
                 self.stop_btn.configure(state="normal")
                 self.is_running = True
-                self.log(f"Connected as Client to {ip}:{port}")
                 self.status_label.configure(text="● Connected", text_color="green")
-                if self.auto_interval > 0:
-                    self.after(int(self.auto_interval * 1000), self.update_registers)
-            else:
+            elif self._pending_connects == 0 and not self.is_running:
+                self.poller = None
+                if self.metrics_http:
+                    self.metrics_http.stop()
+                    self.metrics_http = None
+                self._close_exporter()
+                self._close_recorder()
+                self.alarms = None
+                self.start_btn.configure(state="normal")
                 self.status_label.configure(text="● Failed", text_color="red")
-                self.log("Failed to connect to Modbus server, Please check the IP address.")
+                self.log("Failed to connect to Modbus server, Please check the IP address.", logging.ERROR)
                 self.mode_menu.configure(state="normal")
 
     def start_server(self, ip, port):
         self.log(f"Starting Modbus Server on {ip}:{port}")
-        store = ModbusSlaveContext(
-            di=ModbusSequentialDataBlock(0, [0]*100),
-            co=ModbusSequentialDataBlock(0, [0]*100),
-            hr=ModbusSequentialDataBlock(0, [0]*100),
-            ir=ModbusSequentialDataBlock(0, [0]*100),
-        )
+        self.server_changes = ChangeTracker()
+        store = create_slave_context(on_change=self.server_changes.mark)
         self.context = ModbusServerContext(slaves=store, single=True)
-        self.server_thread = threading.Thread(
-            target=StartTcpServer,
-            kwargs={"context": self.context, "address": (ip, port)},
-            daemon=True
+        self.server_metrics.reset()
+        self.simulator = None
+        if self.simulate_var.get():
+            try:
+                signals = parse_signals(self.signals_text.get("1.0", "end"))
+                tick = max(10, int(self.sim_tick_entry.get() or 100)) / 1000
+                self.simulator = Simulator(self.context, signals, tick=tick)
+                self.log(f"Simulating {self.simulator.register_count} values every {tick * 1000:.0f} ms")
+            except ValueError as e:
+                self.log(f"Invalid signal list, simulation disabled: {e}", logging.ERROR)
+        try:
+            plant = parse_plant(self.plant_text.get("1.0", "end"))
+        except ValueError as e:
+            plant = []
+            self.log(f"Invalid plant device list, serving only {ip}:{port}: {e}", logging.ERROR)
+        if plant:
+            self.log(f"Simulating plant: {describe_plant(plant)}")
+        self._open_recorder()
+        self.server = ServerRunner(
+            self.context,
+            (ip, port),
+            metrics=self.server_metrics,
+            trace_pdu=self.recorder.trace_pdu(SERVER) if self.recorder else None,
+            simulator=self.simulator,
+            plant=plant
         )
-        self.server_thread.start()
-        # Wait briefly for the server to initialize
-        time.sleep(1)
-        if self.is_port_open(ip=ip, port=port):
+        self.start_btn.configure(state="disabled")
+        self.mode_menu.configure(state="disabled")
+        self.status_label.configure(text="● Server Starting", text_color="orange")
+        self.server.start()
+        self.after(POLL_DRAIN_MS, self._drain_server_queue)
+
+    def _drain_server_queue(self):
+        """React to the server's bind result and unexpected stops (runs on the Tk thread)."""
+        server = self.server
+        if server is None:
+            return
+        try:
+            while True:
+                self._handle_server_event(server.results.get_nowait())
+        except queue.Empty:
+            pass
+        if self.server is server:
+            self._apply_server_changes()
+            self.after(POLL_DRAIN_MS, self._drain_server_queue)
+
+    def _handle_server_event(self, event):
+        if isinstance(event, ServerStarted):
             self.disable_or_enable_all_entries("normal")
             self.status_label.configure(text="● Server Running", text_color="green")
-            self.start_btn.configure(state="disabled")
             self.stop_btn.configure(state="normal")
-            self.log(f"Server running at {ip}:{port}")
-
-            self.mode_menu.configure(state="disabled")
-
-            self._update_server_values_loop()
-        else:
-            self.mode_menu.configure(state="normal") 
+            self.log(f"Server running at {event.host}:{event.port} (listening after {event.startup_ms:.1f} ms)")
+            if event.plant_ports:
+                self.log(f"Plant devices listening on ports {', '.join(map(str, event.plant_ports))}")
+            self._refresh_server_view()
+
+        elif isinstance(event, ServerFailed):
+            self.server = None
+            self.simulator = None
+            self._close_recorder()
+            self.start_btn.configure(state="normal")
+            self.mode_menu.configure(state="normal")
             self.status_label.configure(text="● Server Failed", text_color="red")
-            self.log(f"Failed to start Modbus Server on {ip}:{port}, Please check the IP address.")
+            self.log(f"Failed to start Modbus Server: {event.error}", logging.ERROR)
+
+        elif isinstance(event, ServerStopped) and event.error:
+            self.log(f"Modbus Server stopped: {event.error}", logging.ERROR)
+            self.stop_communication()
 
     def stop_communication(self):
         self.is_running = False
-        if self.client:
-            self.client.close()
+        if self.poller:
+            self.poller.stop()
+            self.poller = None
+        self._last_refresh = None
+        if self.metrics_http:
+            self.metrics_http.stop()
+            self.metrics_http = None
+        self._close_exporter()
+        if self.server:
+            self.server.stop()
+            self.server = None
+        if self.simulator:
+            self.log(f"Simulation stopped after {self.simulator.ticks} ticks ({self.simulator.overruns} overruns).")
+            self.simulator = None
+        self._close_recorder()
         self.start_btn.configure(state="normal")
         self.stop_btn.configure(state="disabled")
         self.status_label.configure(text="● Disconnected", text_color="red")
@@ -491,161 +1699,160 @@ class ModbusTesterApp(ctk.CTk):
                 if not self.watch_vars[reg_type].get():
                     continue
 
-                # --- Get start address and range from Settings tab ---
-                try:
-                    start_addr = int(self.settings_reg_entries[reg_type]["start_addr"].get())
-                    count = int(self.settings_reg_entries[reg_type]["addr_range"].get())
-                except ValueError:
-                    self.log(f"Invalid address range for {reg_type}. Skipping.")
-                    continue
-
-                # --- Get values from GUI entry boxes ---
-                try:
-                    values = []
-                    for entry in self.reg_entries[reg_type][:count]:
-                        val_str = entry.get().strip()
-                        # Handle bool for coils and discrete
-                        if reg_type in ["Coils", "Discrete Inputs"]:
-                            val = 1 if val_str.lower() in ["1", "true", "on"] else 0
-                        else:
-                            val = int(val_str) if val_str.isdigit() else 0
-                        values.append(val)
-                except Exception as e:
-                    self.log(f"Error reading GUI values for {reg_type}: {e}")
+                # --- Only the cells edited since the last write, one bulk write per run ---
+                grid = self.reg_grids[reg_type]
+                runs = grid.dirty_runs()
+                if not runs:
                     continue
 
                 # --- Write to Modbus server memory ---
                 try:
                     slave_id = 0  # default single slave
-                    if reg_type == "Coils":
-                        self.context[slave_id].setValues(1, start_addr, values)
-                    elif reg_type == "Discrete Inputs":
-                        self.context[slave_id].setValues(2, start_addr, values)
-                    elif reg_type == "Holding Registers":
-                        self.context[slave_id].setValues(3, start_addr, values)
-                    elif reg_type == "Input Registers":
-                        self.context[slave_id].setValues(4, start_addr, values)
+                    fc = TABLE_FUNCTION_CODES[reg_type]
+                    for start_addr, values in runs:
+                        self.context[slave_id].setValues(fc, start_addr, values)
+                    grid.mark_clean()
 
-                    self.log(f"Wrote {len(values)} values to {reg_type} starting at {start_addr}")
+                    self.log(
+                        f"Wrote {sum(len(values) for _, values in runs)} edited values to {reg_type} "
+                        f"in {len(runs)} block(s)"
+                    )
 
                 except Exception as e:
-                    self.log(f"Error writing {reg_type} to server: {e}")
+                    self.log(f"Error writing {reg_type} to server: {e}", logging.ERROR)
 
             self.log("Write to server completed successfully.")
 
         except Exception as e:
-            self.log(f"Error in write_to_server: {e}")
+            self.log(f"Error in write_to_server: {e}", logging.ERROR)
 
+    def save_snapshot(self):
+        """Save every table of every unit of the server datastore to a snapshot file."""
+        if self.server is None or self.context is None:
+            self.log("Start the server first.")
+            return
+        path = filedialog.asksaveasfilename(
+            defaultextension=".mbss",
+            filetypes=[("Register snapshot", "*.mbss")],
+            initialfile="server.mbss"
+        )
+        if not path:
+            return
+        t0 = time.perf_counter()
+        try:
+            size = save_context(path, self.context)
+        except OSError as e:
+            self.log(f"Error saving snapshot: {e}", logging.ERROR)
+            return
+        self.log(f"Snapshot saved to {path} ({size} bytes, {(time.perf_counter() - t0) * 1000:.1f} ms)")
 
-    def update_registers(self):
-        if not self.is_running or not self.client:
+    def load_snapshot(self):
+        """Write a snapshot file back into the server datastore."""
+        if self.server is None or self.context is None:
+            self.log("Start the server first.")
             return
-        
+        path = filedialog.askopenfilename(filetypes=[("Register snapshot", "*.mbss"), ("All files", "*.*")])
+        if not path:
+            return
+        t0 = time.perf_counter()
         try:
-            for reg_type in self.reg_types:
-                if not self.watch_vars[reg_type].get():
-                    continue
-                    
-                if reg_type == "Holding Registers":
-                    rr = self.client.read_holding_registers(address=0, count=10)
-                    if not rr.isError():
-                        for i, val in enumerate(rr.registers):
-                            self.reg_entries[reg_type][i].delete(0, "end")
-                            self.reg_entries[reg_type][i].insert(0, str(val))
-
-                if reg_type == "Input Registers":
-                    rr = self.client.read_input_registers(address=0, count=10)
-                    if not rr.isError():
-                        for i, val in enumerate(rr.registers):
-                            self.reg_entries[reg_type][i].delete(0, "end")
-                            self.reg_entries[reg_type][i].insert(0, str(val))
-
-                if reg_type == "Coils":
-                    rr = self.client.read_coils(address=0, count=10)
-                    if not rr.isError():
-                        bits = rr.bits[:10]
-                        for i, val in enumerate(bits):
-                            self.reg_entries[reg_type][i].delete(0, "end")
-                            self.reg_entries[reg_type][i].insert(0, bool(val))
-
-                if reg_type == "Discrete Inputs":
-                    rr = self.client.read_discrete_inputs(address=0, count=10)
-                    if not rr.isError():
-                        bits = rr.bits[:10]
-                        for i, val in enumerate(bits):
-                            self.reg_entries[reg_type][i].delete(0, "end")
-                            self.reg_entries[reg_type][i].insert(0, bool(val))
-
-            self.log("Registers refreshed.")
+            written, skipped = load_context(path, self.context)
+        except (OSError, ValueError) as e:
+            self.log(f"Error loading snapshot: {e}", logging.ERROR)
+            return
+        self.log(f"Snapshot {path} restored: {written} values in {(time.perf_counter() - t0) * 1000:.1f} ms")
+        if skipped:
+            self.log(f"Snapshot units not served here: {', '.join(map(str, skipped))}", logging.WARNING)
 
-        except Exception as e:
-            self.log(f"Error: {e}")
 
-        # Auto refresh if interval > 0
-        if self.auto_interval > 0 and self.is_running:
-            self.after(int(self.auto_interval * 1000), self.update_registers)
+    def update_registers(self):
+        """Request an immediate scan; results are applied by _drain_poll_queue."""
+        if not self.is_running or not self.poller:
+            return
+        self.poller.set_requests(self._watched_read_requests())
+        self.poller.poll_once()
 
     def write_registers(self):
-        if not self.client:
+        """Write the cells edited since the last write, with the fewest requests."""
+        if not self.poller:
             self.log("Client not connected.")
             return
 
-        try:
-            for reg_type in self.reg_types:
-                if not self.watch_vars[reg_type].get():
-                    continue
-
-                values = [int(e.get()) for e in self.reg_entries[reg_type]]
-                if reg_type == "Holding Registers":
-                    self.client.write_registers(0, values)
-                elif reg_type == "Coils":
-                    self.client.write_coils(0, [bool(v) for v in values])
-
-            self.log("Registers written successfully.")
-
-        except Exception as e:
-            self.log(f"Error writing registers: {e}")
-
-    def _update_server_values_loop(self):
-        if hasattr(self, "context") and self.context is not None:
-            try:
-                # Read holding registers
-                hr = self.context[0].getValues(3, self.start_addr_holding, count=10)
-                ir = self.context[0].getValues(4, self.start_addr_input, count=10)
-                co = self.context[0].getValues(1, self.start_addr_coils, count=10)
-                di = self.context[0].getValues(2, self.start_addr_Dis_input, count=10)
-
-                if  not self._switch_disable_check("Holding Registers"):
-                    self._update_entries("Holding Registers", hr)
-                if  not self._switch_disable_check("Input Registers"):
-                    self._update_entries("Input Registers", ir)
-                if  not self._switch_disable_check("Coils"):
-                    self._update_entries("Coils", co)
-                if  not self._switch_disable_check("Discrete Inputs"):
-                    self._update_entries("Discrete Inputs", di)
-
-            except Exception as e:
-                self.log(f"Error updating UI: {e}")
-
-        self.after((int(self.auto_interval*1000)), self._update_server_values_loop)
-
-    def _switch_disable_check(self, reg_type_check):
+        device = self.device_var.get()
+        verify = self.verify_writes_var.get()
+        queued = 0
         for reg_type in self.reg_types:
             if not self.watch_vars[reg_type].get():
                 continue
+            grid = self.reg_grids[reg_type]
+            runs = grid.dirty_runs()
+            if not runs:
+                continue
+            edited = sum(len(values) for _, values in runs)
+            if reg_type not in MAX_WRITE_COUNT:
+                self.log(f"{reg_type} are read-only; {edited} edited values not written.", logging.WARNING)
+                continue
+            grid.mark_clean()
+            self.poller.write_runs(device, reg_type, runs, verify=verify)
+            queued += edited
 
-            if  reg_type == reg_type_check:
-                return True
-            return False 
+        if queued:
+            self.log(f"Queued writes of {queued} edited values.")
+        else:
+            self.log("No edited values to write.")
 
-    def _update_entries(self, reg_type, values):
-        if reg_type not in self.reg_entries:
+    def _refresh_server_view(self):
+        """Load every register table from the server datastore (server start, rebuilt tables)."""
+        if self.server is None or self.context is None:
             return
-        for i, val in enumerate(values[:len(self.reg_entries[reg_type])]):
-            entry = self.reg_entries[reg_type][i]
-            entry.delete(0, "end")
-            entry.insert(0, str(val))
+        self.server_changes.take()     # the full read below covers anything pending
+        for reg_type, grid in self.reg_grids.items():
+            values = self.context[0].getValues(TABLE_FUNCTION_CODES[reg_type], grid.start, grid.count)
+            self._update_entries(reg_type, grid.start, values)
+
+    def _apply_server_changes(self):
+        """Copy just the datastore ranges written since the last drain into the register tables."""
+        changes = self.server_changes.take()
+        if not changes or self.context is None:
+            return
+        for reg_type, grid in self.reg_grids.items():
+            fc = TABLE_FUNCTION_CODES[reg_type]
+            for address, count in changes.get(fc, ()):
+                lo = max(address, grid.start)
+                hi = min(address + count, grid.start + grid.count)
+                if lo < hi:
+                    grid.set_values(self.context[0].getValues(fc, lo, hi - lo), offset=lo - grid.start)
+
+    def _update_entries(self, reg_type, address, values):
+        """Show the part of ``values`` (read from ``address``) inside the table; returns how many cells changed."""
+        grid = self.reg_grids.get(reg_type)
+        if grid is None:
+            return 0
+        lo = max(address, grid.start)
+        hi = min(address + len(values), grid.start + grid.count)
+        if lo >= hi:
+            return 0
+        return grid.set_values(values[lo - address:hi - address], offset=lo - grid.start)
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        from modbus_tester.load_generator import main
+        sys.exit(main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "replay":
+        from modbus_tester.recorder import main
+        sys.exit(main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "discover":
+        from modbus_tester.discovery import main
+        sys.exit(main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "perf":
+        from modbus_tester.perf import main
+        sys.exit(main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "plant":
+        from modbus_tester.plant import main
+        sys.exit(main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "snapshot":
+        from modbus_tester.snapshot import main
+        sys.exit(main(sys.argv[2:]))
+
     app = ModbusTesterApp()
     app.mainloop()
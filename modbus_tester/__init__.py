@@ -0,0 +1 @@
+"""Building blocks used by the Modbus TCP/IP Tester application."""
@@ -0,0 +1,417 @@
+"""Alarm and change-of-value rules evaluated on polled data.
+
+Rules are configured one per line::
+
+    alarm <name> <expression> [deadband=<x>] [write=<hr|co><address>:<value>] [log=<file>]
+    cov <name> <symbol> [deadband=<x>] [write=<hr|co><address>:<value>] [log=<file>]
+
+An expression uses Python syntax restricted to numbers, arithmetic, bit
+operations (``& | ^ ~ << >>``), comparisons, ``and``/``or``/``not``,
+``abs``/``min``/``max`` and these symbols:
+
+* ``hr100``, ``ir7``, ``co5``, ``di0`` - the raw value at an address
+  (0-65535 for registers, 0/1 for bits);
+* ``temp`` - a named tag of the tag map, decoded (``temp[2]`` for the third
+  value of a tag with a count);
+* ``rate(x)`` - change of symbol ``x`` per second between its last two
+  samples.
+
+An ``alarm`` is raised when its expression becomes true and cleared when it
+becomes false. With ``deadband`` (only for ``<expression> <op> <number>``
+with ``<``, ``<=``, ``>`` or ``>=``) the clear threshold is moved away by
+that much, so a value hovering at the limit does not flap. A ``cov`` rule
+fires whenever its symbol has moved more than ``deadband`` from the value
+it last reported. ``write`` writes a value to the same device when an
+alarm is raised or a change is reported; ``log`` appends every event of the
+rule to a CSV file.
+
+Each expression is checked and compiled once into a Python code object.
+``AlarmEngine`` indexes the symbols the rules use by table and address, so
+a poll result only costs a bisect per table plus a comparison per
+referenced address inside the block; only rules whose symbols actually
+changed are evaluated. Rules are evaluated separately for every device.
+"""
+import ast
+import csv
+import math
+import os
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+
+from .tags import TagMap
+
+# Symbol prefix -> register table
+TABLES = {"co": "Coils", "di": "Discrete Inputs", "hr": "Holding Registers", "ir": "Input Registers"}
+WRITABLE = ("co", "hr")
+FUNCTIONS = {"abs": abs, "min": min, "max": max}
+OPTIONS = ("deadband", "write", "log")
+
+_ALLOWED = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Name, ast.Load,
+    ast.Constant, ast.Call, ast.Subscript, ast.IfExp,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod,
+    ast.BitAnd, ast.BitOr, ast.BitXor, ast.LShift, ast.RShift,
+    ast.USub, ast.UAdd, ast.Not, ast.Invert,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+)
+_GLOBALS = {"__builtins__": {}, **FUNCTIONS}
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class Rule:
+    kind: str                   # "alarm" or "cov"
+    name: str
+    expression: str
+    symbols: frozenset          # every symbol the rule reads (rates by their own name)
+    code: object                # compiled trip expression
+    hold: object = None         # compiled expression that keeps an alarm raised (deadband), else ``code``
+    deadband: float = 0.0
+    writes: tuple = ()          # ((reg_type, address, value), ...)
+    log_path: str = None
+
+
+@dataclass
+class AlarmEvent:
+    device: str
+    name: str
+    kind: str
+    active: bool                # alarms: raised (True) or cleared; cov: always True
+    value: object               # cov: the new value; alarms: None
+    timestamp: float
+    rule: Rule = field(repr=False, default=None)
+
+
+def _rate_symbol(symbol):
+    return f"rate__{symbol}"
+
+
+def _item_symbol(name, index):
+    return f"{name}__{index}"
+
+
+class _Compiler(ast.NodeTransformer):
+    """Validate an expression and rewrite ``name[i]`` and ``rate(x)`` into plain symbols."""
+
+    def __init__(self, tag_symbols):
+        self.tag_symbols = tag_symbols
+        self.symbols = set()
+        self.rates = set()
+
+    def generic_visit(self, node):
+        if not isinstance(node, _ALLOWED):
+            raise ValueError(f"{type(node).__name__} is not allowed in a rule")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ValueError(f"only numbers are allowed, got {node.value!r}")
+        return super().generic_visit(node)
+
+    def visit_Name(self, node):
+        self._check_symbol(node.id)
+        self.symbols.add(node.id)
+        return node
+
+    def visit_Subscript(self, node):
+        if not (isinstance(node.value, ast.Name) and isinstance(node.slice, ast.Constant)
+                and isinstance(node.slice.value, int)):
+            raise ValueError("only <tag>[<number>] indexing is allowed")
+        symbol = _item_symbol(node.value.id, node.slice.value)
+        self._check_symbol(symbol, f"{node.value.id}[{node.slice.value}]")
+        self.symbols.add(symbol)
+        return ast.copy_location(ast.Name(symbol, ast.Load()), node)
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.keywords:
+            raise ValueError("only abs(), min(), max() and rate() can be called")
+        if node.func.id == "rate":
+            if len(node.args) != 1 or not isinstance(node.args[0], (ast.Name, ast.Subscript)):
+                raise ValueError("rate() takes one symbol")
+            arg = self.visit(node.args[0])
+            self.rates.add(arg.id)
+            symbol = _rate_symbol(arg.id)
+            self.symbols.add(symbol)
+            return ast.copy_location(ast.Name(symbol, ast.Load()), node)
+        if node.func.id not in FUNCTIONS:
+            raise ValueError(f"unknown function {node.func.id}()")
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+    def _check_symbol(self, symbol, shown=None):
+        if symbol in self.tag_symbols or _raw_symbol(symbol) is not None:
+            return
+        raise ValueError(f"unknown symbol {shown or symbol!r} (use hr/ir/co/di<address> or a tag name)")
+
+
+def _raw_symbol(symbol):
+    """``"hr100"`` -> ``("Holding Registers", 100)``; None for anything else."""
+    prefix, digits = symbol[:2], symbol[2:]
+    if prefix in TABLES and digits.isdigit() and int(digits) <= 65535:
+        return TABLES[prefix], int(digits)
+    return None
+
+
+def _tag_symbols(tag_map):
+    """Map every symbol the tag map defines to ``(tag, index)``."""
+    symbols = {}
+    for tag in tag_map.tags:
+        if not tag.name.isidentifier():
+            continue
+        count = tag.codec.count
+        if count == 1:
+            symbols[tag.name] = (tag, 0)
+        else:
+            for index in range(count):
+                symbols[_item_symbol(tag.name, index)] = (tag, index)
+    return symbols
+
+
+def compile_expression(text, tag_symbols=()):
+    """Return ``(tree, symbols, rates)`` for an expression, or raise ``ValueError``."""
+    try:
+        tree = ast.parse(text, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"invalid expression {text!r}: {e.msg}") from None
+    compiler = _Compiler(tag_symbols)
+    tree = ast.fix_missing_locations(compiler.visit(tree))
+    return tree, frozenset(compiler.symbols), compiler.rates
+
+
+def _hold_tree(tree, deadband):
+    """The trip expression with its threshold moved ``deadband`` towards clearing."""
+    body = tree.body
+    if not (isinstance(body, ast.Compare) and len(body.ops) == 1
+            and isinstance(body.ops[0], (ast.Lt, ast.LtE, ast.Gt, ast.GtE))):
+        raise ValueError("deadband needs an expression of the form <expression> <|<=|>|>= <number>")
+    try:
+        limit = ast.literal_eval(body.comparators[0])
+    except ValueError:
+        limit = None
+    if not isinstance(limit, (int, float)):
+        raise ValueError("deadband needs a number on the right-hand side of the comparison")
+    shifted = limit - deadband if isinstance(body.ops[0], (ast.Gt, ast.GtE)) else limit + deadband
+    hold = ast.Expression(ast.Compare(body.left, body.ops, [ast.Constant(shifted)]))
+    return ast.fix_missing_locations(hold)
+
+
+def _parse_write(text):
+    target, sep, value = text.partition(":")
+    prefix, digits = target[:2].lower(), target[2:]
+    if not sep or prefix not in WRITABLE or not digits.isdigit() or int(digits) > 65535:
+        raise ValueError(f"write must look like hr<address>:<value> or co<address>:<0|1>, got {text!r}")
+    try:
+        number = int(value, 0)
+    except ValueError:
+        raise ValueError(f"write value must be an integer, got {value!r}") from None
+    if prefix == "co" and number not in (0, 1):
+        raise ValueError("coil writes take 0 or 1")
+    return TABLES[prefix], int(digits), number & 0xFFFF
+
+
+def parse_rules(text, tag_map=None):
+    """Parse and compile rules (see the module docstring); raises ``ValueError`` naming the bad line."""
+    tag_symbols = _tag_symbols(tag_map or TagMap())
+    rules = []
+    names = set()
+    for line_no, line in enumerate(text.splitlines(), start=1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        parts = line.split()
+        try:
+            if len(parts) < 3 or parts[0].lower() not in ("alarm", "cov"):
+                raise ValueError("expected alarm <name> <expression> ... or cov <name> <symbol> ...")
+            kind, name = parts[0].lower(), parts[1]
+            if name in names:
+                raise ValueError(f"rule {name!r} is defined twice")
+            # Trailing key=value words are options; the rest is the expression.
+            options = {}
+            words = parts[2:]
+            while words:
+                key, sep, value = words[-1].partition("=")
+                if not sep or key not in OPTIONS or not value:
+                    break
+                options[key] = value
+                words.pop()
+            expression = " ".join(words)
+            if not expression:
+                raise ValueError("missing expression")
+
+            tree, symbols, _ = compile_expression(expression, tag_symbols)
+            if kind == "cov" and not isinstance(tree.body, ast.Name):
+                raise ValueError("cov takes a single symbol")
+            deadband = 0.0
+            if "deadband" in options:
+                try:
+                    deadband = float(options["deadband"])
+                except ValueError:
+                    raise ValueError(f"deadband must be a number, got {options['deadband']!r}") from None
+                if deadband < 0:
+                    raise ValueError("deadband must not be negative")
+            hold = None
+            if kind == "alarm" and deadband:
+                hold = compile(_hold_tree(tree, deadband), f"<rule {name}>", "eval")
+            writes = (_parse_write(options["write"]),) if "write" in options else ()
+        except ValueError as e:
+            raise ValueError(f"Line {line_no}: {e}") from None
+        names.add(name)
+        rules.append(Rule(
+            kind, name, expression, symbols, compile(tree, f"<rule {name}>", "eval"),
+            hold, deadband, writes, options.get("log"),
+        ))
+    return rules
+
+
+class _DeviceState:
+    __slots__ = ("env", "samples", "active", "reported")
+
+    def __init__(self):
+        self.env = {}           # symbol -> current value
+        self.samples = {}       # symbol -> (value, timestamp) of the previous sample, for rates
+        self.active = {}        # alarm name -> time raised
+        self.reported = {}      # cov name -> value last reported
+
+
+class AlarmEngine:
+    """Evaluate ``rules`` incrementally against poll results from any number of devices."""
+
+    def __init__(self, rules, tag_map=None):
+        self.rules = list(rules)
+        tag_symbols = _tag_symbols(tag_map or TagMap())
+        self._dependents = {}   # symbol -> [rule, ...]
+        rates = set()
+        for rule in self.rules:
+            for symbol in rule.symbols:
+                self._dependents.setdefault(symbol, []).append(rule)
+                if symbol.startswith("rate__"):
+                    rates.add(symbol[len("rate__"):])
+        self._rates = frozenset(rates)
+
+        # Per table: sorted addresses with the symbols read there.
+        raw = {}
+        typed = {}
+        for symbol in {s[len("rate__"):] if s.startswith("rate__") else s for s in self._dependents}:
+            location = _raw_symbol(symbol)
+            if location is not None:
+                raw.setdefault(location[0], []).append((location[1], symbol))
+            else:
+                tag, index = tag_symbols[symbol]
+                typed.setdefault(tag.reg_type, {}).setdefault(tag, []).append((index, symbol))
+        self._raw = {t: (sorted(entries), [a for a, _ in sorted(entries)]) for t, entries in raw.items()}
+        self._typed = {}
+        for reg_type, tags in typed.items():
+            ordered = sorted(tags.items(), key=lambda item: item[0].address)
+            self._typed[reg_type] = (ordered, [tag.address for tag, _ in ordered])
+        self._devices = {}
+        self.evaluations = 0    # rule evaluations so far, for the Statistics tab
+        self.errors = 0         # evaluations that raised (e.g. division by zero)
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def process(self, device, reg_type, address, values, timestamp):
+        """Feed one block read at ``address``; returns the ``AlarmEvent`` list it caused."""
+        state = self._devices.get(device)
+        if state is None:
+            state = self._devices[device] = _DeviceState()
+        changed = set()
+        end = address + len(values)
+
+        index = self._raw.get(reg_type)
+        if index is not None:
+            entries, addresses = index
+            for i in range(bisect_left(addresses, address), bisect_left(addresses, end)):
+                at, symbol = entries[i]
+                self._sample(state, symbol, int(values[at - address]), timestamp, changed)
+
+        index = self._typed.get(reg_type)
+        if index is not None:
+            ordered, addresses = index
+            # A tag starting before ``address`` cannot lie entirely inside the block.
+            for tag, symbols in ordered[bisect_left(addresses, address):bisect_right(addresses, end - 1)]:
+                if tag.address + tag.registers > end:
+                    continue
+                offset = tag.address - address
+                decoded = tag.codec.decode(values[offset:offset + tag.registers])
+                for item, symbol in symbols:
+                    self._sample(state, symbol, decoded[item], timestamp, changed)
+
+        if not changed:
+            return []
+        rules = {id(rule): rule for symbol in changed for rule in self._dependents.get(symbol, ())}
+        events = []
+        for rule in rules.values():
+            event = self._evaluate(device, state, rule, timestamp)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def _sample(self, state, symbol, value, timestamp, changed):
+        if symbol in self._rates:
+            previous = state.samples.get(symbol)
+            state.samples[symbol] = (value, timestamp)
+            if previous is not None and timestamp > previous[1]:
+                rate = (value - previous[0]) / (timestamp - previous[1])
+                rate_symbol = _rate_symbol(symbol)
+                if state.env.get(rate_symbol) != rate:
+                    state.env[rate_symbol] = rate
+                    changed.add(rate_symbol)
+        if state.env.get(symbol, _MISSING) != value:
+            state.env[symbol] = value
+            changed.add(symbol)
+
+    def _evaluate(self, device, state, rule, timestamp):
+        env = state.env
+        if not all(symbol in env for symbol in rule.symbols):
+            return None     # not every input has been polled yet
+        self.evaluations += 1
+        if rule.kind == "cov":
+            value = env[next(iter(rule.symbols))]
+            last = state.reported.get(rule.name, _MISSING)
+            if last is _MISSING:
+                state.reported[rule.name] = value   # first sample is the reference, not a change
+                return None
+            if not self._moved(last, value, rule.deadband):
+                return None
+            state.reported[rule.name] = value
+            return AlarmEvent(device, rule.name, rule.kind, True, value, timestamp, rule)
+
+        was_active = rule.name in state.active
+        try:
+            active = bool(eval(rule.hold if was_active and rule.hold else rule.code, _GLOBALS, env))
+        except (ArithmeticError, TypeError, ValueError):
+            self.errors += 1
+            return None
+        if active == was_active:
+            return None
+        if active:
+            state.active[rule.name] = timestamp
+        else:
+            del state.active[rule.name]
+        return AlarmEvent(device, rule.name, rule.kind, active, None, timestamp, rule)
+
+    @staticmethod
+    def _moved(last, value, deadband):
+        if isinstance(value, (int, float)) and isinstance(last, (int, float)):
+            if math.isnan(value) or math.isnan(last):
+                return not (math.isnan(value) and math.isnan(last))
+            return abs(value - last) > deadband
+        return value != last
+
+    def active(self):
+        """Return ``[(device, name, raised at), ...]`` for every raised alarm."""
+        return sorted(
+            (device, name, since)
+            for device, state in self._devices.items()
+            for name, since in state.active.items()
+        )
+
+
+def append_event_log(path, event):
+    """Append ``event`` as a CSV line (timestamp, device, rule, kind, state, value) to ``path``."""
+    new = not os.path.exists(path)
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if new:
+            writer.writerow(["timestamp", "device", "rule", "kind", "state", "value"])
+        state = ("raised" if event.active else "cleared") if event.kind == "alarm" else "changed"
+        writer.writerow([f"{event.timestamp:.3f}", event.device, event.name, event.kind, state,
+                         "" if event.value is None else event.value])
@@ -0,0 +1,67 @@
+"""Coalesced change notifications from the Server mode datastore.
+
+The datastore built by ``create_slave_context(on_change=...)`` reports every
+successful ``setValues`` - from a remote master, the simulator or the GUI's
+own write - as ``(function code, address, count)``, where the function code
+is the read code of the table (1 coils, 2 discrete inputs, 3 holding
+registers, 4 input registers). ``ChangeTracker.mark`` is meant to be that
+callback: it only records the affected range, so the server's loop thread
+pays a lock and a list append per write.
+
+The GUI calls ``take`` from its drain callback and gets each table's changed
+ranges sorted, with overlapping and touching ranges merged, so a burst of
+writes to the same registers costs one refresh of those registers. When
+nothing changed ``take`` returns without taking the lock. If ranges pile up
+faster than they are taken (more than ``MAX_RANGES`` for a table), the list
+is merged in place, and collapsed to the single range covering them all if
+merging does not halve it.
+"""
+import threading
+
+# Ranges kept per table before they are collapsed into one covering range.
+MAX_RANGES = 256
+
+
+def merge_ranges(ranges):
+    """Sort ``[(start, end), ...]`` (end exclusive) and merge overlapping or touching ranges."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+class ChangeTracker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}      # function code -> [(start, end), ...]
+
+    def mark(self, function_code, address, count):
+        """Record that ``count`` values from ``address`` changed (any thread)."""
+        if count <= 0:
+            return
+        end = address + count
+        with self._lock:
+            ranges = self._pending.setdefault(function_code, [])
+            if ranges and ranges[-1][0] <= address <= ranges[-1][1]:
+                ranges[-1] = (ranges[-1][0], max(end, ranges[-1][1]))
+                return
+            ranges.append((address, end))
+            if len(ranges) > MAX_RANGES:
+                ranges[:] = merge_ranges(ranges)
+                if len(ranges) > MAX_RANGES // 2:
+                    ranges[:] = [(ranges[0][0], ranges[-1][1])]
+
+    def take(self):
+        """Return and forget ``{function code: [(address, count), ...]}`` of everything changed since the last call."""
+        if not self._pending:
+            return {}
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return {
+            fc: [(start, end - start) for start, end in merge_ranges(ranges)]
+            for fc, ranges in pending.items()
+        }
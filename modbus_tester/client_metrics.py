@@ -0,0 +1,227 @@
+"""Per-request latency and error counters for Client mode, with Prometheus export.
+
+``PollingEngine`` times every transaction it sends and reports it here:
+round-trip latency goes into one ``LatencyHistogram`` per (device, function
+code), next to counters for timeouts (no response or connection lost),
+other client errors, exception responses by code, and connects, reconnects
+and failed connects per device. Updates come from the engine's loop thread
+and reads from the GUI thread, so every access goes through a lock.
+
+``prometheus_text`` renders the counters in the Prometheus text exposition
+format. ``write_prometheus`` writes it atomically for node_exporter's
+textfile collector and ``MetricsHTTPServer`` serves it at ``/metrics``.
+
+Latency is measured from the moment a request is written to the socket,
+not from when it was submitted: requests sharing a connection wait for
+pymodbus' transaction lock (or a ``PipelinedClient`` window slot) first,
+and that queueing is not part of the round trip. Clients are given a
+``timing_trace`` wrapper around their ``trace_pdu`` callback, which stamps
+the send time into a context variable of the sending task; ``sent_at``
+reads it back once the response is in.
+"""
+import contextvars
+import os
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .histogram import LatencyHistogram
+
+# Upper bounds (seconds) of the exported Prometheus histogram buckets.
+PROMETHEUS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_sent_at = contextvars.ContextVar("modbus_sent_at", default=None)
+
+
+def timing_trace(trace_pdu=None):
+    """Wrap a pymodbus ``trace_pdu`` callback (or none) so the send time of each request is kept for ``sent_at``."""
+    def trace(sending, pdu):
+        if sending:
+            _sent_at.set(time.perf_counter())
+        return trace_pdu(sending, pdu) if trace_pdu is not None else pdu
+    return trace
+
+
+def sent_at():
+    """``time.perf_counter()`` when the current task's last request went out, or ``None``."""
+    return _sent_at.get()
+
+
+class ClientMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.latency = {}               # (device, fc) -> LatencyHistogram
+            self.requests = Counter()       # (device, fc)
+            self.timeouts = Counter()       # (device, fc)
+            self.errors = Counter()         # (device, fc)
+            self.exceptions = Counter()     # (device, fc, exception code)
+            self.connects = Counter()       # device
+            self.reconnects = Counter()     # device
+            self.connect_failures = Counter()   # device
+
+    # --- Updates (engine thread) ---
+    def record(self, device, function_code, seconds, exception_code=None):
+        """A response arrived after ``seconds``; ``exception_code`` if it was an exception response."""
+        key = (device, function_code)
+        with self._lock:
+            hist = self.latency.get(key)
+            if hist is None:
+                hist = self.latency[key] = LatencyHistogram()
+            hist.record(seconds)
+            self.requests[key] += 1
+            if exception_code is not None:
+                self.exceptions[(device, function_code, exception_code)] += 1
+
+    def record_timeout(self, device, function_code):
+        with self._lock:
+            self.requests[(device, function_code)] += 1
+            self.timeouts[(device, function_code)] += 1
+
+    def record_error(self, device, function_code):
+        with self._lock:
+            self.requests[(device, function_code)] += 1
+            self.errors[(device, function_code)] += 1
+
+    def record_connect(self, device, ok, reconnect=False):
+        with self._lock:
+            if not ok:
+                self.connect_failures[device] += 1
+            elif reconnect:
+                self.reconnects[device] += 1
+            else:
+                self.connects[device] += 1
+
+    # --- Reporting (any thread) ---
+    def snapshot(self):
+        """Plain-dict copy for display and JSON: ``{"devices": {name: {..., "functions": {fc: {...}}}}}``."""
+        with self._lock:
+            devices = {}
+            names = {device for device, _ in self.requests} | set(self.connects) | set(self.connect_failures)
+            for name in sorted(names):
+                functions = {}
+                for (device, fc), n in sorted(self.requests.items()):
+                    if device != name:
+                        continue
+                    hist = self.latency.get((device, fc), LatencyHistogram())
+                    functions[str(fc)] = {
+                        "requests": n,
+                        "timeouts": self.timeouts[(device, fc)],
+                        "errors": self.errors[(device, fc)],
+                        "exceptions": {
+                            str(code): count for (d, f, code), count in sorted(self.exceptions.items())
+                            if d == device and f == fc
+                        },
+                        "latency_ms": hist.summary_ms(),
+                    }
+                devices[name] = {
+                    "requests": sum(f["requests"] for f in functions.values()),
+                    "timeouts": sum(f["timeouts"] for f in functions.values()),
+                    "connects": self.connects[name],
+                    "reconnects": self.reconnects[name],
+                    "connect_failures": self.connect_failures[name],
+                    "functions": functions,
+                }
+            now = time.time()
+            return {"timestamp": round(now, 3), "uptime_s": round(now - self.started, 3), "devices": devices}
+
+    def prometheus_text(self):
+        """Every counter in the Prometheus text exposition format."""
+        lines = []
+
+        def family(name, kind, text, samples):
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+
+        with self._lock:
+            samples = []
+            for (device, fc), hist in sorted(self.latency.items()):
+                labels = f'device="{_escape(device)}",function="{fc}"'
+                buckets = list(hist.buckets())
+                for bound in PROMETHEUS_BUCKETS:
+                    below = sum(n for upper, n in buckets if upper <= bound)
+                    samples.append(f'modbus_client_request_duration_seconds_bucket{{{labels},le="{bound}"}} {below}')
+                samples.append(f'modbus_client_request_duration_seconds_bucket{{{labels},le="+Inf"}} {hist.count}')
+                samples.append(f"modbus_client_request_duration_seconds_sum{{{labels}}} {hist.total:.6f}")
+                samples.append(f"modbus_client_request_duration_seconds_count{{{labels}}} {hist.count}")
+            family("modbus_client_request_duration_seconds", "histogram",
+                   "Round-trip time of requests that got a response.", samples)
+
+            for name, text, counter in (
+                ("modbus_client_requests_total", "Requests sent.", self.requests),
+                ("modbus_client_timeouts_total", "Requests without a response (timeout or connection lost).",
+                 self.timeouts),
+                ("modbus_client_errors_total", "Requests that failed in the client.", self.errors),
+            ):
+                family(name, "counter", text, [
+                    f'{name}{{device="{_escape(device)}",function="{fc}"}} {n}'
+                    for (device, fc), n in sorted(counter.items())
+                ])
+            family("modbus_client_exceptions_total", "counter", "Exception responses by exception code.", [
+                f'modbus_client_exceptions_total{{device="{_escape(device)}",function="{fc}",code="{code}"}} {n}'
+                for (device, fc, code), n in sorted(self.exceptions.items())
+            ])
+            for name, text, counter in (
+                ("modbus_client_connects_total", "Successful first connects.", self.connects),
+                ("modbus_client_reconnects_total", "Successful reconnects after a connection was lost.",
+                 self.reconnects),
+                ("modbus_client_connect_failures_total", "Failed connection attempts.", self.connect_failures),
+            ):
+                family(name, "counter", text, [
+                    f'{name}{{device="{_escape(device)}"}} {n}' for device, n in sorted(counter.items())
+                ])
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def write_prometheus(path, metrics):
+    """Write ``metrics.prometheus_text()`` to ``path`` atomically (temp file + rename)."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(metrics.prometheus_text())
+    os.replace(tmp, path)
+
+
+class MetricsHTTPServer:
+    """Serve ``metrics.prometheus_text()`` at ``http://host:port/metrics`` from a daemon thread."""
+
+    def __init__(self, metrics, host="127.0.0.1", port=9502):
+        self.metrics = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split("?", 1)[0] != "/metrics":
+                    handler.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode("utf-8")
+                handler.send_response(200)
+                handler.send_header("Content-Type", CONTENT_TYPE)
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                pass    # scrapes would flood the log
+
+        self._server = ThreadingHTTPServer((host, port), Handler)   # raises OSError if the port is taken
+        self._server.daemon_threads = True
+        self.address = self._server.server_address
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,124 @@
+"""Device list and pooled Modbus TCP connections for the polling engine.
+
+One client is kept per endpoint (host, port); devices that share a gateway
+but differ in unit ID share its socket. Each device also gets a semaphore so
+the number of requests it has in flight can be capped.
+
+With ``pipeline_window`` above 1 the clients are ``PipelinedClient``s, which
+keep that many transactions outstanding per socket; otherwise they are
+pymodbus' ``AsyncModbusTcpClient``, which sends one at a time.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+
+from pymodbus.client import AsyncModbusTcpClient
+
+from .client_metrics import timing_trace
+from .pipeline import PipelinedClient
+from .recorder import per_connection
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Device:
+    name: str
+    host: str
+    port: int = 502
+    unit_id: int = 1
+
+    @property
+    def endpoint(self):
+        return (self.host, self.port)
+
+
+def parse_devices(text, default_port=502):
+    """Parse one device per line as ``[name=]host[:port][/unit]``.
+
+    Blank lines and lines starting with ``#`` are ignored. Raises
+    ``ValueError`` naming the offending line.
+    """
+    devices = []
+    for line_no, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            name, sep, spec = line.partition("=")
+            if not sep:
+                name, spec = line, line
+            spec, _, unit = spec.partition("/")
+            host, _, port = spec.partition(":")
+            device = Device(
+                name=name.strip(),
+                host=host.strip(),
+                port=int(port) if port else default_port,
+                unit_id=int(unit) if unit else 1,
+            )
+        except ValueError:
+            raise ValueError(f"Line {line_no}: expected [name=]host[:port][/unit], got {line!r}") from None
+        if not device.host or not 0 < device.port < 65536 or not 0 <= device.unit_id <= 255:
+            raise ValueError(f"Line {line_no}: invalid device {line!r}")
+        devices.append(device)
+    return devices
+
+
+class ConnectionPool:
+    """Hand out one persistent, connected client per endpoint.
+
+    Must only be used from the event loop that owns it.
+    """
+
+    def __init__(self, timeout=3, max_in_flight=1, trace_pdu=None, pipeline_window=1, metrics=None):
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self.trace_pdu = trace_pdu
+        self.pipeline_window = pipeline_window
+        self.metrics = metrics      # client_metrics.ClientMetrics: connects, reconnects, failures
+        self._clients = {}
+        self._connect_locks = {}
+        self._limits = {}
+
+    def limit(self, device):
+        """Semaphore capping the concurrent requests sent to ``device``."""
+        sem = self._limits.get(device.name)
+        if sem is None:
+            sem = self._limits[device.name] = asyncio.Semaphore(self.max_in_flight)
+        return sem
+
+    async def get(self, device):
+        """Return a connected client for ``device``'s endpoint, or ``None`` if unreachable."""
+        endpoint = device.endpoint
+        lock = self._connect_locks.setdefault(endpoint, asyncio.Lock())
+        async with lock:
+            client = self._clients.get(endpoint)
+            reconnect = client is not None
+            if client is None:
+                client = self._clients[endpoint] = self._create(device)
+            if client.connected:
+                return client
+            try:
+                ok = await client.connect()
+            except Exception as e:
+                log.debug("Connect to %s:%s raised %s", device.host, device.port, e)
+                ok = False
+            if self.metrics is not None:
+                self.metrics.record_connect(device.name, ok, reconnect)
+            return client if ok else None
+
+    def _create(self, device):
+        trace_pdu = timing_trace(per_connection(self.trace_pdu))    # see client_metrics.sent_at
+        if self.pipeline_window > 1:
+            return PipelinedClient(
+                device.host, port=device.port, window=self.pipeline_window,
+                timeout=self.timeout, trace_pdu=trace_pdu,
+            )
+        return AsyncModbusTcpClient(device.host, port=device.port, timeout=self.timeout, trace_pdu=trace_pdu)
+
+    async def close(self):
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            client.close()
+        await asyncio.gather(*(client.wait_closed() for client in clients if isinstance(client, PipelinedClient)))
@@ -0,0 +1,164 @@
+"""Compact full-address-space datablocks for Server mode.
+
+``RegisterArrayBlock`` keeps holding/input registers in an ``array('H')`` and
+``BitArrayBlock`` keeps coils/discrete inputs packed eight to a byte in a
+``bytearray``. Both cover all 65536 protocol addresses (about 128 KiB per
+register table and 8 KiB per bit table) and move data with slice copies
+through a ``memoryview``, table lookups run by ``map`` and, to pack bit
+writes, NumPy's ``packbits``, never with a Python loop per element.
+
+Note that ``ModbusSlaveContext`` adds 1 to every address before it reaches a
+datablock, so the blocks start at address 1 by default.
+
+``NotifyingSlaveContext`` returns the datablock's result from ``setValues``
+(pymodbus' own context drops it, so a write past the end of a table would be
+acknowledged without writing anything) and, with ``on_change``, calls
+``on_change(function_code, address, count)`` after every successful one, with
+the table's read function code (1-4) and the protocol address, so the GUI can
+follow the datastore without polling it (see ``change_tracker``).
+"""
+from array import array
+from itertools import chain
+
+import numpy as np
+from pymodbus.datastore import ModbusSlaveContext
+from pymodbus.datastore.store import BaseModbusDataBlock
+from pymodbus.pdu import ExceptionResponse
+
+ADDRESS_SPACE = 65536
+
+# Byte value -> its eight bits, least significant first (Modbus bit order).
+_UNPACK = tuple(tuple(bool(value >> bit & 1) for bit in range(8)) for value in range(256))
+
+
+class RegisterArrayBlock(BaseModbusDataBlock):
+    """16-bit registers stored in an ``array('H')``."""
+
+    def __init__(self, address=1, count=ADDRESS_SPACE, default=0):
+        self.address = address
+        self.default_value = default
+        self.values = array("H", [default]) * count
+        self._view = memoryview(self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def _start(self, address, count):
+        start = address - self.address
+        if start < 0 or count < 0 or start + count > len(self.values):
+            return None
+        return start
+
+    def reset(self):
+        self._view[:] = array("H", [self.default_value]) * len(self.values)
+
+    def getValues(self, address, count=1):
+        start = self._start(address, count)
+        if start is None:
+            return ExceptionResponse.ILLEGAL_ADDRESS
+        return self._view[start:start + count].tolist()
+
+    def setValues(self, address, values):
+        if isinstance(values, int):
+            values = [values]
+        start = self._start(address, len(values))
+        if start is None:
+            return ExceptionResponse.ILLEGAL_ADDRESS
+        try:
+            block = values if isinstance(values, array) and values.typecode == "H" else array("H", values)
+        except (OverflowError, TypeError):
+            return ExceptionResponse.ILLEGAL_VALUE
+        self._view[start:start + len(block)] = block
+        return None
+
+
+class BitArrayBlock(BaseModbusDataBlock):
+    """Single bits packed eight per byte, least significant bit first."""
+
+    def __init__(self, address=1, count=ADDRESS_SPACE, default=False):
+        self.address = address
+        self.count = count
+        self.default_value = bool(default)
+        self.values = bytearray(b"\xff" if default else b"\x00") * ((count + 7) // 8)
+        self._view = memoryview(self.values)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return enumerate(self._bits(0, self.count), self.address)
+
+    def __str__(self):
+        return f"DataStore({self.count}, {self.default_value})"
+
+    def _start(self, address, count):
+        start = address - self.address
+        if start < 0 or count < 0 or start + count > self.count:
+            return None
+        return start
+
+    def _bits(self, start, count):
+        """Unpack ``count`` bits from bit offset ``start`` into a list of bools."""
+        first, last = start >> 3, (start + count + 7) >> 3
+        bits = list(chain.from_iterable(map(_UNPACK.__getitem__, self._view[first:last])))
+        shift = start & 7
+        return bits[shift:shift + count]
+
+    def reset(self):
+        self._view[:] = (b"\xff" if self.default_value else b"\x00") * len(self.values)
+
+    def getValues(self, address, count=1):
+        start = self._start(address, count)
+        if start is None:
+            return ExceptionResponse.ILLEGAL_ADDRESS
+        return self._bits(start, count)
+
+    def setValues(self, address, values):
+        if not isinstance(values, (list, tuple, bytes, bytearray)):
+            values = [values]
+        start = self._start(address, len(values))
+        if start is None:
+            return ExceptionResponse.ILLEGAL_ADDRESS
+        if not values:
+            return None
+        end = start + len(values)
+        # Widen to whole bytes, keeping the neighbouring bits that are not written.
+        lo, hi = start >> 3, (end + 7) >> 3
+        bits = np.unpackbits(np.frombuffer(self._view[lo:hi], np.uint8), bitorder="little")
+        if isinstance(values, (bytes, bytearray)):
+            bits[start - 8 * lo:end - 8 * lo] = np.frombuffer(values, np.uint8) != 0
+        else:
+            bits[start - 8 * lo:end - 8 * lo] = np.fromiter(map(bool, values), bool, len(values))
+        self._view[lo:hi] = np.packbits(bits, bitorder="little").tobytes()
+        return None
+
+
+# Datastore key -> read function code reported to ``on_change``.
+TABLE_FUNCTION_CODES = {"c": 1, "d": 2, "h": 3, "i": 4}
+
+
+class NotifyingSlaveContext(ModbusSlaveContext):
+    """``ModbusSlaveContext`` that rejects out-of-range writes and reports the range of every successful one."""
+
+    def __init__(self, *args, on_change=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_change = on_change
+
+    def setValues(self, fc_as_hex, address, values):
+        table = self.decode(fc_as_hex)
+        count = 1 if isinstance(values, int) else len(values)
+        rc = self.store[table].setValues(address + 1, values)
+        if not rc and self.on_change is not None:
+            self.on_change(TABLE_FUNCTION_CODES[table], address, count)
+        return rc
+
+
+def create_slave_context(count=ADDRESS_SPACE, on_change=None):
+    """Return a ``NotifyingSlaveContext`` covering protocol addresses 0..count-1 in every table."""
+    blocks = {
+        "di": BitArrayBlock(count=count),
+        "co": BitArrayBlock(count=count),
+        "hr": RegisterArrayBlock(count=count),
+        "ir": RegisterArrayBlock(count=count),
+    }
+    return NotifyingSlaveContext(on_change=on_change, **blocks)
@@ -0,0 +1,338 @@
+"""Concurrent Modbus TCP discovery: find listeners in a CIDR range, then their unit IDs.
+
+``NetworkScanner`` connects to every host/port of a network with at most
+``concurrency`` connection attempts in flight. Each listener it finds is
+probed over the same socket for unit IDs (1-247 by default) with a
+one-register read. Probes go one at a time by default because many servers
+(pymodbus' own included) drop requests that arrive pipelined; devices that
+queue them can be probed ``probe_window`` at a time, matched by transaction
+ID. Any normal or exception response counts as a responder, except the
+gateway exceptions 0x0A/0x0B which mean "no such unit behind this gateway".
+A reply whose MBAP header is not Modbus TCP (non-zero protocol ID or a
+length outside 2-254) marks the listener as not Modbus and ends its probing.
+
+Like ``PollingEngine``, the scanner runs on a private event loop thread and
+streams ``ListenerFound`` / ``UnitFound`` / ``DiscoveryComplete`` events into
+``NetworkScanner.results`` as they happen. ``scanned`` and ``total`` can be
+read at any time for progress.
+
+Run ``python Modbus_TCP_IP_Tester.py discover --help`` for the command line.
+"""
+import argparse
+import asyncio
+import ipaddress
+import json
+import queue
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+
+# Refuse networks larger than a /16 so a typo cannot start a scan of millions of hosts.
+MAX_HOSTS = 65536
+
+MBAP = struct.Struct(">HHHB")
+MAX_MBAP_LENGTH = 254       # unit ID + the largest PDU
+GATEWAY_EXCEPTIONS = (0x0A, 0x0B)
+
+
+@dataclass
+class ListenerFound:
+    host: str
+    port: int
+    connect_ms: float
+
+
+@dataclass
+class UnitFound:
+    host: str
+    port: int
+    unit_id: int
+    detail: str
+    latency_ms: float
+
+
+@dataclass
+class DiscoveryComplete:
+    duration: float
+    scanned: int
+    listeners: int
+    units: int
+    cancelled: bool = False
+    error: str = None
+
+
+def parse_ranges(text, minimum=1, maximum=65535, name="port"):
+    """Parse ``"502,1502,5020-5022"`` into a sorted list of integers."""
+    numbers = set()
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        try:
+            lo, hi = int(first), int(last or first)
+        except ValueError:
+            raise ValueError(f"Invalid {name} {part!r}") from None
+        if not minimum <= lo <= hi <= maximum:
+            raise ValueError(f"Invalid {name} range {part!r} (allowed {minimum}-{maximum})")
+        numbers.update(range(lo, hi + 1))
+    if not numbers:
+        raise ValueError(f"No {name}s given")
+    return sorted(numbers)
+
+
+def network_hosts(network):
+    """Return the host addresses of a CIDR string (a bare address is a /32)."""
+    net = ipaddress.ip_network(network.strip(), strict=False)
+    if net.num_addresses > MAX_HOSTS:
+        raise ValueError(f"{net} has {net.num_addresses} addresses; the limit is {MAX_HOSTS}")
+    return [str(host) for host in net.hosts()] or [str(net.network_address)]
+
+
+class NetworkScanner:
+    def __init__(self, network, ports=(502,), concurrency=256, connect_timeout=0.5,
+                 probe_timeout=0.5, units=range(1, 248), probe_window=1, probe_function=3):
+        if probe_function not in (1, 2, 3, 4):
+            raise ValueError("probe_function must be a read function code (1-4)")
+        self.hosts = network_hosts(network)
+        self.ports = list(ports)
+        self.concurrency = concurrency
+        self.connect_timeout = connect_timeout
+        self.probe_timeout = probe_timeout
+        self.units = list(units)
+        self.probe_window = max(1, probe_window)
+        self.results = queue.Queue()
+        self.total = len(self.hosts) * len(self.ports)
+        self.scanned = 0
+        self.listeners = 0
+        self.units_found = 0
+
+        # Read one value at address 0 with the probe function code.
+        self._probe_pdu = struct.pack(">BHH", probe_function, 0, 1)
+        self._loop = None
+        self._thread = None
+        self._task = None
+
+    # --- Public API (called from the Tk thread) ---
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="modbus-discovery", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2):
+        if self._loop is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._cancel)
+        except RuntimeError:
+            pass  # loop already closed
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    # --- Event loop side ---
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._task = self._loop.create_task(self.scan())
+        try:
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    def _cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def scan(self):
+        """Scan every host/port, probing listeners as they are found."""
+        started = time.perf_counter()
+        targets = iter([(host, port) for host in self.hosts for port in self.ports])
+        probes = set()
+        cancelled = False
+        error = None
+
+        async def worker():
+            # Workers share one iterator, so at most ``concurrency`` connects are in flight.
+            for host, port in targets:
+                connection = await self._connect(host, port)
+                self.scanned += 1
+                if connection is not None:
+                    task = asyncio.create_task(self._probe_host(host, port, *connection))
+                    probes.add(task)
+                    task.add_done_callback(probes.discard)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, self.total))))
+            if probes:
+                await asyncio.gather(*list(probes))
+        except asyncio.CancelledError:
+            cancelled = True
+            for task in list(probes):
+                task.cancel()
+        except Exception as e:
+            error = str(e)
+        self.results.put(DiscoveryComplete(
+            time.perf_counter() - started, self.scanned, self.listeners, self.units_found, cancelled, error
+        ))
+
+    async def _connect(self, host, port):
+        started = time.perf_counter()
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), self.connect_timeout)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        self.listeners += 1
+        self.results.put(ListenerFound(host, port, round((time.perf_counter() - started) * 1000, 3)))
+        return reader, writer
+
+    async def _probe_host(self, host, port, reader, writer):
+        """Probe every unit ID, reconnecting a few times if the device drops the connection."""
+        todo = deque(self.units)
+        reconnects = 0
+        while todo:
+            try:
+                await self._probe_connection(host, port, reader, writer, todo)
+            finally:
+                writer.close()
+            if not todo or reconnects >= 3:
+                break
+            reconnects += 1
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), self.connect_timeout)
+            except (OSError, asyncio.TimeoutError):
+                break
+
+    async def _probe_connection(self, host, port, reader, writer, todo):
+        """Send probes for ``todo`` over one connection with ``probe_window`` outstanding.
+
+        Units whose probe was cut short by a dropped connection go back on ``todo``.
+        """
+        loop = asyncio.get_running_loop()
+        pending = {}
+        lost = []
+        garbled = False
+
+        async def receive():
+            nonlocal garbled
+            try:
+                while True:
+                    tid, protocol, length, _ = MBAP.unpack(await reader.readexactly(MBAP.size))
+                    if protocol != 0 or not 2 <= length <= MAX_MBAP_LENGTH:
+                        # Not a Modbus TCP answer: none of the outstanding probes will get one.
+                        garbled = True
+                        for future in pending.values():
+                            if not future.done():
+                                future.set_result(b"")
+                        return
+                    pdu = await reader.readexactly(length - 1)
+                    future = pending.get(tid)
+                    if future is not None and not future.done():
+                        future.set_result(pdu)
+            except (OSError, asyncio.IncompleteReadError, struct.error):
+                for future in pending.values():
+                    if not future.done():
+                        future.set_exception(ConnectionError("connection closed"))
+
+        receiver = asyncio.create_task(receive())
+        window = asyncio.Semaphore(self.probe_window)
+
+        async def probe(unit, tid):
+            future = pending[tid] = loop.create_future()
+            started = time.perf_counter()
+            try:
+                writer.write(MBAP.pack(tid, 0, len(self._probe_pdu) + 1, unit) + self._probe_pdu)
+                pdu = await asyncio.wait_for(future, self.probe_timeout)
+            except asyncio.TimeoutError:
+                return
+            except ConnectionError:
+                lost.append(unit)
+                return
+            finally:
+                pending.pop(tid, None)
+                window.release()
+            detail = self._classify(pdu)
+            if detail is not None:
+                self.units_found += 1
+                self.results.put(UnitFound(host, port, unit, detail, round((time.perf_counter() - started) * 1000, 3)))
+
+        tasks = []
+        tid = 0
+        try:
+            while todo:
+                await window.acquire()
+                if receiver.done():
+                    window.release()
+                    break
+                tid = tid % 0xFFFF + 1
+                tasks.append(asyncio.create_task(probe(todo.popleft(), tid)))
+            await asyncio.gather(*tasks)
+        finally:
+            receiver.cancel()
+            for task in tasks:
+                task.cancel()
+        if garbled:
+            todo.clear()        # the listener does not speak Modbus TCP; do not reconnect to it
+            return
+        todo.extendleft(reversed(sorted(lost)))
+
+    def _classify(self, pdu):
+        """Describe a probe response, or return ``None`` if it means no unit answered."""
+        if not pdu:
+            return None
+        if pdu[0] & 0x80:
+            code = pdu[1] if len(pdu) > 1 else 0
+            if code in GATEWAY_EXCEPTIONS:
+                return None
+            return f"exception {code}"
+        return "ok"
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="Modbus_TCP_IP_Tester.py discover",
+        description="Find Modbus TCP listeners in a network and the unit IDs that answer.",
+    )
+    parser.add_argument("network", help="CIDR range to scan, e.g. 192.168.1.0/24")
+    parser.add_argument("-p", "--ports", default="502", help="Ports to try, e.g. 502,1502,5020-5022")
+    parser.add_argument("-c", "--concurrency", type=int, default=256, help="Connection attempts in flight")
+    parser.add_argument("--connect-timeout", type=float, default=0.5, help="Seconds per connection attempt")
+    parser.add_argument("--probe-timeout", type=float, default=0.5, help="Seconds to wait for each unit probe")
+    parser.add_argument("--units", default="1-247", help="Unit IDs to probe, e.g. 1-247 or 1,2,10-20 (empty = none)")
+    parser.add_argument("--window", type=int, default=1,
+                        help="Unit probes outstanding per host (only for devices that queue pipelined requests)")
+    parser.add_argument("--fc", type=int, default=3, choices=[1, 2, 3, 4], help="Function code of the probe read")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        units = parse_ranges(args.units, 0, 255, "unit ID") if args.units.strip() else []
+        scanner = NetworkScanner(
+            args.network, ports=parse_ranges(args.ports), concurrency=max(1, args.concurrency),
+            connect_timeout=args.connect_timeout, probe_timeout=args.probe_timeout,
+            units=units, probe_window=args.window, probe_function=args.fc,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    # Stream one JSON object per event, as they arrive.
+    scanner.start()
+    try:
+        while True:
+            event = scanner.results.get()
+            print(json.dumps({"event": type(event).__name__, **asdict(event)}), flush=True)
+            if isinstance(event, DiscoveryComplete):
+                return 0 if event.listeners else 1
+    except KeyboardInterrupt:
+        scanner.stop()
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""Streaming export of polled samples to CSV or Parquet files.
+
+Every sample is one row in long format::
+
+    timestamp, device, table, address, value
+
+with the timestamp in Unix seconds. ``ExportSink.write`` is called on the
+GUI thread with each block the poller read; it only appends a reference to
+the block to a pending list, so it costs the same for 1 value or 2000. A
+background thread takes the whole list when ``flush_rows`` samples are
+pending or ``flush_interval`` seconds have passed, and writes it as one
+batch: a single ``csv.writer.writerows`` call, or one Parquet row group
+built with NumPy.
+
+The pending list is bounded at ``buffer_rows`` samples. If the disk cannot
+keep up, further blocks are counted in ``dropped`` instead of being queued,
+so a slow disk never stalls polling or grows memory without limit.
+
+Files are named after the configured path and the time they were started
+(``export.csv`` -> ``export-20250101-120000.csv``). A new file is started
+once the current one reaches ``max_bytes`` or is ``max_seconds`` old,
+checked after every batch. CSV can be gzip-compressed (``.gz`` is appended
+to the name); Parquet supports snappy, gzip, zstd or none and needs the
+optional ``pyarrow`` package. A Parquet file is only readable once it is
+closed (on rotation or ``close``), so use time-based rotation to bound what
+a crash can lose.
+"""
+import csv
+import gzip
+import io
+import os
+import threading
+import time
+from itertools import chain, repeat
+
+import numpy as np
+
+CSV, PARQUET = "csv", "parquet"
+COMPRESSION = {CSV: ("none", "gzip"), PARQUET: ("none", "snappy", "gzip", "zstd")}
+COLUMNS = ("timestamp", "device", "table", "address", "value")
+
+BUFFER_ROWS = 500_000
+FLUSH_ROWS = 50_000
+FLUSH_INTERVAL = 1.0
+
+
+def export_format(path):
+    """``CSV`` or ``PARQUET`` from the file name; raises ``ValueError`` for anything else."""
+    name = path.lower()
+    if name.endswith((".parquet", ".pq")):
+        return PARQUET
+    if name.endswith((".csv", ".csv.gz")):
+        return CSV
+    raise ValueError(f"{path}: export files must end in .csv, .csv.gz or .parquet")
+
+
+class _CsvFile:
+    def __init__(self, path, compression):
+        self._raw = open(path, "wb")
+        self._gzip = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=6) if compression == "gzip" else None
+        self._text = io.TextIOWrapper(self._gzip or self._raw, encoding="utf-8", newline="")
+        self._writer = csv.writer(self._text)
+        self._writer.writerow(COLUMNS)
+
+    def write(self, batch):
+        writerows = self._writer.writerows
+        for timestamp, device, table, address, values in batch:
+            addresses = range(address, address + len(values))
+            if values and isinstance(values[0], bool):
+                values = map(int, values)
+            writerows(zip(repeat(f"{timestamp:.3f}"), repeat(device), repeat(table), addresses, values))
+        self._text.flush()
+
+    def size(self):
+        return self._raw.tell()
+
+    def close(self):
+        self._text.close()      # closes the gzip stream and the file under it
+
+
+class _ParquetFile:
+    def __init__(self, path, compression):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        self.schema = pa.schema([
+            ("timestamp", pa.timestamp("ms", tz="UTC")),
+            ("device", pa.dictionary(pa.int32(), pa.string())),
+            ("table", pa.dictionary(pa.int32(), pa.string())),
+            ("address", pa.uint16()),
+            ("value", pa.uint16()),
+        ])
+        self._raw = open(path, "wb")
+        try:
+            self._writer = pq.ParquetWriter(self._raw, self.schema, compression=compression)
+        except Exception:
+            self._raw.close()
+            raise
+
+    @staticmethod
+    def _dictionary(pa, names, counts):
+        codes = {}
+        indices = np.fromiter((codes.setdefault(name, len(codes)) for name in names), np.int32, len(names))
+        return pa.DictionaryArray.from_arrays(np.repeat(indices, counts), list(codes))
+
+    def write(self, batch):
+        pa = self._pa
+        timestamps, devices, tables, addresses, blocks = zip(*batch)
+        counts = np.fromiter(map(len, blocks), np.int64, len(blocks))
+        total = int(counts.sum())
+        # Address of row k is k minus the row index where its block starts, plus the block's first address.
+        starts = np.cumsum(counts) - counts
+        address = np.arange(total, dtype=np.int64) - np.repeat(starts - np.array(addresses, np.int64), counts)
+        millis = np.repeat(np.round(np.array(timestamps) * 1000).astype(np.int64), counts)
+        table = pa.Table.from_arrays([
+            pa.array(millis, self.schema.field("timestamp").type),
+            self._dictionary(pa, devices, counts),
+            self._dictionary(pa, tables, counts),
+            pa.array(address.astype(np.uint16)),
+            pa.array(np.fromiter(chain.from_iterable(blocks), np.uint16, total)),
+        ], schema=self.schema)
+        self._writer.write_table(table)
+
+    def size(self):
+        return self._raw.tell()
+
+    def close(self):
+        try:
+            self._writer.close()
+        finally:
+            self._raw.close()
+
+
+class ExportSink:
+    """Batch polled samples to rotating CSV or Parquet files on a background thread."""
+
+    def __init__(self, path, compression="none", max_bytes=0, max_seconds=0, buffer_rows=BUFFER_ROWS,
+                 flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL):
+        self.format = export_format(path)
+        if compression not in COMPRESSION[self.format]:
+            raise ValueError(f"{self.format.upper()} export supports compression {', '.join(COMPRESSION[self.format])}")
+        if self.format == PARQUET:
+            try:
+                import pyarrow.parquet  # noqa: F401
+            except ImportError:
+                raise ValueError("Parquet export needs pyarrow (pip install pyarrow)") from None
+        if path.lower().endswith(".gz"):
+            path, compression = path[:-3], "gzip"
+        self.compression = compression
+        self._stem, self._suffix = os.path.splitext(path)
+        if compression == "gzip" and self.format == CSV:
+            self._suffix += ".gz"
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.buffer_rows = buffer_rows
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+
+        self.rows = 0           # samples written to disk
+        self.dropped = 0        # samples refused because the buffer was full
+        self.paths = []         # every file started, oldest first
+        self.error = None       # the exception that stopped the writer, if any
+
+        self._file = None
+        self._opened = 0.0
+        self._pending = []
+        self._pending_rows = 0
+        self._closing = False
+        self._cond = threading.Condition()
+        self._open_file()       # fail here, not on the writer thread, if the path is unusable
+        self._thread = threading.Thread(target=self._run, name="export", daemon=True)
+        self._thread.start()
+
+    @property
+    def path(self):
+        """The file currently being written."""
+        return self.paths[-1]
+
+    def write(self, device, table, address, timestamp, values):
+        """Queue one block of samples; returns ``False`` once the writer has failed (see ``error``)."""
+        if self.error is not None:
+            return False
+        n = len(values)
+        with self._cond:
+            if self._closing or self._pending_rows + n > self.buffer_rows:
+                self.dropped += n
+                return True
+            self._pending.append((timestamp, device, table, address, values))
+            self._pending_rows += n
+            if self._pending_rows >= self.flush_rows:
+                self._cond.notify()
+        return True
+
+    def close(self):
+        """Write everything still pending, close the current file and stop the writer thread."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _open_file(self):
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = f"{self._stem}-{stamp}{self._suffix}"
+        n = 1
+        while os.path.exists(path):
+            path = f"{self._stem}-{stamp}-{n}{self._suffix}"
+            n += 1
+        factory = _ParquetFile if self.format == PARQUET else _CsvFile
+        self._file = factory(path, self.compression)
+        self._opened = time.monotonic()
+        self.paths.append(path)
+
+    def _run(self):
+        closing = False
+        while not closing:
+            with self._cond:
+                if not self._closing and self._pending_rows < self.flush_rows:
+                    self._cond.wait(self.flush_interval)
+                batch, self._pending = self._pending, []
+                rows, self._pending_rows = self._pending_rows, 0
+                closing = self._closing
+            try:
+                if batch:
+                    self._file.write(batch)
+                    self.rows += rows
+                    if (self.max_bytes and self._file.size() >= self.max_bytes) or \
+                            (self.max_seconds and time.monotonic() - self._opened >= self.max_seconds):
+                        self._file.close()
+                        self._file = None
+                        self._open_file()
+            except Exception as e:
+                self.error = e
+                closing = True
+        if self._file is not None:
+            try:
+                self._file.close()
+            except Exception as e:
+                self.error = self.error or e
+            self._file = None
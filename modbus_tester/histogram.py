@@ -0,0 +1,93 @@
+"""Compact log-linear latency histogram.
+
+Values are recorded in microseconds into buckets that are linear below
+``2 * SUB_BUCKETS`` and then split every power of two into ``SUB_BUCKETS``
+equal parts, which bounds the relative error of any reported percentile to
+about 1/SUB_BUCKETS (6 %) while keeping memory to a few hundred counters.
+"""
+
+SUB_BITS = 4
+SUB_BUCKETS = 1 << SUB_BITS
+
+
+def _bucket_index(us):
+    if us < 2 * SUB_BUCKETS:
+        return us
+    shift = us.bit_length() - (SUB_BITS + 1)
+    return (shift + 1) * SUB_BUCKETS + (us >> shift) - SUB_BUCKETS
+
+
+def _bucket_upper(index):
+    """Exclusive upper bound, in microseconds, of bucket ``index``."""
+    if index < 2 * SUB_BUCKETS:
+        return index + 1
+    shift = index // SUB_BUCKETS - 1
+    return (index % SUB_BUCKETS + SUB_BUCKETS + 1) << shift
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, seconds):
+        us = max(0, int(seconds * 1_000_000))
+        index = _bucket_index(us)
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def merge(self, other):
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for index, n in enumerate(other.counts):
+            self.counts[index] += n
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def percentile(self, pct):
+        """Latency in seconds below which ``pct`` percent of samples fall."""
+        if not self.count:
+            return 0.0
+        target = max(1, round(self.count * pct / 100.0))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return min(_bucket_upper(index) / 1_000_000, self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def buckets(self):
+        """Yield ``(upper_bound_seconds, count)`` for every non-empty bucket."""
+        for index, n in enumerate(self.counts):
+            if n:
+                yield _bucket_upper(index) / 1_000_000, n
+
+    def summary_ms(self, include_buckets=False):
+        """Summary in milliseconds, suitable for JSON output."""
+        summary = {
+            "count": self.count,
+            "min": round((self.min or 0.0) * 1000, 3),
+            "mean": round(self.mean * 1000, 3),
+            "p50": round(self.percentile(50) * 1000, 3),
+            "p95": round(self.percentile(95) * 1000, 3),
+            "p99": round(self.percentile(99) * 1000, 3),
+            "max": round((self.max or 0.0) * 1000, 3),
+        }
+        if include_buckets:
+            summary["histogram"] = [[round(upper * 1000, 3), n] for upper, n in self.buckets()]
+        return summary
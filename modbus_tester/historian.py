@@ -0,0 +1,237 @@
+"""In-process historian for polled values, and decimation for trend charts.
+
+Only watched tags ``(device, reg_type, address)`` are recorded - the GUI
+watches the tags on the Trend tab - so polling a full 65536-address table
+costs nothing here unless some of it is trended. ``record`` maps each
+polled block once to the watched tags inside it and afterwards only
+touches those.
+
+Samples are kept per tag in columnar chunks: a preallocated
+``array('d')`` of timestamps and one of values. Chunks start at
+``MIN_CHUNK`` samples and double in size up to ``MAX_CHUNK``, so a tag that
+is polled rarely costs little memory and a busy one appends into a flat
+buffer without reallocating. Whole chunks older than the retention window
+are dropped, and once all series together take more than ``max_bytes`` the
+oldest chunks go first, whatever the retention.
+
+``minmax_decimate`` and ``lttb_decimate`` reduce a series to about as many
+points as there are pixels to draw, so an hour of 100 ms samples is drawn
+as cheaply as a few hundred.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+
+MIN_CHUNK = 16
+MAX_CHUNK = 8192
+
+# Memory all series may take together (16 bytes per allocated sample).
+MAX_BYTES = 64 * 1024 * 1024
+
+# How often (seconds of sample time) ``record`` sweeps expired chunks.
+TRIM_INTERVAL = 5.0
+
+
+class _Chunk:
+    __slots__ = ("times", "values", "size")
+
+    def __init__(self, capacity):
+        self.times = array("d", bytes(8 * capacity))
+        self.values = array("d", bytes(8 * capacity))
+        self.size = 0
+
+
+class TagHistory:
+    """Append-only (timestamp, value) series for a single tag."""
+
+    def __init__(self):
+        self.chunks = deque()
+        self.nbytes = 0
+        self._tail = None
+        self._capacity = MIN_CHUNK
+
+    def __len__(self):
+        return sum(chunk.size for chunk in self.chunks)
+
+    def append(self, timestamp, value):
+        chunk = self._tail
+        if chunk is None or chunk.size == len(chunk.times):
+            chunk = self._tail = _Chunk(self._capacity)
+            self.chunks.append(chunk)
+            self.nbytes += 16 * self._capacity
+            self._capacity = min(self._capacity * 2, MAX_CHUNK)
+        i = chunk.size
+        chunk.times[i] = timestamp
+        chunk.values[i] = value
+        chunk.size = i + 1
+
+    def last(self):
+        """Return the newest ``(timestamp, value)``, or ``None`` if empty."""
+        chunk = self._tail
+        if chunk is None or not chunk.size:
+            return None
+        return chunk.times[chunk.size - 1], chunk.values[chunk.size - 1]
+
+    def trim(self, cutoff):
+        """Drop chunks whose newest sample is older than ``cutoff``. Returns ``True`` if now empty."""
+        chunks = self.chunks
+        while chunks and chunks[0].size and chunks[0].times[chunks[0].size - 1] < cutoff:
+            self.drop_oldest()
+        return not chunks
+
+    def drop_oldest(self):
+        """Drop the oldest chunk."""
+        chunk = self.chunks.popleft()
+        self.nbytes -= 16 * len(chunk.times)
+        if not self.chunks:
+            self._tail = None
+
+    def oldest(self):
+        """Timestamp of the oldest sample, or ``None`` if empty."""
+        return self.chunks[0].times[0] if self.chunks else None
+
+    def query(self, start=None, end=None):
+        """Return ``(times, values)`` arrays for samples with ``start <= t <= end``."""
+        times, values = array("d"), array("d")
+        for chunk in self.chunks:
+            n = chunk.size
+            if not n or (start is not None and chunk.times[n - 1] < start):
+                continue
+            if end is not None and chunk.times[0] > end:
+                break
+            lo = 0 if start is None else bisect_left(chunk.times, start, 0, n)
+            hi = n if end is None else bisect_right(chunk.times, end, lo, n)
+            times += chunk.times[lo:hi]
+            values += chunk.values[lo:hi]
+        return times, values
+
+
+class Historian:
+    """Per-tag history of watched tags with a retention window in seconds.
+
+    Not thread-safe: record and query from the same thread (the GUI thread).
+    """
+
+    def __init__(self, retention=3600.0, max_bytes=MAX_BYTES):
+        self.retention = retention
+        self.max_bytes = max_bytes
+        self.series = {}
+        self.watched = set()
+        self._blocks = {}           # (device, reg_type, address, count) -> [(offset, TagHistory)]
+        self._last_trim = 0.0
+
+    def watch(self, tag):
+        """Start recording ``tag``; samples polled before are not available."""
+        self.watched.add(tag)
+        self._blocks.clear()
+
+    def set_watched(self, tags):
+        """Record exactly ``tags`` from now on; history already kept stays until it expires."""
+        self.watched = set(tags)
+        self._blocks.clear()
+
+    def record(self, device, reg_type, address, timestamp, values):
+        """Append one polled block: ``values[i]`` is the sample for ``address + i``."""
+        if self.retention <= 0:
+            return
+        key = (device, reg_type, address, len(values))
+        block = self._blocks.get(key)
+        if block is None:
+            end = address + len(values)
+            block = self._blocks[key] = [
+                (tag[2] - address, self.series.setdefault(tag, TagHistory()))
+                for tag in self.watched
+                if tag[0] == device and tag[1] == reg_type and address <= tag[2] < end
+            ]
+        for offset, series in block:
+            series.append(timestamp, values[offset])
+        if timestamp - self._last_trim >= TRIM_INTERVAL:
+            self._last_trim = timestamp
+            self.trim(timestamp - self.retention)
+
+    def trim(self, cutoff):
+        """Drop history older than ``cutoff``, then the oldest chunks beyond ``max_bytes``."""
+        for series in self.series.values():
+            series.trim(cutoff)
+        total = self.nbytes
+        while total > self.max_bytes:
+            oldest = min((s for s in self.series.values() if s.chunks), key=TagHistory.oldest)
+            total -= oldest.nbytes
+            oldest.drop_oldest()
+            total += oldest.nbytes
+        expired = [tag for tag, series in self.series.items() if not series.chunks and tag not in self.watched]
+        if expired:
+            for tag in expired:
+                del self.series[tag]
+            self._blocks.clear()    # rebuilt on demand from the remaining series
+
+    @property
+    def nbytes(self):
+        return sum(series.nbytes for series in self.series.values())
+
+    def tags(self):
+        return sorted(self.series)
+
+    def query(self, tag, start=None, end=None):
+        series = self.series.get(tag)
+        if series is None:
+            return array("d"), array("d")
+        return series.query(start, end)
+
+    def sample_count(self):
+        return sum(len(series) for series in self.series.values())
+
+    def clear(self):
+        """Forget all history; watched tags keep being recorded."""
+        self.series.clear()
+        self._blocks.clear()
+
+
+def minmax_decimate(times, values, buckets):
+    """Keep the minimum and maximum of each of ``buckets`` equal-count slices, in time order."""
+    n = len(values)
+    if n <= 2 * buckets:
+        return list(times), list(values)
+    out_t, out_v = [], []
+    step = n / buckets
+    for b in range(buckets):
+        lo, hi = int(b * step), int((b + 1) * step)
+        segment = values[lo:hi]
+        i_min = lo + segment.index(min(segment))
+        i_max = lo + segment.index(max(segment))
+        for i in sorted({i_min, i_max}):
+            out_t.append(times[i])
+            out_v.append(values[i])
+    return out_t, out_v
+
+
+def lttb_decimate(times, values, threshold):
+    """Largest-Triangle-Three-Buckets downsampling to ``threshold`` points."""
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return list(times), list(values)
+    out_t, out_v = [times[0]], [values[0]]
+    step = (n - 2) / (threshold - 2)
+    a = 0
+    for b in range(threshold - 2):
+        # Average of the next bucket is the third corner of the triangle.
+        next_lo = int((b + 1) * step) + 1
+        next_hi = min(int((b + 2) * step) + 1, n)
+        span = next_hi - next_lo
+        avg_t = sum(times[next_lo:next_hi]) / span
+        avg_v = sum(values[next_lo:next_hi]) / span
+
+        lo, hi = int(b * step) + 1, int((b + 1) * step) + 1
+        at, av = times[a], values[a]
+        dt, dv = avg_t - at, avg_v - av
+        best, best_area = lo, -1.0
+        for i in range(lo, hi):
+            area = abs(dt * (values[i] - av) - (times[i] - at) * dv)
+            if area > best_area:
+                best, best_area = i, area
+        out_t.append(times[best])
+        out_v.append(values[best])
+        a = best
+    out_t.append(times[n - 1])
+    out_v.append(values[n - 1])
+    return out_t, out_v
@@ -0,0 +1,246 @@
+"""Headless load generator for capacity-testing Modbus TCP servers.
+
+Opens ``connections`` clients to one target and drives a weighted mix of
+function codes at an optional total request rate, then reports throughput,
+latency percentiles/histograms and error counts as JSON. With ``window``
+above 1 each connection is a ``PipelinedClient`` kept ``window`` requests
+deep.
+
+Run with ``python Modbus_TCP_IP_Tester.py bench --help`` or
+``python -m modbus_tester.load_generator --help``.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from pymodbus.client import AsyncModbusTcpClient
+from pymodbus.exceptions import ModbusException, ModbusIOException
+
+from .histogram import LatencyHistogram
+from .pipeline import MAX_WINDOW, PipelinedClient
+from .polling import READ_METHODS
+
+FC_REG_TYPES = {
+    1: "Coils",
+    2: "Discrete Inputs",
+    3: "Holding Registers",
+    4: "Input Registers",
+}
+
+# Write function codes; they write zeros so the target state is predictable.
+FC_WRITES = {
+    5: ("write_coil", False),
+    6: ("write_register", 0),
+    15: ("write_coils", None),
+    16: ("write_registers", None),
+}
+
+
+# Maximum quantity per request for the multi-value function codes.
+COUNT_LIMITS = {1: 2000, 2: 2000, 3: 125, 4: 125, 15: 1968, 16: 123}
+
+
+def parse_mix(text):
+    """Parse ``"3:70,4:20,1:10"`` into ``{3: 70.0, 4: 20.0, 1: 10.0}``."""
+    mix = {}
+    for part in text.split(","):
+        fc, _, weight = part.strip().partition(":")
+        fc = int(fc)
+        if fc not in FC_REG_TYPES and fc not in FC_WRITES:
+            raise ValueError(f"Unsupported function code {fc}")
+        mix[fc] = float(weight) if weight else 1.0
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("Function-code mix must have a positive total weight")
+    return mix
+
+
+class LoadStats:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.per_function = {}
+        self.sent = 0
+        self.ok = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.exceptions = {}
+
+    def function(self, fc):
+        hist = self.per_function.get(fc)
+        if hist is None:
+            hist = self.per_function[fc] = LatencyHistogram()
+        return hist
+
+
+def _request(client, fc, address, count, unit):
+    """Return the client coroutine for one request of function code ``fc``."""
+    if fc in FC_REG_TYPES:
+        method = getattr(client, READ_METHODS[FC_REG_TYPES[fc]])
+        return method(address, count=count, slave=unit)
+    name, value = FC_WRITES[fc]
+    if value is None:
+        value = [False] * count if fc == 15 else [0] * count
+    return getattr(client, name)(address, value, slave=unit)
+
+
+async def _worker(host, port, unit, mix, rate, deadline, address, count, timeout, stats, window=1):
+    if window > 1:
+        client = PipelinedClient(host, port=port, window=window, timeout=timeout)
+    else:
+        client = AsyncModbusTcpClient(host, port=port, timeout=timeout, retries=0)
+    try:
+        if not await client.connect():
+            stats.errors += 1
+            return
+        # One sender per window slot, all sharing the connection and its rate.
+        await asyncio.gather(*(
+            _send_loop(client, unit, mix, rate / window, deadline, address, count, timeout, stats)
+            for _ in range(window)
+        ))
+    finally:
+        client.close()
+        if window > 1:
+            await client.wait_closed()
+
+
+async def _send_loop(client, unit, mix, rate, deadline, address, count, timeout, stats):
+    codes, weights = list(mix), list(mix.values())
+    period = 1.0 / rate if rate > 0 else 0.0
+    next_send = time.monotonic()
+    while time.monotonic() < deadline:
+        if period:
+            delay = next_send - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            next_send += period
+        if not client.connected and not await client.connect():
+            stats.errors += 1
+            await asyncio.sleep(timeout)
+            continue
+
+        fc = random.choices(codes, weights)[0]
+        stats.sent += 1
+        started = time.perf_counter()
+        try:
+            rr = await _request(client, fc, address, count, unit)
+        except ModbusIOException:
+            stats.timeouts += 1
+            continue
+        except ModbusException:
+            stats.errors += 1
+            continue
+        elapsed = time.perf_counter() - started
+
+        if rr.isError():
+            code = getattr(rr, "exception_code", 0)
+            stats.exceptions[code] = stats.exceptions.get(code, 0) + 1
+            continue
+        stats.ok += 1
+        stats.latency.record(elapsed)
+        stats.function(fc).record(elapsed)
+
+
+async def run_load_test(host, port=502, unit=1, connections=1, duration=10.0, rate=0.0,
+                        mix=None, address=0, count=10, timeout=3.0, window=1):
+    """Drive the target and return the report as a dict.
+
+    ``rate`` is the total requests per second across all connections
+    (``0`` = as fast as each connection can go). ``window`` is the number
+    of requests kept outstanding per connection.
+    """
+    mix = mix or {3: 1.0}
+    for fc in mix:
+        limit = COUNT_LIMITS.get(fc)
+        if limit and not 1 <= count <= limit:
+            raise ValueError(f"count {count} is out of range for FC{fc} (1-{limit})")
+
+    stats = LoadStats()
+    per_connection_rate = rate / connections if rate > 0 else 0.0
+    started = time.monotonic()
+    deadline = started + duration
+    await asyncio.gather(*(
+        _worker(host, port, unit, mix, per_connection_rate, deadline, address, count, timeout, stats, window)
+        for _ in range(connections)
+    ))
+    elapsed = time.monotonic() - started
+
+    return {
+        "target": f"{host}:{port}",
+        "unit": unit,
+        "connections": connections,
+        "window": window,
+        "duration_s": round(elapsed, 3),
+        "requested_rate": rate,
+        "mix": {str(fc): weight for fc, weight in mix.items()},
+        "address": address,
+        "count": count,
+        "requests": stats.sent,
+        "ok": stats.ok,
+        "timeouts": stats.timeouts,
+        "errors": stats.errors,
+        "exceptions": {str(code): n for code, n in sorted(stats.exceptions.items())},
+        "throughput_rps": round(stats.ok / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": stats.latency.summary_ms(include_buckets=True),
+        "per_function": {
+            str(fc): hist.summary_ms() for fc, hist in sorted(stats.per_function.items())
+        },
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="Modbus_TCP_IP_Tester.py bench",
+        description="Headless Modbus TCP load generator / benchmark.",
+    )
+    parser.add_argument("host", help="Target server IP or hostname")
+    parser.add_argument("-p", "--port", type=int, default=502)
+    parser.add_argument("-u", "--unit", type=int, default=1, help="Unit ID (default 1)")
+    parser.add_argument("-c", "--connections", type=int, default=1, help="Concurrent connections")
+    parser.add_argument("-d", "--duration", type=float, default=10.0, help="Test length in seconds")
+    parser.add_argument("-r", "--rate", type=float, default=0.0,
+                        help="Total requests/s across all connections (0 = unthrottled)")
+    parser.add_argument("-m", "--mix", default="3:1",
+                        help="Weighted function codes, e.g. 3:70,4:20,1:10 (writes 5/6/15/16 write zeros)")
+    parser.add_argument("-a", "--address", type=int, default=0, help="Start address of every request")
+    parser.add_argument("-n", "--count", type=int, default=10, help="Registers/bits per request")
+    parser.add_argument("-w", "--window", type=int, default=1,
+                        help="Requests pipelined per connection (1 = one at a time)")
+    parser.add_argument("-t", "--timeout", type=float, default=3.0, help="Per-request timeout in seconds")
+    parser.add_argument("-o", "--output", help="Write the JSON report here instead of stdout")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.connections < 1:
+        parser.error("--connections must be at least 1")
+    if not 1 <= args.window <= MAX_WINDOW:
+        parser.error(f"--window must be 1-{MAX_WINDOW}")
+
+    try:
+        report = asyncio.run(run_load_test(
+            args.host, port=args.port, unit=args.unit, connections=args.connections,
+            duration=args.duration, rate=args.rate, mix=mix, address=args.address,
+            count=args.count, timeout=args.timeout, window=args.window,
+        ))
+    except ValueError as e:
+        parser.error(str(e))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""Bounded, thread-safe log capture for the Log tab.
+
+``RingBufferHandler`` is a standard ``logging.Handler``: attach it to the root
+logger and it captures the application's messages as well as pymodbus' own
+logs, from any thread. It keeps the last ``capacity`` formatted records and a
+separate queue of records not yet shown, which the GUI drains in batches on a
+timer instead of touching the textbox for every message.
+"""
+import logging
+from collections import deque
+
+APP_LOGGER = "modbus_tester.app"
+
+
+class LogFormatter(logging.Formatter):
+    """``HH:MM:SS.mmm LEVEL message``; records from other loggers also show the logger name."""
+
+    def __init__(self):
+        super().__init__(datefmt="%H:%M:%S")
+
+    def format(self, record):
+        message = record.getMessage()
+        if record.exc_info:
+            message = f"{message}\n{self.formatException(record.exc_info)}"
+        if record.name != APP_LOGGER:
+            message = f"{record.name}: {message}"
+        return f"{self.formatTime(record, self.datefmt)}.{int(record.msecs):03d} {record.levelname:<7} {message}"
+
+
+class RingBufferHandler(logging.Handler):
+    def __init__(self, capacity=5000, level=logging.NOTSET):
+        super().__init__(level)
+        self.capacity = capacity
+        self.records = deque(maxlen=capacity)   # (created, levelno, line)
+        self._pending = deque(maxlen=capacity)
+        self.setFormatter(LogFormatter())
+
+    def emit(self, record):
+        try:
+            entry = (record.created, record.levelno, self.format(record))
+        except Exception:
+            self.handleError(record)
+            return
+        self.records.append(entry)
+        self._pending.append(entry)
+
+    def drain(self):
+        """Return and forget every record emitted since the previous call."""
+        self.acquire()
+        try:
+            pending = list(self._pending)
+            self._pending.clear()
+        finally:
+            self.release()
+        return pending
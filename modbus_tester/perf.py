@@ -0,0 +1,289 @@
+"""Loopback performance suite for catching regressions before a release.
+
+Two groups of measurements are taken, neither of which needs the GUI:
+
+* ``loopback`` - a ``ServerRunner`` is started in-process on 127.0.0.1 and
+  driven with ``load_generator``: requests/s and p50/p99 round-trip latency
+  per function code, FC3 throughput for block sizes from 1 to 125
+  registers, and the duration of a ``PollingEngine`` scan of 16 ranges.
+* ``hot paths`` - microbenchmarks of the per-value code the polling and
+  server paths run all the time: tag decoding/encoding and formatting,
+  register table updates, read/write planning, historian appends,
+  datastore access and simulation ticks. Each is the best of several
+  timed batches, in microseconds per call.
+
+Results are written as JSON (``{"metrics": {name: {"value", "unit",
+"better", "gate"}}, ...}``). Given ``--baseline``, every metric is compared
+with the stored value and the run fails (exit status 1) if a gated one is
+worse by more than ``--tolerance``; p99 latencies are too noisy over a
+short run to gate on and are only reported. Baselines only compare
+meaningfully on the machine (and load) that produced them; create one with
+``--save-baseline``.
+
+Run ``python Modbus_TCP_IP_Tester.py perf --help`` for the command line.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+from array import array
+
+from pymodbus.datastore import ModbusServerContext
+
+from .connection_pool import Device
+from .datastore import create_slave_context
+from .historian import Historian
+from .histogram import LatencyHistogram
+from .load_generator import run_load_test
+from .polling import PollingEngine, ReadRequest, ScanComplete
+from .read_planner import plan_reads
+from .register_grid import RegisterGrid
+from .server_runner import ServerRunner
+from .simulation import Signal, Simulator
+from .tags import BlockCodec
+from .write_planner import dirty_runs, plan_writes
+
+LOWER = "lower"
+HIGHER = "higher"
+
+FUNCTION_CODES = (1, 2, 3, 4, 5, 6, 15, 16)
+BLOCK_SIZES = (1, 8, 32, 64, 125)
+FORMAT_VERSION = 1
+
+
+def metric(value, unit, better=LOWER, gate=True):
+    """One result; metrics with ``gate=False`` (tail latencies) are reported but never fail a comparison."""
+    return {"value": round(value, 3), "unit": unit, "better": better, "gate": gate}
+
+
+def time_per_call(fn, number, repeat=9):
+    """Best of ``repeat`` batches of ``number`` calls, in microseconds per call."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, time.perf_counter() - started)
+    return best / number * 1e6
+
+
+class _HeadlessGrid(RegisterGrid):
+    """``RegisterGrid`` value handling without any widgets, for timing ``set_values``."""
+
+    def __init__(self, count, bits=False):     # no Tk frame: only the value arrays
+        self.start = 0
+        self.count = count
+        self.bits = bits
+        self.values = bytearray(count) if bits else array("H", bytes(2 * count))
+        self.known = bytearray(count)
+        self.dirty = bytearray(count)
+        self.renders = 0
+
+    def _schedule_render(self):
+        self.renders += 1
+
+
+def bench_hot_paths(scale=1.0):
+    n = max(1, int(2000 * scale))
+    metrics = {}
+
+    codec = BlockCodec("float32", 62, "CDAB")
+    registers = codec.encode([i * 1.5 for i in range(62)])
+    values = codec.decode(registers)
+    metrics["tags.decode_float32x62"] = metric(time_per_call(lambda: codec.decode(registers), n), "us")
+    metrics["tags.encode_float32x62"] = metric(time_per_call(lambda: codec.encode(values), n), "us")
+    metrics["tags.format_float32x62"] = metric(time_per_call(lambda: [codec.format(v) for v in values], n), "us")
+
+    grid = _HeadlessGrid(125)
+    blocks = [list(range(125)), list(range(1, 126))]
+    flip = iter(range(10 ** 9))
+    metrics["grid.set_values_125_changed"] = metric(
+        time_per_call(lambda: grid.set_values(blocks[next(flip) & 1]), n), "us"
+    )
+    metrics["grid.set_values_125_unchanged"] = metric(time_per_call(lambda: grid.set_values(blocks[0]), n), "us")
+
+    requests = [ReadRequest("Holding Registers", i * 20, 10) for i in range(200)]
+    metrics["planner.plan_reads_200"] = metric(time_per_call(lambda: plan_reads(requests, 10), n // 10 or 1), "us")
+    flags = bytearray(b"\x01\x01\x00" * 300)
+    cells = array("H", range(len(flags)))
+    metrics["planner.plan_writes_900"] = metric(
+        time_per_call(lambda: plan_writes("Holding Registers", dirty_runs(flags, cells)), n // 10 or 1), "us"
+    )
+
+    historian = Historian(retention=3600)
+    for address in range(0, 125, 16):
+        historian.watch(("perf", "Holding Registers", address))     # 8 trended tags in the block
+    ticks = iter(range(10 ** 9))
+    block = list(range(125))
+    metrics["historian.record_125"] = metric(
+        time_per_call(lambda: historian.record("perf", "Holding Registers", 0, next(ticks) * 0.1, block), n), "us"
+    )
+
+    slave = create_slave_context()
+    metrics["datastore.get_125"] = metric(time_per_call(lambda: slave.getValues(3, 0, 125), n), "us")
+    metrics["datastore.set_125"] = metric(time_per_call(lambda: slave.setValues(3, 0, block), n), "us")
+    metrics["datastore.get_2000_bits"] = metric(time_per_call(lambda: slave.getValues(1, 0, 2000), n), "us")
+
+    context = ModbusServerContext(slaves=slave, single=True)
+    simulator = Simulator(context, [Signal("hr", 0, 10000, "sine"), Signal("co", 0, 2000, "step")], seed=1)
+    metrics["simulation.step_12000"] = metric(
+        time_per_call(lambda: simulator.step(next(ticks) * 0.1, 0), max(1, n // 20)), "us"
+    )
+    return metrics
+
+
+def bench_loopback(duration=1.0, scans=50):
+    context = ModbusServerContext(slaves=create_slave_context(), single=True)
+    runner = ServerRunner(context, ("127.0.0.1", 0))
+    runner.start()
+    if not runner.ready.wait(5) or runner.error:
+        raise RuntimeError(f"Loopback server did not start: {runner.error or 'timeout'}")
+    host, port = runner.address
+    metrics = {}
+    try:
+        for fc in FUNCTION_CODES:
+            report = asyncio.run(run_load_test(host, port=port, duration=duration, mix={fc: 1.0}, count=10))
+            _check(report, f"FC{fc}")
+            metrics[f"loopback.fc{fc}.rps"] = metric(report["throughput_rps"], "req/s", HIGHER)
+            metrics[f"loopback.fc{fc}.p50"] = metric(report["latency_ms"]["p50"], "ms")
+            metrics[f"loopback.fc{fc}.p99"] = metric(report["latency_ms"]["p99"], "ms", gate=False)
+        for size in BLOCK_SIZES:
+            report = asyncio.run(run_load_test(host, port=port, duration=duration, mix={3: 1.0}, count=size))
+            _check(report, f"FC3 x{size}")
+            metrics[f"loopback.fc3_block{size}.rps"] = metric(report["throughput_rps"], "req/s", HIGHER)
+            metrics[f"loopback.fc3_block{size}.p50"] = metric(report["latency_ms"]["p50"], "ms")
+        scan = bench_poll_scan((host, port), scans)
+        metrics["loopback.poll_scan_16.p50"] = metric(scan.percentile(50) * 1000, "ms")
+        metrics["loopback.poll_scan_16.p99"] = metric(scan.percentile(99) * 1000, "ms", gate=False)
+    finally:
+        runner.stop()
+    return metrics
+
+
+def _check(report, name):
+    if not report["ok"]:
+        raise RuntimeError(f"{name}: no successful requests ({report['timeouts']} timeouts, {report['errors']} errors)")
+
+
+def bench_poll_scan(address, scans):
+    """Time ``scans`` manual scans of 16 separate 10-register ranges; returns a ``LatencyHistogram``."""
+    engine = PollingEngine([Device("perf", *address)])
+    engine.set_requests([ReadRequest("Holding Registers", i * 200, 10) for i in range(16)])
+    engine.start()
+    durations = LatencyHistogram()
+    try:
+        for _ in range(scans):
+            engine.poll_once()
+            while True:
+                event = engine.results.get(timeout=5)
+                if isinstance(event, ScanComplete):
+                    if event.errors:
+                        raise RuntimeError(f"Poll scan reported {event.errors} errors")
+                    durations.record(event.duration)
+                    break
+    finally:
+        engine.stop()
+    return durations
+
+
+def run_suite(loopback=True, hot_paths=True, duration=1.0, scale=1.0):
+    """Run the selected groups and return the result document."""
+    metrics = {}
+    if hot_paths:
+        metrics.update(bench_hot_paths(scale))
+    if loopback:
+        metrics.update(bench_loopback(duration, scans=max(5, int(50 * scale))))
+    return {
+        "version": FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "metrics": metrics,
+    }
+
+
+def compare(current, baseline, tolerance=0.3):
+    """Compare two result documents.
+
+    Returns ``(rows, regressions)``: one row ``(name, baseline, current,
+    change)`` per metric present in both, with ``change`` the relative
+    difference in the metric's "worse" direction, and the names of the
+    gated metrics worse by more than ``tolerance``.
+    """
+    rows, regressions = [], []
+    for name, base in sorted(baseline.get("metrics", {}).items()):
+        now = current["metrics"].get(name)
+        if now is None or not base["value"]:
+            continue
+        ratio = now["value"] / base["value"]
+        change = ratio - 1 if base.get("better", LOWER) == LOWER else 1 - ratio
+        rows.append((name, base["value"], now["value"], change))
+        if change > tolerance and base.get("gate", True):
+            regressions.append(name)
+    return rows, regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="Modbus_TCP_IP_Tester.py perf",
+        description="Loopback performance suite with baseline comparison.",
+    )
+    parser.add_argument("-o", "--output", help="Write the JSON results here instead of stdout")
+    parser.add_argument("-b", "--baseline", help="Compare with this results file; exit 1 on regression")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Also store the results as a new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="Allowed relative slowdown per metric before it counts as a regression")
+    parser.add_argument("-d", "--duration", type=float, default=1.0, help="Seconds per loopback measurement")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for hot-path iteration counts")
+    parser.add_argument("--no-loopback", action="store_true", help="Skip the client/server measurements")
+    parser.add_argument("--no-hot-paths", action="store_true", help="Skip the microbenchmarks")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.no_loopback and args.no_hot_paths:
+        parser.error("nothing to run")
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            parser.error(f"cannot read baseline: {e}")
+
+    try:
+        results = run_suite(not args.no_loopback, not args.no_hot_paths, args.duration, args.scale)
+    except RuntimeError as e:
+        print(f"perf: {e}", file=sys.stderr)
+        return 2
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            f.write(text + "\n")
+
+    if baseline is None:
+        return 0
+    rows, regressions = compare(results, baseline, args.tolerance)
+    for name, base, now, change in rows:
+        flag = "  REGRESSION" if name in regressions else ""
+        print(f"{name:40} {base:>12.3f} {now:>12.3f} {change:+8.1%}{flag}", file=sys.stderr)
+    if regressions:
+        print(f"perf: {len(regressions)} of {len(rows)} metrics regressed by more than {args.tolerance:.0%}",
+              file=sys.stderr)
+        return 1
+    print(f"perf: {len(rows)} metrics within {args.tolerance:.0%} of the baseline", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""Pipelined Modbus TCP client: several transactions in flight on one socket.
+
+``AsyncModbusTcpClient`` sends one request and waits for its response before
+the next, so a connection never carries more than one transaction and every
+read pays a full round trip. ``PipelinedClient`` keeps up to ``window``
+requests outstanding on the same connection and matches each response to its
+request by the MBAP transaction ID, so responses may arrive in any order.
+
+Not every device queues requests: some (pymodbus' own server among them)
+process the first frame of a burst and drop the rest. When a request times
+out, or the connection drops, while other requests were outstanding, the
+client assumes the device cannot pipeline, falls back to a window of 1 for
+the rest of its life and retries that request once if it is a read. A write
+is not resent: the missing response does not show that the device did not
+apply it, so it fails with ``ModbusIOException`` like any other timeout.
+
+The client exposes the same coroutines as ``AsyncModbusTcpClient``
+(``read_holding_registers`` etc. via pymodbus' ``ModbusClientMixin``), so
+``ConnectionPool`` can hand out either.
+"""
+import asyncio
+import logging
+import struct
+
+from pymodbus.client.mixin import ModbusClientMixin
+from pymodbus.exceptions import ModbusIOException
+from pymodbus.pdu import DecodePDU
+
+log = logging.getLogger(__name__)
+
+MBAP = struct.Struct(">HHHB")
+# Unit ID plus the largest PDU (253 bytes).
+MAX_MBAP_LENGTH = 254
+
+# Largest window accepted; the transaction ID space is far larger, but few
+# devices queue more than a handful of requests.
+MAX_WINDOW = 64
+
+# Requests that are safe to send again after the fallback (reads of coils, inputs and registers).
+RETRYABLE_FUNCTION_CODES = frozenset((1, 2, 3, 4))
+
+
+class _Unpipelined(Exception):
+    """A request failed in a way that suggests the device cannot pipeline."""
+
+
+class _Transaction:
+    __slots__ = ("future", "shared")
+
+    def __init__(self, future):
+        self.future = future
+        self.shared = False     # another request was outstanding at some point
+
+
+class PipelinedClient(ModbusClientMixin):
+    """Modbus TCP client with up to ``window`` transactions in flight.
+
+    Must only be used from the event loop that connected it.
+    """
+
+    def __init__(self, host, port=502, window=4, timeout=3, trace_pdu=None):
+        ModbusClientMixin.__init__(self)
+        if not 1 <= window <= MAX_WINDOW:
+            raise ValueError(f"window must be 1-{MAX_WINDOW}")
+        self.host = host
+        self.port = port
+        self.window = window
+        self.timeout = timeout
+        self.trace_pdu = trace_pdu
+        self.fell_back = False
+        self._decoder = DecodePDU(False)
+        self._reader = None
+        self._writer = None
+        self._receiver = None
+        self._pending = {}      # transaction ID -> _Transaction
+        self._tid = 0
+        self._slots = asyncio.Condition()
+        self._connecting = asyncio.Lock()
+
+    @property
+    def connected(self):
+        return self._writer is not None and not self._writer.is_closing()
+
+    @property
+    def in_flight(self):
+        return len(self._pending)
+
+    async def connect(self):
+        async with self._connecting:
+            if self.connected:
+                return True
+            try:
+                self._reader, self._writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), self.timeout
+                )
+            except (OSError, asyncio.TimeoutError) as e:
+                log.debug("Connect to %s:%s failed: %s", self.host, self.port, e)
+                self._writer = None
+                return False
+            self._receiver = asyncio.create_task(self._receive(self._reader))
+            return True
+
+    def close(self):
+        """Fail every outstanding request and drop the connection; see ``wait_closed``."""
+        self._fail_pending("Connection closed", ModbusIOException)
+        if self._receiver is not None:
+            self._receiver.cancel()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def wait_closed(self):
+        """Wait until the receiver task stopped by ``close`` has finished."""
+        receiver, self._receiver = self._receiver, None
+        if receiver is not None:
+            await asyncio.gather(receiver, return_exceptions=True)
+
+    async def execute(self, no_response_expected, request):
+        """Send ``request`` and return its response; raises ``ModbusIOException`` on timeout or disconnect."""
+        try:
+            return await self._transact(request)
+        except _Unpipelined as e:
+            if not self.fell_back:
+                log.warning(
+                    "%s:%s does not answer pipelined requests (%s); falling back to one at a time",
+                    self.host, self.port, e,
+                )
+                self.window = 1
+                self.fell_back = True
+                async with self._slots:
+                    self._slots.notify_all()
+            if request.function_code not in RETRYABLE_FUNCTION_CODES:
+                raise ModbusIOException(f"No response from {self.host}:{self.port} ({e}); write not resent") from None
+            if not self.connected and not await self.connect():
+                raise ModbusIOException(f"Unable to reconnect to {self.host}:{self.port}") from None
+            return await self._transact(request)
+
+    async def _transact(self, request):
+        async with self._slots:
+            await self._slots.wait_for(lambda: len(self._pending) < self.window)
+            if not self.connected:
+                self._slots.notify()    # pass the free slot on to the next waiter
+                raise ModbusIOException(f"Not connected to {self.host}:{self.port}")
+
+        tid = self._tid = self._tid % 0xFFFF + 1
+        transaction = _Transaction(asyncio.get_running_loop().create_future())
+        if self._pending:
+            transaction.shared = True
+            for other in self._pending.values():
+                other.shared = True
+        self._pending[tid] = transaction
+        try:
+            request.transaction_id = tid
+            if self.trace_pdu is not None:
+                request = self.trace_pdu(True, request)
+            pdu = bytes([request.function_code]) + request.encode()
+            self._writer.write(MBAP.pack(tid, 0, len(pdu) + 1, request.dev_id) + pdu)
+            try:
+                response = await asyncio.wait_for(transaction.future, self.timeout)
+            except asyncio.TimeoutError:
+                if transaction.shared:
+                    raise _Unpipelined("request timed out") from None
+                raise ModbusIOException(f"No response from {self.host}:{self.port} within {self.timeout} s") from None
+            except ConnectionError as e:
+                if transaction.shared:
+                    raise _Unpipelined(str(e)) from None
+                raise ModbusIOException(str(e)) from None
+        finally:
+            self._pending.pop(tid, None)
+            async with self._slots:
+                self._slots.notify()
+
+        if response.function_code & 0x7F != request.function_code:
+            raise ModbusIOException(
+                f"Response function code {response.function_code} does not match request {request.function_code}"
+            )
+        if self.trace_pdu is not None:
+            response = self.trace_pdu(False, response)
+        return response
+
+    async def _receive(self, reader):
+        reason = "Connection lost"
+        try:
+            while True:
+                tid, _, length, unit = MBAP.unpack(await reader.readexactly(MBAP.size))
+                if not 2 <= length <= MAX_MBAP_LENGTH:
+                    # The stream is out of step; no later frame boundary can be trusted.
+                    reason = f"Invalid MBAP length {length} from {self.host}:{self.port}"
+                    log.warning("%s; dropping the connection", reason)
+                    break
+                frame = await reader.readexactly(length - 1)
+                transaction = self._pending.get(tid)
+                if transaction is None or transaction.future.done():
+                    continue    # late answer to a request that already timed out
+                response = self._decoder.decode(frame)
+                if response is None:
+                    transaction.future.set_exception(ModbusIOException(f"Undecodable response {frame.hex()}"))
+                    continue
+                response.transaction_id = tid
+                response.dev_id = unit
+                transaction.future.set_result(response)
+        except (OSError, asyncio.IncompleteReadError, struct.error):
+            pass
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._fail_pending(reason)
+
+    def _fail_pending(self, reason, error=ConnectionError):
+        for transaction in self._pending.values():
+            if not transaction.future.done():
+                transaction.future.set_exception(error(reason))
+
@@ -0,0 +1,257 @@
+"""Emulate a whole plant of Modbus TCP devices in one process.
+
+A plant is a list of extra listening ports, each answering for one or more
+unit IDs: a gateway with hundreds of units behind one port, or several
+ports that each act as a separate device. Every listener runs on the same
+asyncio loop as the main server (see ``ServerRunner``) and reports into the
+same ``ServerMetrics``.
+
+Each unit has its own datastore, created on the first request that reaches
+it, with ``size`` addresses per table (``RegisterArrayBlock`` /
+``BitArrayBlock``, about 4.3 bytes per address for all four tables), so a
+plant of 250 units with the default size costs about 10 MiB once every
+unit has been polled. Requests for a unit ID that is not configured get the
+gateway exception "target device failed to respond" (0x0B).
+
+A unit can be given a response profile: a fixed ``delay`` plus a random
+``jitter`` (both in ms) before the answer, a fraction ``errors`` of requests
+answered with exception ``code`` instead, and a fraction ``drop`` not
+answered at all, so the master runs into its timeout.
+
+The plant is configured one line per group of ports and units::
+
+    <ports> <units> [size=N] [delay=ms] [jitter=ms] [errors=fraction] [code=N] [drop=fraction]
+
+where ``ports`` and ``units`` are lists like ``5020-5029`` or ``1,5,10-20``.
+
+Run ``python Modbus_TCP_IP_Tester.py plant --help`` to serve a plant from a
+file without the GUI.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+
+from pymodbus.datastore import ModbusServerContext
+from pymodbus.exceptions import NoSuchSlaveException
+from pymodbus.pdu import ExceptionResponse
+
+from .datastore import create_slave_context
+from .discovery import parse_ranges
+from .recorder import per_connection
+from .server_metrics import InstrumentedRequestHandler, InstrumentedTcpServer, ServerMetrics
+from .server_runner import ServerFailed, ServerRunner, ServerStarted
+
+DEFAULT_SIZE = 10000
+MAX_UNIT = 247
+OPTIONS = ("size", "delay", "jitter", "errors", "code", "drop")
+
+
+@dataclass(frozen=True)
+class Profile:
+    delay: float = 0.0      # ms before every answer
+    jitter: float = 0.0     # up to this many ms more, uniformly distributed
+    errors: float = 0.0     # fraction of requests answered with exception ``code``
+    code: int = ExceptionResponse.SLAVE_BUSY
+    drop: float = 0.0       # fraction of requests not answered
+
+    @property
+    def active(self):
+        return bool(self.delay or self.jitter or self.errors or self.drop)
+
+
+@dataclass
+class PlantPort:
+    """One listening port: unit ID -> datastore size, and the units with a response profile."""
+    port: int
+    sizes: dict = field(default_factory=dict)
+    profiles: dict = field(default_factory=dict)
+
+    def create_server(self, host, metrics=None, trace_pdu=None, rng=None):
+        """Build the listener; must be called on the loop that will run it."""
+        return PlantServer(
+            UnitContexts(self.sizes), self.profiles, metrics=metrics, rng=rng,
+            address=(host, self.port), trace_pdu=trace_pdu,
+        )
+
+
+def parse_plant(text):
+    """Parse a plant description into a list of ``PlantPort`` sorted by port.
+
+    ``#`` comments and blank lines are ignored. Raises ``ValueError``
+    naming the offending line.
+    """
+    ports = {}
+    for line_no, line in enumerate(text.splitlines(), start=1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        parts = line.split()
+        if len(parts) < 2:
+            raise ValueError(f"Line {line_no}: expected <ports> <units> [key=value ...]")
+        try:
+            port_list = parse_ranges(parts[0], 1, 65535, "port")
+            units = parse_ranges(parts[1], 0, MAX_UNIT, "unit ID")
+        except ValueError as e:
+            raise ValueError(f"Line {line_no}: {e}") from None
+
+        options = {}
+        for option in parts[2:]:
+            key, sep, value = option.partition("=")
+            if not sep or key not in OPTIONS:
+                raise ValueError(f"Line {line_no}: unknown option {option!r} (use {', '.join(OPTIONS)})")
+            try:
+                options[key] = int(value) if key in ("size", "code") else float(value)
+            except ValueError:
+                raise ValueError(f"Line {line_no}: {key} must be a number, got {value!r}") from None
+        size = options.pop("size", DEFAULT_SIZE)
+        if not 1 <= size <= 65536:
+            raise ValueError(f"Line {line_no}: size must be 1-65536")
+        profile = Profile(**options)
+        if profile.delay < 0 or profile.jitter < 0:
+            raise ValueError(f"Line {line_no}: delay and jitter must not be negative")
+        if not (0 <= profile.errors <= 1 and 0 <= profile.drop <= 1 and profile.errors + profile.drop <= 1):
+            raise ValueError(f"Line {line_no}: errors and drop are fractions that add up to at most 1")
+        if not 1 <= profile.code <= 255:
+            raise ValueError(f"Line {line_no}: code must be 1-255")
+
+        for port in port_list:
+            plant_port = ports.setdefault(port, PlantPort(port))
+            for unit in units:
+                if unit in plant_port.sizes:
+                    raise ValueError(f"Line {line_no}: unit {unit} on port {port} is already defined")
+                plant_port.sizes[unit] = size
+                if profile.active:
+                    plant_port.profiles[unit] = profile
+    return [ports[port] for port in sorted(ports)]
+
+
+class UnitContexts(ModbusServerContext):
+    """Server context for the configured unit IDs, each datastore created on first access."""
+
+    def __init__(self, sizes):
+        super().__init__(slaves={}, single=False)
+        self.sizes = dict(sizes)
+
+    def __contains__(self, unit):
+        return unit in self.sizes
+
+    def __getitem__(self, unit):
+        slave = self._slaves.get(unit)
+        if slave is None:
+            if unit not in self.sizes:
+                raise NoSuchSlaveException(f"unit {unit} is not part of this device")
+            slave = self._slaves[unit] = create_slave_context(self.sizes[unit])
+        return slave
+
+    def slaves(self):
+        return list(self.sizes)
+
+    @property
+    def allocated(self):
+        """Number of units whose datastore exists (i.e. that received a request)."""
+        return len(self._slaves)
+
+
+class PlantRequestHandler(InstrumentedRequestHandler):
+    async def respond(self, pdu, addr):
+        if pdu.dev_id not in self.server.context:
+            # pymodbus answers these with function code 0x80, which masters cannot decode.
+            self._send_exception(pdu, addr, ExceptionResponse.GATEWAY_NO_RESPONSE)
+            return
+        profile = self.server.profiles.get(pdu.dev_id)
+        if profile is None:
+            await super().respond(pdu, addr)
+            return
+        rng = self.server.rng
+        delay = profile.delay + profile.jitter * rng.random()
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        roll = rng.random()
+        if roll < profile.drop:
+            return
+        if roll < profile.drop + profile.errors:
+            self._send_exception(pdu, addr, profile.code)
+            return
+        # Another request may have arrived on this connection during the delay.
+        self.last_pdu, self.last_addr = pdu, addr
+        await super().respond(pdu, addr)
+
+    def _send_exception(self, pdu, addr, code):
+        response = ExceptionResponse(pdu.function_code, code)
+        response.transaction_id = pdu.transaction_id
+        response.dev_id = pdu.dev_id
+        self.server_send(response, addr)
+
+
+class PlantServer(InstrumentedTcpServer):
+    def __init__(self, context, profiles=None, metrics=None, rng=None, **kwargs):
+        super().__init__(context, metrics=metrics, **kwargs)
+        self.profiles = profiles or {}
+        self.rng = rng or random.Random()
+
+    def callback_new_connection(self):
+        if self.trace_connect:
+            self.trace_connect(True)
+        return PlantRequestHandler(self, self.trace_packet, per_connection(self.trace_pdu), self.trace_connect)
+
+
+def describe(plant):
+    """One-line summary such as ``"3 ports, 250 units (12 with a response profile)"``."""
+    units = sum(len(port.sizes) for port in plant)
+    profiled = sum(len(port.profiles) for port in plant)
+    text = f"{len(plant)} port{'s' if len(plant) != 1 else ''}, {units} unit{'s' if units != 1 else ''}"
+    return text + (f" ({profiled} with a response profile)" if profiled else "")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="Modbus_TCP_IP_Tester.py plant",
+        description="Serve a plant of simulated Modbus TCP devices until interrupted.",
+    )
+    parser.add_argument("config", help="Plant description, one '<ports> <units> [key=value ...]' line per group")
+    parser.add_argument("--host", default="0.0.0.0", help="Address to listen on")
+    parser.add_argument("--stats", type=float, default=10.0,
+                        help="Print a JSON line with the server metrics every N seconds (0 = never)")
+    parser.add_argument("--seed", type=int, help="Seed for delays and injected errors, for repeatable runs")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        with open(args.config) as f:
+            plant = parse_plant(f.read())
+    except (OSError, ValueError) as e:
+        parser.error(f"cannot load {args.config}: {e}")
+    if not plant:
+        parser.error(f"{args.config} defines no devices")
+
+    metrics = ServerMetrics()
+    runner = ServerRunner(None, (args.host, 0), metrics=metrics, plant=plant, seed=args.seed)
+    runner.start()
+    runner.ready.wait()
+    event = runner.results.get()
+    if isinstance(event, ServerFailed):
+        print(f"plant: {event.error}", file=sys.stderr)
+        return 1
+    if isinstance(event, ServerStarted):
+        print(f"plant: serving {describe(plant)} on {event.host} in {event.startup_ms:.1f} ms", file=sys.stderr)
+    try:
+        while runner.running:
+            time.sleep(args.stats or 1)
+            if args.stats:
+                print(json.dumps(metrics.snapshot()), flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        runner.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
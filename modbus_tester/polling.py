@@ -0,0 +1,491 @@
+"""Background polling engine that keeps Modbus client I/O off the Tk main thread.
+
+The engine owns a private asyncio event loop running in a daemon thread and
+talks to the devices through pooled connections (``connection_pool``).
+Everything it produces (connection status, read results, write results, write
+verification, scan timing) is pushed into ``PollingEngine.results``, a thread-safe
+``queue.Queue`` that the GUI drains from a Tk ``after()`` callback.
+
+All devices are scanned concurrently, so one slow device does not hold up the
+others. Watched ranges are coalesced per device by ``read_planner`` so each
+scan sends the fewest requests the protocol allows; one ``ReadResult`` is
+still produced per watched range.
+
+Each ``ReadRequest`` may carry its own ``interval`` and ``priority``. Ranges
+of a device that share both form a poll group, and groups are run from a
+deadline queue (see ``scheduler``) so every group keeps its own rate, with
+overrun/skip/jitter counters and exponential backoff for devices that stop
+answering.
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+
+from pymodbus.exceptions import ModbusException, ModbusIOException
+
+from .client_metrics import ClientMetrics, sent_at
+from .connection_pool import ConnectionPool
+from .read_planner import plan_reads, slice_values
+from .scheduler import SKIP, DeadlineScheduler, DeviceBackoff, PollGroup
+from .write_planner import plan_writes
+
+log = logging.getLogger(__name__)
+
+# Client coroutine used for each register type.
+READ_METHODS = {
+    "Coils": "read_coils",
+    "Discrete Inputs": "read_discrete_inputs",
+    "Holding Registers": "read_holding_registers",
+    "Input Registers": "read_input_registers",
+}
+
+READ_FUNCTION_CODES = {
+    "Coils": 1,
+    "Discrete Inputs": 2,
+    "Holding Registers": 3,
+    "Input Registers": 4,
+}
+
+BIT_TYPES = ("Coils", "Discrete Inputs")
+
+# Client coroutine used for each write function code.
+WRITE_METHODS = {
+    5: "write_coil",
+    6: "write_register",
+    15: "write_coils",
+    16: "write_registers",
+}
+
+
+@dataclass
+class ReadRequest:
+    reg_type: str
+    address: int
+    count: int
+    device: str = None      # device name, or None for every device
+    interval: float = None  # seconds between polls, or None for the engine's interval
+    priority: int = 0       # higher runs first when several groups are due
+
+
+@dataclass
+class ConnectionStatus:
+    connected: bool
+    message: str = ""
+    device: str = None
+
+
+@dataclass
+class ReadResult:
+    reg_type: str
+    address: int
+    values: list = field(default_factory=list)
+    error: str = None
+    timestamp: float = field(default_factory=time.time)
+    device: str = None
+
+
+@dataclass
+class WriteResult:
+    reg_type: str
+    address: int
+    count: int
+    error: str = None
+    device: str = None
+    function_code: int = None
+
+
+@dataclass
+class VerifyResult:
+    reg_type: str
+    checked: int
+    mismatches: list = field(default_factory=list)  # (address, written, read back)
+    error: str = None
+    device: str = None
+
+
+@dataclass
+class ScanComplete:
+    duration: float
+    errors: int = 0
+    device_durations: dict = field(default_factory=dict)
+
+
+class PollingEngine:
+    """Poll one or more Modbus TCP devices from a background asyncio loop.
+
+    ``devices`` is a list of ``connection_pool.Device``. ``interval`` is the
+    default poll period in seconds for requests without their own; ``0``
+    means manual only. ``poll_once()`` always scans every request at once.
+    ``max_in_flight`` caps the requests outstanding to any single device.
+    ``overrun_policy`` is ``scheduler.SKIP`` or ``scheduler.CATCH_UP`` and
+    ``max_backoff`` caps the retry delay for unreachable devices.
+    ``trace_pdu`` is passed to every client, e.g.
+    ``TransactionRecorder.trace_pdu(CLIENT)``. ``pipeline_window`` above 1
+    pipelines that many transactions per connection (see ``pipeline``);
+    raise ``max_in_flight`` to match so a device's reads can fill it.
+    Every transaction is timed into ``metrics`` (a
+    ``client_metrics.ClientMetrics``, created if not given).
+    """
+
+    def __init__(self, devices, interval=0, timeout=3, gap_tolerance=0, max_in_flight=1, trace_pdu=None,
+                 overrun_policy=SKIP, max_backoff=30.0, pipeline_window=1, metrics=None):
+        self.devices = list(devices)
+        self.interval = interval
+        self.timeout = timeout
+        self.gap_tolerance = gap_tolerance
+        self.results = queue.Queue()
+        self.metrics = metrics if metrics is not None else ClientMetrics()
+
+        self._pool = ConnectionPool(
+            timeout=timeout, max_in_flight=max_in_flight, trace_pdu=trace_pdu,
+            pipeline_window=pipeline_window, metrics=self.metrics,
+        )
+        self._scheduler = DeadlineScheduler(overrun_policy)
+        self._backoff = DeviceBackoff(maximum=max_backoff)
+        self._plans = {}
+        self._group_specs = None    # pending from set_requests, installed by the loop
+        self._groups = {}           # owned by the loop: key -> PollGroup
+        self._manual = False
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._task = None
+        self._tasks = set()         # groups, scans and writes running on the loop
+        self._wakeup = asyncio.Event()
+
+    def device(self, name):
+        for device in self.devices:
+            if device.name == name:
+                return device
+        raise KeyError(name)
+
+    # --- Public API (called from the Tk thread) ---
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="modbus-poller", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2):
+        if self._loop is None:
+            return
+        try:
+            # Cancelling aborts any read still waiting on a slow device.
+            self._loop.call_soon_threadsafe(self._cancel)
+        except RuntimeError:
+            pass  # loop already closed
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def set_requests(self, requests):
+        """Replace the list of ``ReadRequest`` being polled.
+
+        Groups whose device, rate and priority are unchanged keep their
+        schedule and statistics.
+        """
+        requests = list(requests)
+        plans = {}
+        specs = {}
+        for device in self.devices:
+            own = [r for r in requests if r.device in (None, device.name)]
+            plans[device.name] = (own, plan_reads(own, self.gap_tolerance))
+            grouped = {}
+            for r in own:
+                interval = self.interval if r.interval is None else r.interval
+                if interval > 0:
+                    grouped.setdefault((device.name, interval, r.priority), []).append(r)
+            for key, members in grouped.items():
+                specs[key] = (device, key[1], key[2], members, plan_reads(members, self.gap_tolerance))
+        with self._lock:
+            self._plans = plans
+            self._group_specs = specs
+        self._wake()
+
+    def poll_once(self):
+        """Trigger an immediate scan of every request."""
+        self._manual = True
+        self._wake()
+
+    def schedule_stats(self):
+        """Per-group counters (runs, overruns, skipped, deferred, jitter); safe from any thread."""
+        backoff = self._backoff.snapshot()
+        stats = []
+        for group in sorted(list(self._groups.values()), key=lambda g: (g.device.name, -g.priority, g.interval)):
+            entry = group.stats()
+            entry["backoff_s"] = backoff.get(group.device.name, 0.0)
+            stats.append(entry)
+        return stats
+
+    def _wake(self):
+        if self._loop is not None and not self._loop.is_closed():
+            try:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:
+                pass  # loop closed meanwhile
+
+    def write(self, device_name, reg_type, address, values, verify=False):
+        """Queue a write of consecutive ``values`` starting at ``address`` (see ``write_runs``)."""
+        return self.write_runs(device_name, reg_type, [(address, values)], verify)
+
+    def write_runs(self, device_name, reg_type, runs, verify=False):
+        """Queue writes of ``runs`` (``[(address, values), ...]``) with the fewest requests.
+
+        Each request's outcome arrives on ``results`` as a ``WriteResult``.
+        With ``verify`` the written addresses are then read back in as few
+        reads as ``read_planner`` allows and compared, giving one
+        ``VerifyResult``.
+        """
+        try:
+            plan = plan_writes(reg_type, runs)
+        except ValueError as e:
+            plan, error = None, str(e)
+        else:
+            error = None if self._loop is not None and not self._loop.is_closed() else "Polling engine not running."
+        if error is not None:
+            for address, values in runs:
+                self.results.put(WriteResult(reg_type, address, len(values), error, device_name))
+            return None
+        return asyncio.run_coroutine_threadsafe(
+            self._write_plan(self.device(device_name), reg_type, plan, verify), self._loop
+        )
+
+    # --- Event loop side ---
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._task = self._loop.create_task(self._main())
+        try:
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    def _cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _main(self):
+        try:
+            clients = await asyncio.gather(*(self._pool.get(device) for device in self.devices))
+            for device, client in zip(self.devices, clients):
+                endpoint = f"{device.host}:{device.port}"
+                if client is None:
+                    self.results.put(ConnectionStatus(False, f"Unable to connect to {endpoint}", device.name))
+                else:
+                    self.results.put(ConnectionStatus(True, f"Connected to {endpoint}", device.name))
+            if any(clients):
+                await self._poll_loop()
+        finally:
+            # Let every group, scan and write unwind before the pool closes their connections.
+            while self._tasks:
+                for task in self._tasks:
+                    task.cancel()
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            await self._pool.close()
+
+    async def _poll_loop(self):
+        while True:
+            self._sync_groups()
+            if self._manual:
+                self._manual = False
+                self._spawn(self._scan())
+            for group in self._scheduler.pop_due(time.monotonic(), self._backoff.retry_at):
+                self._spawn(self._run_group(group))
+
+            deadline = self._scheduler.next_deadline()
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def _spawn(self, coro):
+        self._track(asyncio.create_task(coro))
+
+    def _track(self, task):
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _sync_groups(self):
+        """Install the groups computed by the last ``set_requests``."""
+        with self._lock:
+            specs, self._group_specs = self._group_specs, None
+        if specs is None:
+            return
+        now = time.monotonic()
+        old, self._groups = self._groups, {}
+        for key, (device, interval, priority, requests, plan) in specs.items():
+            group = old.pop(key, None)
+            if group is None:
+                group = PollGroup(device, interval, priority, requests, plan)
+                self._scheduler.schedule(group, now)
+            else:
+                group.requests, group.plan = requests, plan
+            self._groups[key] = group
+        self._scheduler.remove(old.values())
+
+    async def _run_group(self, group):
+        device = group.device
+        try:
+            duration, errors, unreachable = await self._scan_device(device, group.requests, group.plan)
+        finally:
+            # Groups dropped by set_requests meanwhile are not rescheduled.
+            if self._groups.get(group.key) is group:
+                self._scheduler.complete(group, time.monotonic())
+            else:
+                group.running = False
+            self._wakeup.set()
+        self.results.put(ScanComplete(duration, errors, {device.name: duration}))
+
+        if unreachable:
+            delay = self._backoff.failed(device.name, time.monotonic(), group.started)
+            if delay is not None:
+                log.warning("%s is not responding; next attempt in %.1f s", device.name, delay)
+        elif not errors and self._backoff.succeeded(device.name):
+            log.info("%s is responding again", device.name)
+
+    async def _scan(self):
+        with self._lock:
+            plans = self._plans
+
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(
+            *(self._scan_device(device, *plans.get(device.name, ([], []))) for device in self.devices)
+        )
+        durations = {device.name: duration for device, (duration, _, _) in zip(self.devices, outcomes)}
+        errors = sum(count for _, count, _ in outcomes)
+        self.results.put(ScanComplete(time.perf_counter() - started, errors, durations))
+
+    async def _scan_device(self, device, requests, plan):
+        """Run one device's planned reads; returns ``(duration, error_count, unreachable)``.
+
+        ``unreachable`` is true if any read found the device not connected or not answering.
+        """
+        started = time.perf_counter()
+        buffers = [[None] * request.count for request in requests]
+        errors = {}
+        unreachable = False
+
+        async def run(read):
+            nonlocal unreachable
+            values, error, lost = await self._read(device, read.reg_type, read.address, read.count)
+            unreachable = unreachable or lost
+            for seg, chunk in slice_values(read, values or []):
+                if error:
+                    errors[seg.index] = error
+                else:
+                    buffers[seg.index][seg.offset:seg.offset + seg.count] = chunk
+
+        await asyncio.gather(*(run(read) for read in plan))
+
+        for index, request in enumerate(requests):
+            if index in errors:
+                result = ReadResult(request.reg_type, request.address, error=errors[index], device=device.name)
+            else:
+                result = ReadResult(request.reg_type, request.address, buffers[index], device=device.name)
+            self.results.put(result)
+        return time.perf_counter() - started, len(errors), unreachable
+
+    async def _timed(self, device, function_code, request):
+        """Await one client request coroutine, recording its latency and outcome in ``metrics``.
+
+        The latency runs from when the request was written to the socket, so time spent waiting
+        for a shared connection is not counted.
+        """
+        started = time.perf_counter()
+        try:
+            rr = await request
+        except ModbusIOException:
+            self.metrics.record_timeout(device.name, function_code)
+            raise
+        except ModbusException:
+            self.metrics.record_error(device.name, function_code)
+            raise
+        exception_code = getattr(rr, "exception_code", None) if rr.isError() else None
+        sent = sent_at()
+        if sent is not None and sent > started:
+            started = sent
+        self.metrics.record(device.name, function_code, time.perf_counter() - started, exception_code)
+        return rr
+
+    async def _read(self, device, reg_type, address, count):
+        """Send one read and return ``(values, error, unreachable)``."""
+        async with self._pool.limit(device):
+            client = await self._pool.get(device)
+            if client is None:
+                return None, f"Not connected to {device.host}:{device.port}", True
+            method = getattr(client, READ_METHODS[reg_type])
+            try:
+                rr = await self._timed(
+                    device, READ_FUNCTION_CODES[reg_type], method(address, count=count, slave=device.unit_id)
+                )
+            except ModbusIOException as e:
+                return None, str(e), True
+            except ModbusException as e:
+                return None, str(e), False
+
+        if rr.isError():
+            return None, str(rr), False
+        if reg_type in BIT_TYPES:
+            return list(rr.bits[:count]), None, False
+        return list(rr.registers), None, False
+
+    async def _write_plan(self, device, reg_type, plan, verify):
+        self._track(asyncio.current_task())
+        errors = await asyncio.gather(*(self._write(device, write) for write in plan))
+        written = [write for write, error in zip(plan, errors) if error is None]
+        if verify and written:
+            await self._verify(device, reg_type, written)
+
+    async def _write(self, device, write):
+        """Send one planned write; returns the error text or ``None``."""
+        if write.function_code == 5:
+            value = bool(write.values[0])
+        elif write.function_code == 6:
+            value = write.values[0]
+        elif write.function_code == 15:
+            value = [bool(v) for v in write.values]
+        else:
+            value = list(write.values)
+        try:
+            async with self._pool.limit(device):
+                client = await self._pool.get(device)
+                if client is None:
+                    raise ModbusException(f"Not connected to {device.host}:{device.port}")
+                method = getattr(client, WRITE_METHODS[write.function_code])
+                rr = await self._timed(
+                    device, write.function_code, method(write.address, value, slave=device.unit_id)
+                )
+            error = str(rr) if rr.isError() else None
+        except ModbusException as e:
+            error = str(e)
+        self.results.put(WriteResult(
+            write.reg_type, write.address, write.count, error, device.name, write.function_code
+        ))
+        return error
+
+    async def _verify(self, device, reg_type, writes):
+        """Read ``writes`` back in as few requests as possible and report any difference."""
+        plan = plan_reads([ReadRequest(reg_type, w.address, w.count) for w in writes], self.gap_tolerance)
+        mismatches = []
+        errors = []
+
+        async def check(read):
+            values, error, _ = await self._read(device, read.reg_type, read.address, read.count)
+            if error:
+                errors.append(error)
+                return
+            for seg, chunk in slice_values(read, values):
+                expected = writes[seg.index].values[seg.offset:seg.offset + seg.count]
+                for i, (wrote, got) in enumerate(zip(expected, chunk)):
+                    if (bool(wrote) != bool(got)) if reg_type in BIT_TYPES else wrote != got:
+                        mismatches.append((seg.address + i, wrote, got))
+
+        await asyncio.gather(*(check(read) for read in plan))
+        mismatches.sort()
+        self.results.put(VerifyResult(
+            reg_type, sum(w.count for w in writes), mismatches, errors[0] if errors else None, device.name
+        ))
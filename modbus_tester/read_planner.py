@@ -0,0 +1,81 @@
+"""Coalesce watched address ranges into the fewest legal Modbus read requests.
+
+A watched range is anything with ``reg_type``, ``address`` and ``count``
+attributes (e.g. ``polling.ReadRequest``). Ranges of the same register type
+whose gap is within ``gap_tolerance`` addresses are merged into one read, as
+long as the read stays within the protocol limit for its function code.
+Ranges larger than the limit are split across several reads. Each planned
+read remembers which slice of which range it carries, so responses can be
+sliced back with ``slice_values``.
+"""
+from dataclasses import dataclass, field
+
+# Maximum quantity per request (Modbus Application Protocol v1.1b3).
+MAX_READ_COUNT = {
+    "Coils": 2000,              # FC1
+    "Discrete Inputs": 2000,    # FC2
+    "Holding Registers": 125,   # FC3
+    "Input Registers": 125,     # FC4
+}
+
+
+@dataclass(frozen=True)
+class Segment:
+    """Part of watched range ``index`` covering ``count`` addresses from ``address``."""
+    index: int
+    address: int
+    count: int
+    offset: int     # position of ``address`` within the watched range
+
+
+@dataclass
+class PlannedRead:
+    reg_type: str
+    address: int
+    count: int
+    segments: list = field(default_factory=list)
+
+
+def _split(index, request, limit):
+    """Cut one watched range into segments no longer than ``limit``."""
+    for offset in range(0, request.count, limit):
+        yield Segment(index, request.address + offset, min(limit, request.count - offset), offset)
+
+
+def plan_reads(requests, gap_tolerance=0, max_counts=MAX_READ_COUNT):
+    """Return the list of ``PlannedRead`` covering every range in ``requests``.
+
+    ``gap_tolerance`` is the largest number of unwatched addresses that may be
+    read (and discarded) to join two ranges into one request.
+    """
+    by_type = {}
+    for index, request in enumerate(requests):
+        if request.count <= 0:
+            continue
+        limit = max_counts[request.reg_type]
+        by_type.setdefault(request.reg_type, []).extend(_split(index, request, limit))
+
+    plan = []
+    for reg_type, segments in by_type.items():
+        limit = max_counts[reg_type]
+        segments.sort(key=lambda s: (s.address, -s.count))
+        current = None
+        for seg in segments:
+            seg_end = seg.address + seg.count
+            if current is not None:
+                current_end = current.address + current.count
+                new_end = max(current_end, seg_end)
+                if seg.address - current_end <= gap_tolerance and new_end - current.address <= limit:
+                    current.count = new_end - current.address
+                    current.segments.append(seg)
+                    continue
+            current = PlannedRead(reg_type, seg.address, seg.count, [seg])
+            plan.append(current)
+    return plan
+
+
+def slice_values(read, values):
+    """Yield ``(segment, values)`` for every segment carried by ``read``."""
+    for seg in read.segments:
+        start = seg.address - read.address
+        yield seg, values[start:start + seg.count]
@@ -0,0 +1,364 @@
+"""Transaction capture files and deterministic replay.
+
+A capture is a compact, append-only binary file::
+
+    header  : magic b"MBTR", version u16, reserved u16, start time f64 (Unix seconds)
+    record* : t_ns u64, direction u8, source u8, connection u16, transaction id u16,
+              unit id u8, function code u8, pdu length u16, pdu bytes
+
+All integers are little-endian. ``t_ns`` is a monotonic offset from the
+start of the capture; the PDU is the function code followed by its data.
+Records are written through pymodbus' ``trace_pdu`` hook, so the same
+recorder works for the client (``PollingEngine``) and the server
+(``InstrumentedTcpServer``). Every client socket and every accepted server
+connection gets its own callback (``per_connection``) and so its own
+connection number, because transaction IDs are only unique per connection.
+Version 1 captures, without the connection field, are still read (as one
+connection). ``CaptureReader`` memory-maps a capture and iterates it
+without copying PDUs, and ``replay`` plays the requests back against a
+target, one connection per recorded connection.
+
+Run ``python Modbus_TCP_IP_Tester.py replay --help`` for the command line.
+"""
+import argparse
+import asyncio
+import json
+import mmap
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from pymodbus.exceptions import ModbusException, ModbusIOException
+from pymodbus.pdu import DecodePDU
+
+from .client_metrics import sent_at, timing_trace
+from .histogram import LatencyHistogram
+from .pipeline import MAX_WINDOW, PipelinedClient
+
+MAGIC = b"MBTR"
+VERSION = 2
+HEADER = struct.Struct("<4sHHd")
+RECORD = struct.Struct("<QBBHHBBH")
+RECORD_V1 = struct.Struct("<QBBHBBH")
+
+REQUEST, RESPONSE = 0, 1
+CLIENT, SERVER = 0, 1
+
+Record = namedtuple("Record", "t_ns direction source connection transaction_id unit_id function_code pdu")
+
+
+class TransactionRecorder:
+    """Append every traced PDU to a capture file. Safe to share between threads."""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+        self._connections = 0
+        self._start_ns = time.monotonic_ns()
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, 0, time.time()))
+
+    def record(self, direction, source, transaction_id, unit_id, function_code, pdu, connection=0):
+        t_ns = time.monotonic_ns() - self._start_ns
+        header = RECORD.pack(t_ns, direction, source, connection & 0xFFFF, transaction_id & 0xFFFF,
+                             unit_id & 0xFF, function_code & 0xFF, len(pdu))
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(header)
+            self._file.write(pdu)
+            self.count += 1
+
+    def trace_pdu(self, source):
+        """Return a pymodbus ``trace_pdu`` callback recording PDUs seen by ``source``.
+
+        Give each connection its own callback with ``per_connection``.
+        """
+        return _PduTracer(self, source, self._new_connection())
+
+    def _new_connection(self):
+        with self._lock:
+            self._connections += 1
+            return self._connections
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class _PduTracer:
+    """``trace_pdu`` callback of one connection; ``for_connection`` makes the next one."""
+
+    def __init__(self, recorder, source, connection):
+        self.recorder = recorder
+        self.source = source
+        self.connection = connection
+
+    def for_connection(self):
+        return _PduTracer(self.recorder, self.source, self.recorder._new_connection())
+
+    def __call__(self, sending, pdu):
+        if self.source == CLIENT:
+            direction = REQUEST if sending else RESPONSE
+        else:
+            direction = RESPONSE if sending else REQUEST
+        try:
+            raw = bytes([pdu.function_code]) + pdu.encode()
+        except Exception:
+            raw = bytes([pdu.function_code])
+        self.recorder.record(direction, self.source, pdu.transaction_id, pdu.dev_id, pdu.function_code, raw,
+                             self.connection)
+        return pdu
+
+
+def per_connection(trace_pdu):
+    """The ``trace_pdu`` callback a new connection should use.
+
+    A recorder's callback is replaced by one with a connection number of its
+    own; any other callback (or ``None``) is returned as is.
+    """
+    new = getattr(trace_pdu, "for_connection", None)
+    return new() if new is not None else trace_pdu
+
+
+class CaptureReader:
+    """Memory-mapped, zero-copy iteration over a capture file.
+
+    Each record's ``pdu`` is a ``memoryview`` into the map; copy it with
+    ``bytes()`` if it must outlive the reader.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            raise ValueError(f"{path} is too short to be a capture file")
+        magic, self.version, _, self.start_time = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or self.version not in (1, VERSION):
+            raise ValueError(f"{path} is not a version 1-{VERSION} capture file")
+        self._view = memoryview(self._map)
+
+    def __iter__(self):
+        offset, end = HEADER.size, len(self._map)
+        record = RECORD if self.version == VERSION else RECORD_V1
+        while offset + record.size <= end:
+            if record is RECORD:
+                t_ns, direction, source, connection, tid, unit, fc, length = RECORD.unpack_from(self._map, offset)
+            else:
+                connection = 0
+                t_ns, direction, source, tid, unit, fc, length = RECORD_V1.unpack_from(self._map, offset)
+            offset += record.size
+            if offset + length > end:
+                break   # truncated tail, e.g. the recorder was killed mid-write
+            yield Record(t_ns, direction, source, connection, tid, unit, fc, self._view[offset:offset + length])
+            offset += length
+
+    def close(self):
+        try:
+            self._view.release()
+            self._map.close()
+        except BufferError:
+            pass    # PDU views are still referenced; the map is freed with them
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _pair_transactions(records):
+    """Return ``[(request, recorded_latency_s or None)]`` for every request in the capture."""
+    pending = {}
+    pairs = []
+    for rec in records:
+        key = (rec.source, rec.connection, rec.transaction_id, rec.unit_id)
+        if rec.direction == REQUEST:
+            entry = [rec, None]
+            pairs.append(entry)
+            pending[key] = entry
+        elif key in pending:
+            entry = pending.pop(key)
+            entry[1] = (rec.t_ns - entry[0].t_ns) / 1e9
+    return pairs
+
+
+def _connection_windows(pairs):
+    """Most requests each recorded ``(source, connection)`` had outstanding at once (1 to ``MAX_WINDOW``)."""
+    events = {}
+    for rec, recorded in pairs:
+        edges = events.setdefault((rec.source, rec.connection), [])
+        if recorded is not None:
+            edges.append((rec.t_ns, 1))
+            edges.append((rec.t_ns + int(recorded * 1e9), -1))
+    windows = {}
+    for key, edges in events.items():
+        outstanding = peak = 0
+        for _, step in sorted(edges):    # a response before a request at the same instant
+            outstanding += step
+            peak = max(peak, outstanding)
+        windows[key] = min(max(peak, 1), MAX_WINDOW)
+    return windows
+
+
+async def replay(path, host, port=502, speed=1.0, unit=None, source=None, timeout=3.0):
+    """Replay the requests of a capture against ``host:port`` and return a report dict.
+
+    ``speed`` scales the recorded timing (2.0 = twice as fast); ``0`` sends
+    every request as soon as the previous one completes. ``unit`` overrides
+    the recorded unit IDs and ``source`` (``CLIENT``/``SERVER``) selects
+    which side's traffic to replay when a capture holds both.
+
+    Each recorded connection is replayed over a connection of its own,
+    pipelined as deeply as it was in the capture, and latency is measured
+    from when a request is written, so requests never queue behind ones
+    that were recorded on another connection.
+    """
+    with CaptureReader(path) as reader:
+        pairs = [
+            (Record(*rec[:-1], bytes(rec.pdu)), recorded)
+            for rec, recorded in _pair_transactions(reader)
+            if source is None or rec.source == source
+        ]
+
+    decoder = DecodePDU(True)
+    recorded_hist, replay_hist, delta_hist = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    deltas = []
+    stats = {"requests": len(pairs), "sent": 0, "ok": 0, "timeouts": 0, "errors": 0, "undecodable": 0,
+             "exceptions": {}}
+    max_lag = 0.0
+
+    clients = {
+        key: PipelinedClient(host, port=port, window=window, timeout=timeout, trace_pdu=timing_trace())
+        for key, window in _connection_windows(pairs).items()
+    }
+
+    async def send(rec, recorded):
+        nonlocal max_lag
+        request = decoder.decode(rec.pdu)
+        if request is None:
+            stats["undecodable"] += 1
+            return
+        request.dev_id = rec.unit_id if unit is None else unit
+        stats["sent"] += 1
+        started = time.perf_counter()
+        try:
+            response = await clients[(rec.source, rec.connection)].execute(False, request)
+        except ModbusIOException:
+            stats["timeouts"] += 1
+            return
+        except ModbusException:
+            stats["errors"] += 1
+            return
+        elapsed = time.perf_counter() - max(started, sent_at() or started)
+        if response.isError():
+            code = str(getattr(response, "exception_code", 0))
+            stats["exceptions"][code] = stats["exceptions"].get(code, 0) + 1
+        else:
+            stats["ok"] += 1
+        replay_hist.record(elapsed)
+        if recorded is not None:
+            recorded_hist.record(recorded)
+            deltas.append(elapsed - recorded)
+
+    try:
+        connected = await asyncio.gather(*(client.connect() for client in clients.values()))
+        if not all(connected):
+            raise ConnectionError(f"Unable to connect to {host}:{port}")
+        started = time.perf_counter()
+        if speed > 0 and pairs:
+            # Keep the recorded inter-request timing, scaled by ``speed``.
+            base_ns = pairs[0][0].t_ns
+            tasks = []
+            for rec, recorded in pairs:
+                due = started + (rec.t_ns - base_ns) / 1e9 / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    max_lag = max(max_lag, -delay)
+                tasks.append(asyncio.create_task(send(rec, recorded)))
+            await asyncio.gather(*tasks)
+        else:
+            for rec, recorded in pairs:
+                await send(rec, recorded)
+        elapsed = time.perf_counter() - started
+    finally:
+        for client in clients.values():
+            client.close()
+        await asyncio.gather(*(client.wait_closed() for client in clients.values()))
+
+    for delta in deltas:
+        delta_hist.record(abs(delta))
+    recorded_span = (pairs[-1][0].t_ns - pairs[0][0].t_ns) / 1e9 if pairs else 0.0
+    return {
+        "capture": path,
+        "target": f"{host}:{port}",
+        "speed": speed if speed > 0 else "max",
+        "recorded_duration_s": round(recorded_span, 3),
+        "connections": len(clients),
+        "replay_duration_s": round(elapsed, 3),
+        "max_schedule_lag_ms": round(max_lag * 1000, 3),
+        **stats,
+        "throughput_rps": round(stats["sent"] / elapsed, 2) if elapsed > 0 else 0.0,
+        "recorded_latency_ms": recorded_hist.summary_ms(),
+        "replay_latency_ms": replay_hist.summary_ms(),
+        "latency_delta_ms": {
+            "mean": round(sum(deltas) / len(deltas) * 1000, 3) if deltas else 0.0,
+            "abs": delta_hist.summary_ms(),
+        },
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="Modbus_TCP_IP_Tester.py replay",
+        description="Replay a recorded Modbus capture against a target server.",
+    )
+    parser.add_argument("capture", help="Capture file written by the transaction recorder")
+    parser.add_argument("host", help="Target server IP or hostname")
+    parser.add_argument("-p", "--port", type=int, default=502)
+    parser.add_argument("-s", "--speed", default="1",
+                        help="Timing scale: 1 = original, 2 = twice as fast, 'max' = back-to-back")
+    parser.add_argument("-u", "--unit", type=int, help="Override the recorded unit IDs")
+    parser.add_argument("--source", choices=["client", "server"],
+                        help="Only replay requests recorded on this side")
+    parser.add_argument("-t", "--timeout", type=float, default=3.0, help="Per-request timeout in seconds")
+    parser.add_argument("-o", "--output", help="Write the JSON report here instead of stdout")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        speed = 0.0 if args.speed == "max" else float(args.speed)
+    except ValueError:
+        parser.error("--speed must be a number or 'max'")
+    if speed < 0:
+        parser.error("--speed must not be negative")
+    source = {"client": CLIENT, "server": SERVER}.get(args.source)
+
+    try:
+        report = asyncio.run(replay(args.capture, args.host, port=args.port, speed=speed,
+                                    unit=args.unit, source=source, timeout=args.timeout))
+    except (OSError, ValueError) as e:
+        parser.exit(1, f"replay: {e}\n")
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,304 @@
+"""Virtualized register table for the Main tab.
+
+Values for the whole configured range live in a compact array (``array('H')``
+for registers, a ``bytearray`` of 0/1 for coils and discrete inputs); only the
+rows that fit on screen get a label and an entry widget. Scrolling re-binds
+that fixed pool of widgets to new addresses, so building, rebuilding and
+scrolling a 65536-address table costs about the same as a 10-address one.
+
+Repaints are diff-based and coalesced: the grid remembers the text each row
+currently shows and only touches widgets whose text changed, and any number
+of ``set_values`` calls within one display frame produce a single repaint.
+
+Register tables can be given a typed ``layout`` (from ``TagMap.layout``):
+the first cell of each typed value shows the decoded value and accepts
+typed input, and the cells it spans show ``CONTINUATION``. The array always
+keeps the raw registers, so reads and writes are unaffected.
+
+Cells the user edits are flagged in ``dirty`` (and drawn in ``EDITED_COLOR``)
+until ``mark_clean``; polled values do not overwrite them, and
+``dirty_runs`` hands just those cells to ``write_planner``. What the user
+types is only parsed when the cell is committed - on Return, when it loses
+focus, before scrolling and before ``dirty_runs`` - so a half-typed value
+such as ``-`` or ``0x`` is never rejected or reformatted mid-edit, and a
+repaint leaves a row with uncommitted typing alone.
+"""
+from array import array
+
+import customtkinter as ctk
+
+from .tags import parse_register
+from .write_planner import dirty_runs
+
+ROW_HEIGHT = 34     # CTkEntry height (28) plus vertical padding
+FRAME_MS = 16       # at most one repaint per ~60 Hz display frame
+CONTINUATION = "↳"  # shown in the extra registers of a multi-register value
+EDITED_COLOR = "#d97706"    # text colour of edited cells not yet written
+
+
+class RegisterGrid(ctk.CTkFrame):
+    def __init__(self, master, start, count, bits=False, address_format=str, visible_rows=10, layout=None, **kwargs):
+        kwargs.setdefault("width", 260)
+        kwargs.setdefault("height", visible_rows * ROW_HEIGHT)
+        super().__init__(master, fg_color="transparent", **kwargs)
+        # Size comes from the parent layout, not from the rows; the row pool follows the size.
+        self.grid_propagate(False)
+        self.start = start
+        self.count = count
+        self.bits = bits
+        self.address_format = address_format
+        self.values = bytearray(count) if bits else array("H", bytes(2 * count))
+        self.known = bytearray(count)   # 1 where the cell holds a value, 0 where it is blank
+        self.dirty = bytearray(count)   # 1 where the user edited the cell since the last write
+        self.layout = layout or {}      # offset -> (tag, codec) of typed values
+        self._continued = bytearray(count)
+        for offset, (_, codec) in self.layout.items():
+            self._continued[offset + 1:offset + codec.registers] = b"\x01" * (codec.registers - 1)
+        self.top = 0
+        self.state = "normal"
+        self.cells_repainted = 0    # entry widgets rewritten since the last reset
+        self._rows = []
+        self._shown = []            # (label text, entry text, edited) currently displayed per row
+        self._text_color = None
+        self._repaint_id = None
+
+        self.body = ctk.CTkFrame(self, fg_color="transparent")
+        self.body.grid(row=0, column=0, sticky="nsew")
+        self.body.grid_columnconfigure(0, weight=2)
+        self.body.grid_columnconfigure(1, weight=1)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.yview)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.bind("<Configure>", self._on_configure)
+        self._bind_wheel(self.body)
+
+    # --- Value access ---
+    def set_values(self, values, offset=0):
+        """Store ``values`` starting ``offset`` cells into the table.
+
+        Cells with unwritten edits keep the user's value. Returns the number
+        of cells whose value changed; a repaint is only scheduled when that
+        is non-zero.
+        """
+        values = values[:max(0, self.count - offset)]
+        if self.bits:
+            new = bytearray(1 if val else 0 for val in values)
+        else:
+            new = array("H", (int(val) & 0xFFFF for val in values))
+        end = offset + len(new)
+        if self.values[offset:end] == new and self.known.find(0, offset, end) == -1:
+            return 0
+
+        changed = 0
+        for i, val in enumerate(new, start=offset):
+            if (self.known[i] and self.values[i] == val) or self.dirty[i]:
+                continue
+            self.values[i] = val
+            self.known[i] = 1
+            changed += 1
+        if changed:
+            self._schedule_render()
+        return changed
+
+    def get_values(self, default=0):
+        """Return every cell's value, substituting ``default`` for blank cells."""
+        return [val if known else default for val, known in zip(self.values, self.known)]
+
+    def dirty_runs(self):
+        """Return ``[(address, values), ...]`` for each run of consecutive edited cells."""
+        self._commit_pending()
+        return dirty_runs(self.dirty, self.values, self.start)
+
+    def mark_clean(self, offset=0, count=None):
+        """Forget the edits of ``count`` cells from ``offset`` (all cells by default)."""
+        end = self.count if count is None else min(self.count, offset + count)
+        if self.dirty.find(1, offset, end) != -1:
+            self.dirty[offset:end] = bytes(end - offset)
+            self._schedule_render()
+
+    def mark_dirty(self, offset, count):
+        """Flag cells as edited again, e.g. after their write failed."""
+        end = min(self.count, offset + count)
+        self.dirty[offset:end] = self.known[offset:end]
+        self._schedule_render()
+
+    def clear(self):
+        self.known = bytearray(self.count)
+        self.dirty = bytearray(self.count)
+        for row, (_, entry) in enumerate(self._rows):
+            # Uncommitted typing is discarded too: treat it as shown so the repaint replaces it.
+            label_text, _, edited = self._shown[row]
+            self._shown[row] = (label_text, entry.get(), edited)
+        self._schedule_render()
+
+    def set_state(self, state):
+        self.state = state
+        for _, entry in self._rows:
+            entry.configure(state=state)
+
+    # --- Scrolling ---
+    def yview(self, *args):
+        """Scrollbar protocol: ``("moveto", fraction)`` or ``("scroll", n, "units"|"pages")``."""
+        visible = len(self._rows) or 1
+        if args[0] == "moveto":
+            top = int(float(args[1]) * self.count)
+        else:
+            step = int(args[1]) * (visible if args[2] == "pages" else 1)
+            top = self.top + step
+        self.scroll_to(top)
+
+    def scroll_to(self, index):
+        top = max(0, min(index, self.count - len(self._rows)))
+        if top != self.top:
+            self._commit_pending()      # the rows are about to show other addresses
+            self.top = top
+            self._schedule_render()
+
+    def _on_wheel(self, event):
+        if getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0:
+            self.yview("scroll", -1, "units")
+        else:
+            self.yview("scroll", 1, "units")
+        return "break"
+
+    def _bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", self._on_wheel)
+        widget.bind("<Button-4>", self._on_wheel)
+        widget.bind("<Button-5>", self._on_wheel)
+
+    # --- Row pool ---
+    def _on_configure(self, event):
+        wanted = max(1, min(self.count, event.height // ROW_HEIGHT))
+        if wanted == len(self._rows):
+            return
+        while len(self._rows) < wanted:
+            row = len(self._rows)
+            label = ctk.CTkLabel(self.body, text="")
+            label.grid(row=row, column=0, padx=5, pady=2, sticky="ew")
+            entry = ctk.CTkEntry(self.body, state=self.state)
+            if self._text_color is None:
+                self._text_color = entry.cget("text_color")
+            entry.grid(row=row, column=1, padx=5, pady=3, sticky="w")
+            entry.bind("<Return>", lambda _e, r=row: self._commit_row(r))
+            entry.bind("<KP_Enter>", lambda _e, r=row: self._commit_row(r))
+            entry.bind("<FocusOut>", lambda _e, r=row: self._commit_row(r))
+            self._bind_wheel(label)
+            self._bind_wheel(entry)
+            self._rows.append((label, entry))
+            self._shown.append((None, None, False))
+        while len(self._rows) > wanted:
+            for widget in self._rows.pop():
+                widget.destroy()
+            self._shown.pop()
+        self.top = max(0, min(self.top, self.count - len(self._rows)))
+        self._render()
+
+    def _commit_pending(self):
+        """Commit every visible row whose text the user changed since it was last shown or committed."""
+        for row, (_, entry) in enumerate(self._rows):
+            if entry.get() != self._shown[row][1]:
+                self._commit_row(row)
+
+    def _commit_row(self, row):
+        """Copy what the user typed in visible row ``row`` back into the value array."""
+        index = self.top + row
+        if index >= self.count:
+            return
+        label, entry = self._rows[row]
+        raw = entry.get()
+        text = raw.strip()
+        if self._continued[index]:
+            self._schedule_render()     # part of a typed value; edit its first cell instead
+            return
+        if index in self.layout:
+            _, codec = self.layout[index]
+            end = index + codec.registers
+            try:
+                new = array("H", codec.encode([codec.parse(text)]))
+            except ValueError:
+                self.known[index:end] = self.dirty[index:end] = bytes(codec.registers)
+            else:
+                if new != self.values[index:end] or self.known.find(0, index, end) != -1:
+                    self.dirty[index:end] = b"\x01" * codec.registers
+                self.values[index:end] = new
+                self.known[index:end] = b"\x01" * codec.registers
+        else:
+            if self.bits:
+                ok, val = text != "", 1 if text.lower() in ("1", "true", "on") else 0
+            else:
+                try:
+                    ok, val = True, parse_register(text)
+                except ValueError:
+                    ok, val = False, 0
+            if not ok:
+                self.dirty[index] = 0   # a blank or invalid cell is never written
+            elif not self.known[index] or self.values[index] != val:
+                self.dirty[index] = 1
+            self.values[index] = val
+            self.known[index] = 1 if ok else 0
+
+        edited = bool(self.dirty[index])
+        if edited != self._shown[row][2]:
+            entry.configure(text_color=EDITED_COLOR if edited else self._text_color)
+        self._shown[row] = (self._shown[row][0], raw, edited)
+
+    def _format(self, index):
+        if self._continued[index]:
+            return CONTINUATION
+        if index in self.layout:
+            _, codec = self.layout[index]
+            end = index + codec.registers
+            if self.known.find(0, index, end) != -1:
+                return ""
+            return codec.format(codec.decode(self.values[index:end])[0])
+        if not self.known[index]:
+            return ""
+        if self.bits:
+            return str(bool(self.values[index]))
+        return str(self.values[index])
+
+    def _schedule_render(self):
+        if self._repaint_id is None:
+            self._repaint_id = self.after(FRAME_MS, self._render)
+
+    def destroy(self):
+        if self._repaint_id is not None:
+            self.after_cancel(self._repaint_id)
+            self._repaint_id = None
+        super().destroy()
+
+    def _render(self):
+        self._repaint_id = None
+        for row, (label, entry) in enumerate(self._rows):
+            index = self.top + row
+            if index >= self.count:
+                label_text, text, edited = "", "", False
+            else:
+                edited = bool(self.dirty[index])
+                label_text = f"{self.address_format(self.start + index)}:"
+                if index in self.layout:
+                    tag, _ = self.layout[index]
+                    label_text = f"{self.address_format(self.start + index)} {tag.name or tag.dtype}:"
+                text = self._format(index)
+
+            shown_label, shown_text, shown_edited = self._shown[row]
+            if text != shown_text and entry.get() != shown_text:
+                # The user is typing here; keep the row as it is until the edit is committed.
+                continue
+            if label_text != shown_label:
+                label.configure(text=label_text)
+            if edited != shown_edited:
+                entry.configure(text_color=EDITED_COLOR if edited else self._text_color)
+            if text != shown_text:
+                if self.state != "normal":
+                    entry.configure(state="normal")
+                entry.delete(0, "end")
+                entry.insert(0, text)
+                if self.state != "normal":
+                    entry.configure(state=self.state)
+                self.cells_repainted += 1
+            self._shown[row] = (label_text, text, edited)
+        if self.count:
+            self.scrollbar.set(self.top / self.count, (self.top + len(self._rows)) / self.count)
@@ -0,0 +1,177 @@
+"""Deadline-driven scheduling of poll groups for ``PollingEngine``.
+
+A poll group is the set of watched ranges of one device that share a rate
+and a priority. ``DeadlineScheduler`` keeps the groups in a heap ordered by
+their next deadline; the engine sleeps until the earliest one, takes every
+group that is due (highest priority first) and hands each back with
+``complete()`` once its reads finish.
+
+Deadlines advance on a fixed grid (``deadline += interval``), so read time
+never adds drift. A group that overruns (its reads outlast the interval) is
+handled per ``policy``:
+
+* ``skip``     - resume at the next grid slot after now, counting the missed
+                 polls as skipped.
+* ``catch-up`` - run the missed polls back to back until back on the grid,
+                 but resynchronise instead once more than
+                 ``catch_up_limit`` periods behind.
+
+``DeviceBackoff`` tracks unreachable devices; their groups are deferred
+with an exponentially growing delay instead of being retried every period.
+"""
+import heapq
+import itertools
+import math
+import threading
+
+from .histogram import LatencyHistogram
+
+SKIP = "skip"
+CATCH_UP = "catch-up"
+POLICIES = (SKIP, CATCH_UP)
+
+
+class PollGroup:
+    def __init__(self, device, interval, priority, requests, plan):
+        self.device = device
+        self.interval = interval
+        self.priority = priority
+        self.requests = requests
+        self.plan = plan
+        self.deadline = None
+        self.running = False
+        self.started = None
+        # Statistics
+        self.runs = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.deferred = 0
+        self.lateness = LatencyHistogram()  # dispatch time minus deadline
+        self.last_duration = 0.0
+
+    @property
+    def key(self):
+        return (self.device.name, self.interval, self.priority)
+
+    def stats(self):
+        return {
+            "device": self.device.name,
+            "interval_ms": round(self.interval * 1000, 1),
+            "priority": self.priority,
+            "ranges": len(self.requests),
+            "reads": len(self.plan),
+            "runs": self.runs,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "deferred": self.deferred,
+            "last_ms": round(self.last_duration * 1000, 3),
+            "jitter_ms": self.lateness.summary_ms(),
+        }
+
+
+class DeadlineScheduler:
+    """Priority queue of poll groups keyed by deadline. Use from one thread (the engine's loop)."""
+
+    def __init__(self, policy=SKIP, catch_up_limit=10):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overrun policy {policy!r} (use {', '.join(POLICIES)})")
+        self.policy = policy
+        self.catch_up_limit = catch_up_limit
+        self._heap = []
+        self._seq = itertools.count()
+
+    def schedule(self, group, deadline):
+        group.deadline = deadline
+        heapq.heappush(self._heap, (deadline, -group.priority, next(self._seq), group))
+
+    def remove(self, groups):
+        """Drop ``groups`` from the queue (groups still running are simply not rescheduled)."""
+        gone = set(map(id, groups))
+        self._heap = [entry for entry in self._heap if id(entry[3]) not in gone]
+        heapq.heapify(self._heap)
+
+    def next_deadline(self):
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now, retry_at=None):
+        """Return every group whose deadline has passed, highest priority first.
+
+        ``retry_at(device_name)`` may return a time before which a device must
+        not be polled; its due groups are deferred instead of returned.
+        """
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, _, group = heapq.heappop(self._heap)
+            until = retry_at(group.device.name) if retry_at else None
+            if until is not None and until > now:
+                self.defer(group, until)
+                continue
+            group.lateness.record(now - group.deadline)
+            group.running = True
+            group.started = now
+            due.append(group)
+        due.sort(key=lambda group: -group.priority)
+        return due
+
+    def complete(self, group, now):
+        """Reschedule ``group`` after its reads finished at ``now``."""
+        group.running = False
+        group.runs += 1
+        group.last_duration = now - group.started
+        self.schedule(group, self._next_deadline(group, group.deadline + group.interval, now))
+
+    def defer(self, group, until):
+        """Skip ``group`` until ``until`` (e.g. its device is backing off), staying on its grid."""
+        group.deferred += 1
+        missed = max(1, math.ceil((until - group.deadline) / group.interval))
+        self.schedule(group, group.deadline + missed * group.interval)
+
+    def _next_deadline(self, group, deadline, now):
+        if deadline > now:
+            return deadline
+        group.overruns += 1
+        behind = math.floor((now - deadline) / group.interval) + 1
+        if self.policy == CATCH_UP and behind <= self.catch_up_limit:
+            return deadline
+        group.skipped += behind
+        return deadline + behind * group.interval
+
+
+class DeviceBackoff:
+    """Exponential retry delay per unreachable device. Thread-safe."""
+
+    def __init__(self, initial=0.5, maximum=30.0):
+        self.initial = initial
+        self.maximum = maximum
+        self._state = {}    # device name -> (delay, retry_at, failed_at)
+        self._lock = threading.Lock()
+
+    def failed(self, name, now, started=None):
+        """Record a failure of an attempt begun at ``started``; returns the new delay.
+
+        Attempts that began before the previous failure was recorded (e.g.
+        other groups already in flight) do not grow the delay again and
+        return ``None``.
+        """
+        with self._lock:
+            delay, retry_at, failed_at = self._state.get(name, (0.0, 0.0, None))
+            if failed_at is not None and started is not None and started < failed_at:
+                return None
+            delay = min(self.maximum, max(self.initial, delay * 2))
+            self._state[name] = (delay, now + delay, now)
+            return delay
+
+    def succeeded(self, name):
+        """Forget a device's failures; returns ``True`` if it was backing off."""
+        with self._lock:
+            return self._state.pop(name, None) is not None
+
+    def retry_at(self, name):
+        """Monotonic time before which ``name`` should not be polled, or ``None``."""
+        with self._lock:
+            state = self._state.get(name)
+            return state[1] if state else None
+
+    def snapshot(self):
+        with self._lock:
+            return {name: state[0] for name, state in self._state.items()}
@@ -0,0 +1,202 @@
+"""Request metrics for Server mode.
+
+``InstrumentedTcpServer`` is a ``ModbusTcpServer`` whose per-connection
+handlers report into a ``ServerMetrics`` object: requests by function code,
+unit ID and client address, exception responses, request handling time,
+bytes in/out and active connections. The metrics are updated from the
+server's event loop thread and read from the GUI thread, so every access
+goes through a lock; ``snapshot()`` returns a plain dict for display and
+JSON/CSV export.
+"""
+import csv
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+from pymodbus.server import ModbusTcpServer
+from pymodbus.server.requesthandler import ServerRequestHandler
+
+from .histogram import LatencyHistogram
+from .recorder import per_connection
+
+# Function codes that get their own CSV column.
+CSV_FUNCTION_CODES = (1, 2, 3, 4, 5, 6, 15, 16)
+
+
+class ServerMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.requests = 0
+            self.by_function = Counter()
+            self.by_unit = Counter()
+            self.by_client = Counter()
+            self.exceptions = Counter()
+            self.handle_time = LatencyHistogram()
+            self.bytes_in = 0
+            self.bytes_out = 0
+            self.active_connections = 0
+            self.total_connections = 0
+
+    # --- Updates (server thread) ---
+    def connection_opened(self):
+        with self._lock:
+            self.active_connections += 1
+            self.total_connections += 1
+
+    def connection_closed(self):
+        with self._lock:
+            self.active_connections = max(0, self.active_connections - 1)
+
+    def add_bytes(self, received=0, sent=0):
+        with self._lock:
+            self.bytes_in += received
+            self.bytes_out += sent
+
+    def record_request(self, function_code, unit_id, client, seconds):
+        with self._lock:
+            self.requests += 1
+            self.by_function[function_code] += 1
+            self.by_unit[unit_id] += 1
+            self.by_client[client] += 1
+            self.handle_time.record(seconds)
+
+    def record_exception(self, exception_code):
+        with self._lock:
+            self.exceptions[exception_code] += 1
+
+    # --- Reporting (any thread) ---
+    def snapshot(self):
+        with self._lock:
+            now = time.time()
+            uptime = now - self.started
+            return {
+                "timestamp": round(now, 3),
+                "uptime_s": round(uptime, 3),
+                "requests": self.requests,
+                "requests_per_s": round(self.requests / uptime, 2) if uptime > 0 else 0.0,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "active_connections": self.active_connections,
+                "total_connections": self.total_connections,
+                "by_function": {str(fc): n for fc, n in sorted(self.by_function.items())},
+                "by_unit": {str(unit): n for unit, n in sorted(self.by_unit.items())},
+                "by_client": dict(self.by_client.most_common()),
+                "exceptions": {str(code): n for code, n in sorted(self.exceptions.items())},
+                "handle_time_ms": self.handle_time.summary_ms(),
+            }
+
+
+def csv_header():
+    return (
+        ["timestamp", "uptime_s", "requests", "requests_per_s", "bytes_in", "bytes_out",
+         "active_connections", "total_connections", "exceptions",
+         "handle_p50_ms", "handle_p95_ms", "handle_p99_ms", "handle_max_ms"]
+        + [f"fc{fc}" for fc in CSV_FUNCTION_CODES]
+    )
+
+
+def csv_row(snapshot):
+    handle = snapshot["handle_time_ms"]
+    return (
+        [snapshot[key] for key in ("timestamp", "uptime_s", "requests", "requests_per_s", "bytes_in",
+                                   "bytes_out", "active_connections", "total_connections")]
+        + [sum(snapshot["exceptions"].values()), handle["p50"], handle["p95"], handle["p99"], handle["max"]]
+        + [snapshot["by_function"].get(str(fc), 0) for fc in CSV_FUNCTION_CODES]
+    )
+
+
+def write_json(path, snapshot):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, indent=2)
+
+
+def append_jsonl(path, snapshot):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(snapshot) + "\n")
+
+
+def append_csv(path, snapshot):
+    """Append one row, writing the header first if the file is new or empty."""
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(csv_header())
+        writer.writerow(csv_row(snapshot))
+
+
+class InstrumentedRequestHandler(ServerRequestHandler):
+    """Per-connection handler that reports into ``owner.metrics``."""
+
+    def __init__(self, owner, trace_packet, trace_pdu, trace_connect):
+        super().__init__(owner, trace_packet, trace_pdu, trace_connect)
+        self.metrics = owner.metrics
+        self.peer = "unknown"
+
+    def callback_connected(self):
+        super().callback_connected()
+        peer = self.transport.get_extra_info("peername") if self.transport else None
+        if peer:
+            self.peer = f"{peer[0]}:{peer[1]}"
+        self.metrics.connection_opened()
+
+    def callback_disconnected(self, call_exc):
+        self.metrics.connection_closed()
+        super().callback_disconnected(call_exc)
+
+    def data_received(self, data):
+        self.metrics.add_bytes(received=len(data))
+        super().data_received(data)
+
+    def send(self, data, addr=None):
+        self.metrics.add_bytes(sent=len(data))
+        super().send(data, addr)
+
+    async def handle_request(self):
+        pdu = self.last_pdu
+        if not pdu:
+            return
+        started = time.perf_counter()
+        await self.respond(pdu, self.last_addr)
+        self.metrics.record_request(pdu.function_code, pdu.dev_id, self.peer, time.perf_counter() - started)
+
+    async def respond(self, pdu, addr):
+        """Answer ``pdu`` from the datastore; subclasses may delay, replace or drop the answer."""
+        await super().handle_request()
+
+    def server_send(self, pdu, addr):
+        if pdu and pdu.function_code & 0x80:
+            self.metrics.record_exception(getattr(pdu, "exception_code", 0))
+        super().server_send(pdu, addr)
+
+
+class InstrumentedTcpServer(ModbusTcpServer):
+    def __init__(self, context, metrics=None, **kwargs):
+        super().__init__(context, **kwargs)
+        self.metrics = metrics if metrics is not None else ServerMetrics()
+        self.listen_error = None
+
+        # pymodbus' listen() only returns False when the bind fails; keep the
+        # OSError so callers can say why (e.g. address already in use).
+        create = self.call_create
+
+        async def call_create():
+            try:
+                return await create()
+            except OSError as e:
+                self.listen_error = e
+                raise
+
+        self.call_create = call_create
+
+    def callback_new_connection(self):
+        if self.trace_connect:
+            self.trace_connect(True)
+        return InstrumentedRequestHandler(self, self.trace_packet, per_connection(self.trace_pdu), self.trace_connect)
@@ -0,0 +1,160 @@
+"""Run Server mode on a private event loop thread, with readiness signaling.
+
+``ServerRunner`` binds an ``InstrumentedTcpServer`` on its own asyncio loop
+(and runs the ``Simulator``, if any, on the same loop) without blocking the
+caller. The outcome of the bind is reported as soon as it is known: a
+``ServerStarted`` with the bound address, or a ``ServerFailed`` carrying the
+actual ``OSError`` text (address in use, address not available, ...). Like
+``PollingEngine``, events go into ``ServerRunner.results`` for the GUI to
+drain; ``ready`` is a ``threading.Event`` set at the same moment for callers
+without an event loop of their own.
+
+A ``plant`` (list of ``plant.PlantPort``) adds more listeners on the same
+host and loop. They all bind before ``ServerStarted`` is reported; if any
+bind fails, the others are closed again and ``ServerFailed`` names the
+port. Without a ``context`` only the plant is served.
+
+``stop()`` closes every listener and client connection, stops the
+simulator and joins the thread.
+"""
+import asyncio
+import logging
+import queue
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+from .server_metrics import InstrumentedTcpServer, ServerMetrics
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class ServerStarted:
+    host: str
+    port: int               # None when only a plant is served
+    startup_ms: float
+    plant_ports: tuple = ()
+
+
+@dataclass
+class ServerFailed:
+    error: str
+
+
+@dataclass
+class ServerStopped:
+    error: str = None
+
+
+class ServerRunner:
+    """Serve ``context`` at ``address`` until ``stop()``.
+
+    ``metrics`` and ``trace_pdu`` are passed to every server; ``simulator`` is
+    an optional ``simulation.Simulator`` ticked on the server's loop.
+    ``seed`` makes the plant's delays and injected errors repeatable.
+    """
+
+    def __init__(self, context, address, metrics=None, trace_pdu=None, simulator=None, plant=(), seed=None):
+        self.context = context
+        self.address = address
+        self.metrics = metrics if metrics is not None else ServerMetrics()   # shared by every listener
+        self.trace_pdu = trace_pdu
+        self.simulator = simulator
+        self.plant = list(plant)
+        self.rng = random.Random(seed)
+        self.results = queue.Queue()
+        self.ready = threading.Event()
+        self.error = None
+        self._loop = None
+        self._thread = None
+        self._task = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    # --- Public API (called from the Tk thread) ---
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="modbus-server", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2):
+        if self._loop is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._cancel)
+        except RuntimeError:
+            pass  # loop already closed
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    # --- Event loop side ---
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._task = self._loop.create_task(self._serve())
+        try:
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            log.exception("Server loop failed")
+            self.results.put(ServerStopped(str(e)))
+        finally:
+            self.ready.set()
+            self._loop.close()
+
+    def _cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _serve(self):
+        started = time.perf_counter()
+        host = self.address[0]
+        servers = []
+        try:
+            if self.context is not None:
+                servers.append(InstrumentedTcpServer(
+                    self.context, metrics=self.metrics, address=self.address, trace_pdu=self.trace_pdu
+                ))
+            for plant_port in self.plant:
+                servers.append(plant_port.create_server(
+                    host, metrics=self.metrics, trace_pdu=self.trace_pdu, rng=self.rng
+                ))
+            for server in servers:
+                if not await server.listen():
+                    port = server.comm_params.source_address[1]
+                    raise OSError(f"port {port}: {server.listen_error or 'unable to listen'}")
+        except Exception as e:
+            for server in servers:
+                await server.shutdown()
+            self._fail(str(e))
+            return
+
+        bound = [server.transport.sockets[0].getsockname()[:2] for server in servers]
+        port = None
+        if self.context is not None:
+            host, port = bound.pop(0)
+            self.address = (host, port)
+        self.results.put(ServerStarted(
+            host, port, round((time.perf_counter() - started) * 1000, 3), tuple(p for _, p in bound)
+        ))
+        self.ready.set()
+
+        sim_task = asyncio.create_task(self.simulator.run()) if self.simulator is not None else None
+        try:
+            await asyncio.wait([server.serving for server in servers], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if sim_task is not None:
+                self.simulator.stop()
+                sim_task.cancel()
+            for server in servers:
+                await server.shutdown()
+            self.results.put(ServerStopped())
+
+    def _fail(self, error):
+        self.error = error
+        self.results.put(ServerFailed(error))
+        self.ready.set()
@@ -0,0 +1,187 @@
+"""Vectorized signal simulation for Server mode.
+
+A ``Simulator`` drives address ranges of the server's datastore from
+generators (ramp, sine, noise, step, counter). Each tick computes every
+range as one NumPy expression and writes it back with a single bulk
+``setValues`` per range, so the cost per tick barely grows with the number
+of simulated registers. Ticks run as a task on the server's own event loop,
+which keeps them from interleaving with request handling.
+
+Signals are configured one per line as::
+
+    <table> <start>[-<end>] <generator> [key=value ...]
+
+where ``table`` is ``hr``, ``ir``, ``co`` or ``di`` and the keys are
+``period`` (seconds), ``low``, ``high``, ``step`` (counter increment per
+tick), ``duty`` (step high fraction) and ``spread`` (phase offset across
+the range, 0 = every address in step). Register values are rounded and
+stored modulo 65536, so negative values end up as two's complement.
+"""
+import asyncio
+import logging
+import time
+from array import array
+from dataclasses import dataclass
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+GENERATORS = ("ramp", "sine", "noise", "step", "counter")
+TABLES = {"co": 1, "di": 2, "hr": 3, "ir": 4}
+BIT_TABLES = ("co", "di")
+OPTIONS = ("period", "low", "high", "step", "duty", "spread")
+
+
+@dataclass(frozen=True)
+class Signal:
+    table: str
+    address: int
+    count: int
+    generator: str
+    period: float = 10.0
+    low: float = 0.0
+    high: float = 1000.0
+    step: float = 1.0
+    duty: float = 0.5
+    spread: float = 1.0
+
+
+def parse_signals(text):
+    """Parse one signal per line; ``#`` comments and blank lines are ignored.
+
+    Raises ``ValueError`` naming the offending line.
+    """
+    signals = []
+    for line_no, line in enumerate(text.splitlines(), start=1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        parts = line.split()
+        if len(parts) < 3:
+            raise ValueError(f"Line {line_no}: expected <table> <start>[-<end>] <generator> [key=value ...]")
+        table, span, generator = parts[0].lower(), parts[1], parts[2].lower()
+        if table not in TABLES:
+            raise ValueError(f"Line {line_no}: unknown table {parts[0]!r} (use {', '.join(TABLES)})")
+        if generator not in GENERATORS:
+            raise ValueError(f"Line {line_no}: unknown generator {parts[2]!r} (use {', '.join(GENERATORS)})")
+        try:
+            first, _, last = span.partition("-")
+            address = int(first)
+            count = int(last) - address + 1 if last else 1
+        except ValueError:
+            raise ValueError(f"Line {line_no}: invalid address range {span!r}") from None
+        if address < 0 or count < 1 or address + count > 65536:
+            raise ValueError(f"Line {line_no}: address range {span!r} is outside 0-65535")
+
+        options = {}
+        if table in BIT_TABLES:
+            options["high"] = 1.0
+        elif generator == "counter":
+            options["high"] = 65535.0
+        for option in parts[3:]:
+            key, sep, value = option.partition("=")
+            if not sep or key not in OPTIONS:
+                raise ValueError(f"Line {line_no}: unknown option {option!r} (use {', '.join(OPTIONS)})")
+            try:
+                options[key] = float(value)
+            except ValueError:
+                raise ValueError(f"Line {line_no}: {key} must be a number, got {value!r}") from None
+        signal = Signal(table, address, count, generator, **options)
+        if signal.period <= 0:
+            raise ValueError(f"Line {line_no}: period must be positive")
+        if signal.high < signal.low:
+            raise ValueError(f"Line {line_no}: high must not be below low")
+        signals.append(signal)
+    return signals
+
+
+class _CompiledSignal:
+    """A signal with its per-address phase vector precomputed."""
+
+    def __init__(self, signal, rng):
+        self.signal = signal
+        self.fc = TABLES[signal.table]
+        self.bits = signal.table in BIT_TABLES
+        self.index = np.arange(signal.count, dtype=np.float64)
+        self.phase = self.index * (signal.spread / signal.count)
+        self.rng = rng
+
+    def compute(self, t, tick):
+        s = self.signal
+        if s.generator == "ramp":
+            values = s.low + (s.high - s.low) * np.mod(t / s.period + self.phase, 1.0)
+        elif s.generator == "sine":
+            mid, amplitude = (s.high + s.low) / 2, (s.high - s.low) / 2
+            values = mid + amplitude * np.sin(2 * np.pi * (t / s.period + self.phase))
+        elif s.generator == "noise":
+            values = self.rng.uniform(s.low, s.high, s.count)
+        elif s.generator == "step":
+            values = np.where(np.mod(t / s.period + self.phase, 1.0) < s.duty, s.high, s.low)
+        else:   # counter
+            values = s.low + np.mod(tick * s.step + self.index, s.high - s.low + 1)
+        return values
+
+    def write(self, slave, t, tick):
+        values = self.compute(t, tick)
+        if self.bits:
+            block = (values >= (self.signal.low + self.signal.high) / 2).astype(np.uint8).tobytes()
+        else:
+            block = array("H")
+            block.frombytes(np.rint(values).astype(np.int64).astype(np.uint16).tobytes())
+        slave.setValues(self.fc, self.signal.address, block)
+
+
+class Simulator:
+    """Tick the configured signals into ``context[unit]`` at a fixed rate."""
+
+    def __init__(self, context, signals=(), tick=0.1, unit=0, seed=None):
+        self.context = context
+        self.tick = tick
+        self.unit = unit
+        self._rng = np.random.default_rng(seed)
+        self._signals = []
+        self._running = False
+        self.ticks = 0
+        self.overruns = 0
+        self.last_tick_s = 0.0
+        self.set_signals(signals)
+
+    @property
+    def register_count(self):
+        return sum(compiled.signal.count for compiled in self._signals)
+
+    def set_signals(self, signals):
+        """Replace the simulated signals; takes effect on the next tick (any thread)."""
+        self._signals = [_CompiledSignal(signal, self._rng) for signal in signals]
+
+    def step(self, t, tick):
+        """Compute and write every signal once for time ``t`` seconds and tick number ``tick``."""
+        slave = self.context[self.unit]
+        for compiled in self._signals:
+            compiled.write(slave, t, tick)
+
+    async def run(self):
+        """Tick until ``stop()`` or cancellation; must run on the server's event loop."""
+        self._running = True
+        started = time.monotonic()
+        deadline = started
+        while self._running:
+            began = time.perf_counter()
+            try:
+                self.step(time.monotonic() - started, self.ticks)
+            except Exception:
+                log.exception("Simulation tick failed")
+            self.last_tick_s = time.perf_counter() - began
+            self.ticks += 1
+            deadline += self.tick
+            delay = deadline - time.monotonic()
+            if delay < 0:
+                # Fell behind: skip the missed ticks instead of bursting to catch up.
+                self.overruns += 1
+                deadline = time.monotonic()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    def stop(self):
+        self._running = False
@@ -0,0 +1,396 @@
+"""Binary snapshots of the Server mode register image, restore and diff.
+
+A snapshot holds every table of every unit of a server context::
+
+    header  : magic b"MBSS", version u16, section count u16, created f64 (Unix seconds)
+    section*: unit id u8, function code u8, reserved u16, address u32, count u32, data offset u32
+    data    : per section, registers as u16 or bits packed eight per byte,
+              least significant bit first (the ``BitArrayBlock`` layout)
+
+All integers are little-endian and every data block starts on an even
+offset. The function code is the table's read code (1 coils, 2 discrete
+inputs, 3 holding registers, 4 input registers). A full 65536-address unit
+takes 272 KiB.
+
+Saving copies the ``RegisterArrayBlock`` / ``BitArrayBlock`` buffers as
+they are. ``Snapshot`` memory-maps a file and hands out each section
+without parsing it value by value, and ``restore`` writes each section back
+with one bulk ``setValues``, so a full unit loads in a few milliseconds
+(and, through ``NotifyingSlaveContext``, shows up in the GUI like any other
+write).
+
+``diff`` compares two images - snapshots, or a snapshot and a live device
+read with ``read_device`` - section by section, comparing whole buffers
+first and narrowing down to single values only where they differ.
+
+Run ``python Modbus_TCP_IP_Tester.py snapshot --help`` for the command line.
+"""
+import argparse
+import asyncio
+import json
+import mmap
+import struct
+import sys
+import time
+from array import array
+from itertools import chain
+
+import numpy as np
+from pymodbus.exceptions import ModbusException
+
+from .datastore import BitArrayBlock, RegisterArrayBlock
+from .pipeline import PipelinedClient
+from .read_planner import MAX_READ_COUNT
+
+MAGIC = b"MBSS"
+VERSION = 1
+HEADER = struct.Struct("<4sHHd")
+SECTION = struct.Struct("<BBHIII")
+
+# Read function code -> (datastore key, table name)
+TABLES = {1: ("c", "Coils"), 2: ("d", "Discrete Inputs"), 3: ("h", "Holding Registers"), 4: ("i", "Input Registers")}
+BIT_TABLES = (1, 2)
+NATIVE_LITTLE = sys.byteorder == "little"
+
+
+def _to_le(registers):
+    """``array('H')`` -> little-endian bytes."""
+    if NATIVE_LITTLE:
+        return registers.tobytes()
+    swapped = array("H", registers)
+    swapped.byteswap()
+    return swapped.tobytes()
+
+
+def _from_le(data):
+    """Little-endian bytes (or a buffer) -> ``array('H')``."""
+    registers = array("H")
+    registers.frombytes(data)
+    if not NATIVE_LITTLE:
+        registers.byteswap()
+    return registers
+
+
+def pack_bits(bits):
+    """Sequence of truthy values -> bytes, eight per byte, least significant bit first."""
+    return np.packbits(np.fromiter(map(bool, bits), bool, len(bits)), bitorder="little").tobytes()
+
+
+def unpack_bits(data, count):
+    """Packed bytes -> ``bytes`` of ``count`` 0/1 values."""
+    return np.unpackbits(np.frombuffer(data, np.uint8), count=count, bitorder="little").tobytes()
+
+
+class Section:
+    """One table of one unit: ``data`` is little-endian u16 or packed bits."""
+
+    __slots__ = ("unit", "function_code", "address", "count", "data")
+
+    def __init__(self, unit, function_code, address, count, data):
+        self.unit = unit
+        self.function_code = function_code
+        self.address = address
+        self.count = count
+        self.data = data
+
+    @property
+    def table(self):
+        return TABLES[self.function_code][1]
+
+    @property
+    def bits(self):
+        return self.function_code in BIT_TABLES
+
+    def values(self):
+        """``array('H')`` of registers, or ``bytes`` of 0/1 per bit."""
+        if self.bits:
+            return unpack_bits(self.data, self.count)
+        return _from_le(self.data)
+
+
+def capture(context):
+    """Return the ``Section`` list of every unit in a pymodbus server context."""
+    sections = []
+    for unit, slave in sorted(context, key=lambda item: item[0]):
+        for fc, (key, _) in TABLES.items():
+            block = slave.store.get(key)
+            if block is None:
+                continue
+            address = block.address - 1     # ModbusSlaveContext adds 1 to every address
+            if isinstance(block, RegisterArrayBlock):
+                data = _to_le(block.values)
+                count = len(block.values)
+            elif isinstance(block, BitArrayBlock):
+                data = bytes(block.values)
+                count = block.count
+            elif isinstance(getattr(block, "values", None), list):     # ModbusSequentialDataBlock
+                count = len(block.values)
+                data = pack_bits(block.values) if fc in BIT_TABLES else _to_le(array("H", block.values))
+            else:
+                raise ValueError(f"Unit {unit} {TABLES[fc][1]}: {type(block).__name__} cannot be saved")
+            sections.append(Section(unit, fc, address, count, data))
+    return sections
+
+
+def save(path, sections):
+    """Write ``sections`` to ``path``; returns the file size."""
+    offset = HEADER.size + SECTION.size * len(sections)
+    table = []
+    for section in sections:
+        offset += offset & 1
+        table.append(offset)
+        offset += len(section.data)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(sections), time.time()))
+        for section, data_offset in zip(sections, table):
+            f.write(SECTION.pack(section.unit, section.function_code, 0, section.address, section.count,
+                                 data_offset))
+        for section, data_offset in zip(sections, table):
+            f.seek(data_offset)
+            f.write(section.data)
+    return offset
+
+
+def save_context(path, context):
+    return save(path, capture(context))
+
+
+class Snapshot:
+    """A memory-mapped snapshot file; each ``Section.data`` is a ``memoryview`` into the map."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self._map) < HEADER.size:
+                raise ValueError(f"{path} is too short to be a snapshot")
+            magic, version, count, self.created = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a version {VERSION} snapshot")
+            self._view = view = memoryview(self._map)
+            self.sections = []
+            for i in range(count):
+                unit, fc, _, address, n, offset = SECTION.unpack_from(self._map, HEADER.size + i * SECTION.size)
+                size = (n + 7) // 8 if fc in BIT_TABLES else 2 * n
+                if fc not in TABLES or offset + size > len(self._map):
+                    raise ValueError(f"{path}: section {i} is damaged or truncated")
+                self.sections.append(Section(unit, fc, address, n, view[offset:offset + size]))
+        except (ValueError, struct.error):
+            self._release()
+            raise
+
+    def close(self):
+        self._release()
+
+    def _release(self):
+        for section in getattr(self, "sections", ()):
+            section.data.release()
+        self.sections = []
+        view = getattr(self, "_view", None)
+        if view is not None:
+            view.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def restore(context, sections):
+    """Write ``sections`` into ``context`` with one ``setValues`` per section.
+
+    Returns ``(values written, skipped units)``; sections for units the
+    context does not serve are skipped.
+    """
+    written = 0
+    skipped = set()
+    for section in sections:
+        if section.unit not in context:
+            skipped.add(section.unit)
+            continue
+        slave = context[section.unit]
+        slave.setValues(section.function_code, section.address, section.values())
+        written += section.count
+    return written, sorted(skipped)
+
+
+def load_context(path, context):
+    with Snapshot(path) as snapshot:
+        return restore(context, snapshot.sections)
+
+
+def diff(a, b, limit=None):
+    """Compare two section lists.
+
+    Returns ``(compared, differences)``: the number of values present in
+    both, and ``[(unit, table, address, a value, b value), ...]`` (at most
+    ``limit`` entries). Sections are matched by unit and function code and
+    compared over the addresses they share.
+    """
+    others = {(s.unit, s.function_code): s for s in b}
+    compared = 0
+    differences = []
+    for left in a:
+        right = others.get((left.unit, left.function_code))
+        if right is None:
+            continue
+        start = max(left.address, right.address)
+        end = min(left.address + left.count, right.address + right.count)
+        if start >= end:
+            continue
+        compared += end - start
+        lv, rv = left.values(), right.values()
+        lv = lv[start - left.address:end - left.address]
+        rv = rv[start - right.address:end - right.address]
+        if lv == rv:
+            continue
+        # Narrow down in chunks so identical stretches cost one comparison each.
+        for chunk in range(0, len(lv), 256):
+            la, ra = lv[chunk:chunk + 256], rv[chunk:chunk + 256]
+            if la == ra:
+                continue
+            for i, (x, y) in enumerate(zip(la, ra), start=start + chunk):
+                if x != y:
+                    differences.append((left.unit, left.table, i, int(x), int(y)))
+                    if limit is not None and len(differences) >= limit:
+                        return compared, differences
+    return compared, differences
+
+
+async def read_device(host, port=502, units=(1,), function_codes=(1, 2, 3, 4), address=0, count=65536,
+                      timeout=3, window=1):
+    """Read ``count`` values from ``address`` of each table of each unit into a ``Section`` list.
+
+    Tables or units the device refuses (exception response) are left out;
+    a timeout or lost connection raises ``ModbusIOException``.
+    """
+    count = min(count, 65536 - address)
+    client = PipelinedClient(host, port=port, window=window, timeout=timeout)
+    if not await client.connect():
+        raise OSError(f"Unable to connect to {host}:{port}")
+    readers = {
+        1: client.read_coils, 2: client.read_discrete_inputs,
+        3: client.read_holding_registers, 4: client.read_input_registers,
+    }
+    sections = []
+    try:
+        for unit in units:
+            for fc in function_codes:
+                step = MAX_READ_COUNT[TABLES[fc][1]]
+
+                async def read(start, n, fc=fc, unit=unit):
+                    response = await readers[fc](start, count=n, slave=unit)
+                    if response.isError():
+                        return None
+                    return response.bits[:n] if fc in BIT_TABLES else response.registers
+
+                starts = range(address, address + count, step)
+                blocks = await asyncio.gather(*(read(s, min(step, address + count - s)) for s in starts))
+                if None in blocks:
+                    continue    # the device refuses (part of) this table
+                values = list(chain.from_iterable(blocks))
+                data = pack_bits(values) if fc in BIT_TABLES else _to_le(array("H", values))
+                sections.append(Section(unit, fc, address, count, data))
+    finally:
+        client.close()
+        await client.wait_closed()
+    return sections
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="Modbus_TCP_IP_Tester.py snapshot",
+        description="Inspect and compare server register snapshots.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    info = commands.add_parser("info", help="List the sections of a snapshot")
+    info.add_argument("snapshot")
+
+    compare = commands.add_parser("diff", help="Compare a snapshot with another one or with a live device")
+    compare.add_argument("snapshot")
+    target = compare.add_mutually_exclusive_group(required=True)
+    target.add_argument("other", nargs="?", help="Second snapshot")
+    target.add_argument("--device", metavar="HOST[:PORT]", help="Read the device instead of a second snapshot")
+    compare.add_argument("--unit", type=int, action="append",
+                         help="Unit ID(s) to read from the device (default: the snapshot's units)")
+    compare.add_argument("--start", type=int, default=0, help="First address read from the device")
+    compare.add_argument("--count", type=int, default=65536, help="Addresses read from the device per table")
+    compare.add_argument("--tables", default="co,di,hr,ir", help="Tables read from the device")
+    compare.add_argument("--timeout", type=float, default=3.0)
+    compare.add_argument("--window", type=int, default=1, help="Requests in flight per connection (pipelining)")
+    compare.add_argument("--limit", type=int, default=1000, help="Most differences listed")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        snapshot = Snapshot(args.snapshot)
+    except (OSError, ValueError) as e:
+        parser.exit(2, f"snapshot: {e}\n")
+
+    with snapshot:
+        if args.command == "info":
+            print(json.dumps({
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(snapshot.created)),
+                "sections": [
+                    {"unit": s.unit, "table": s.table, "address": s.address, "count": s.count}
+                    for s in snapshot.sections
+                ],
+            }, indent=2))
+            return 0
+
+        started = time.perf_counter()
+        if args.device:
+            host, _, port = args.device.partition(":")
+            names = {"co": 1, "di": 2, "hr": 3, "ir": 4}
+            try:
+                fcs = [names[name.strip()] for name in args.tables.split(",") if name.strip()]
+            except KeyError as e:
+                parser.error(f"unknown table {e.args[0]!r} (use co, di, hr, ir)")
+            saved_units = sorted({s.unit for s in snapshot.sections})
+            units = args.unit or saved_units
+            try:
+                other = asyncio.run(read_device(host, int(port or 502), units, fcs, args.start, args.count,
+                                                timeout=args.timeout, window=args.window))
+            except (OSError, ValueError, ModbusException) as e:
+                parser.exit(2, f"snapshot: {e}\n")
+            if len(saved_units) == 1 and len(units) == 1:
+                for section in other:   # e.g. a single-unit server image (unit 0) against unit 1 of a device
+                    section.unit = saved_units[0]
+            target = args.device
+        else:
+            try:
+                other_snapshot = Snapshot(args.other)
+            except (OSError, ValueError) as e:
+                parser.exit(2, f"snapshot: {e}\n")
+            other = other_snapshot.sections
+            target = args.other
+
+        compared, differences = diff(snapshot.sections, other, args.limit)
+        print(json.dumps({
+            "snapshot": args.snapshot,
+            "target": target,
+            "compared": compared,
+            "differences": len(differences),
+            "truncated": len(differences) >= args.limit,
+            "seconds": round(time.perf_counter() - started, 3),
+            "items": [
+                {"unit": unit, "table": table, "address": address, "snapshot": x, "target": y}
+                for unit, table, address, x, y in differences
+            ],
+        }, indent=2))
+        if not args.device:
+            other_snapshot.close()
+    if not compared:
+        print("snapshot: nothing to compare (no table in common)", file=sys.stderr)
+        return 2
+    return 1 if differences else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
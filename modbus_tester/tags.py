@@ -0,0 +1,256 @@
+"""Typed tags on top of 16-bit registers.
+
+A tag map assigns a data type to address ranges of the holding or input
+registers, one range per line::
+
+    <hr|ir> <address> <type>[*<count>] [order=ABCD|CDAB|BADC|DCBA] [name=<text>]
+
+Types are int16, uint16, int32, uint32, int64, uint64, float32, float64,
+bitfield (one register shown as 16 bits) and string (``string*8`` is 8
+registers, 16 characters). ``order`` gives the byte layout of a value
+relative to big-endian ``ABCD``: ``CDAB`` swaps the registers (word order),
+``BADC`` swaps the bytes inside each register (byte order) and ``DCBA`` does
+both.
+
+Each range is compiled once into a ``BlockCodec``: a pair of precompiled
+``struct.Struct`` objects plus an ``itemgetter`` for the word order, so a
+whole block of values is decoded or encoded in a constant number of C calls
+however long it is.
+"""
+import struct
+from dataclasses import dataclass
+from functools import lru_cache
+from operator import itemgetter
+
+# Data type -> (struct code, registers per value)
+TYPES = {
+    "int16": ("h", 1),
+    "uint16": ("H", 1),
+    "int32": ("i", 2),
+    "uint32": ("I", 2),
+    "int64": ("q", 4),
+    "uint64": ("Q", 4),
+    "float32": ("f", 2),
+    "float64": ("d", 4),
+    "bitfield": ("H", 1),
+    "string": ("s", 1),
+}
+ORDERS = ("ABCD", "CDAB", "BADC", "DCBA")
+TABLES = {"hr": "Holding Registers", "ir": "Input Registers"}
+
+
+class BlockCodec:
+    """Decode and encode ``count`` values of one type laid out back to back.
+
+    For ``string`` the count is the number of registers and the block holds
+    a single value.
+    """
+
+    def __init__(self, dtype, count=1, order="ABCD"):
+        if dtype not in TYPES:
+            raise ValueError(f"Unknown type {dtype!r}")
+        if order not in ORDERS:
+            raise ValueError(f"Unknown order {order!r} (use {', '.join(ORDERS)})")
+        code, width = TYPES[dtype]
+        self.dtype = dtype
+        self.order = order
+        if dtype == "string":
+            self.width = self.registers = count
+            self.count = 1
+            values_format = f">{2 * count}s"
+        else:
+            self.width = width
+            self.registers = width * count
+            self.count = count
+            values_format = f">{count}{code}"
+
+        # Registers are turned into the big-endian byte string of the values: an
+        # itemgetter puts the words of each value in ABCD order, and packing the
+        # registers little-endian undoes swapped bytes.
+        byte_swap = order in ("BADC", "DCBA")
+        word_swap = order in ("CDAB", "DCBA") and self.width > 1 and dtype != "string"
+        self._words = struct.Struct(f"{'<' if byte_swap else '>'}{self.registers}H")
+        self._values = struct.Struct(values_format)
+        self._reorder = None
+        if word_swap:
+            self._reorder = itemgetter(*[
+                base + self.width - 1 - i for base in range(0, self.registers, self.width) for i in range(self.width)
+            ])
+
+        if dtype in ("float32", "float64", "string"):
+            self._limits = None
+        else:
+            bits = 16 * width
+            self._limits = (-(1 << bits - 1), (1 << bits - 1) - 1) if code.islower() else (0, (1 << bits) - 1)
+
+    def decode(self, registers):
+        """Return the list of values held by ``registers`` (exactly ``self.registers`` long)."""
+        if self._reorder is not None:
+            registers = self._reorder(registers)
+        values = self._values.unpack(self._words.pack(*registers))
+        if self.dtype == "string":
+            return [values[0].rstrip(b"\0").decode("latin-1")]
+        return list(values)
+
+    def encode(self, values):
+        """Return the registers for ``values``; raises ``ValueError`` if one does not fit."""
+        try:
+            if self.dtype == "string":
+                raw = self._values.pack(values[0].encode("latin-1"))
+            else:
+                raw = self._values.pack(*values)
+        except (struct.error, UnicodeEncodeError) as e:
+            raise ValueError(str(e)) from None
+        registers = self._words.unpack(raw)
+        if self._reorder is not None:
+            registers = self._reorder(registers)
+        return list(registers)
+
+    def format(self, value):
+        if self.dtype == "float32":
+            return f"{value:.7g}"
+        if self.dtype == "float64":
+            return f"{value:.15g}"
+        if self.dtype == "bitfield":
+            return f"{value:016b}"
+        return str(value)
+
+    def parse(self, text):
+        """Parse one value typed by the user; raises ``ValueError`` if it is invalid or out of range."""
+        text = text.strip()
+        if self.dtype == "string":
+            if len(text.encode("latin-1", "replace")) > 2 * self.width:
+                raise ValueError(f"at most {2 * self.width} characters")
+            return text
+        if self._limits is None:
+            return float(text)
+        if self.dtype == "bitfield" and text and set(text) <= set("01_"):
+            value = int(text, 2)
+        else:
+            value = _parse_int(text)
+        lo, hi = self._limits
+        if not lo <= value <= hi:
+            raise ValueError(f"{value} is outside {lo}..{hi}")
+        return value
+
+
+def _parse_int(text):
+    """``int()`` that also accepts 0x/0o/0b prefixes and leading zeros."""
+    try:
+        return int(text)
+    except ValueError:
+        return int(text, 0)
+
+
+def parse_register(text):
+    """Parse a raw register typed by the user: 0..65535, or -32768..-1 as two's complement."""
+    value = _parse_int(text.strip())
+    if not -0x8000 <= value <= 0xFFFF:
+        raise ValueError(f"{value} does not fit in a register")
+    return value & 0xFFFF
+
+
+@lru_cache(maxsize=None)
+def compile_codec(dtype, count=1, order="ABCD"):
+    """Return the shared ``BlockCodec`` for a layout, compiling it on first use."""
+    return BlockCodec(dtype, count, order)
+
+
+@dataclass(frozen=True)
+class Tag:
+    reg_type: str
+    address: int
+    dtype: str
+    count: int = 1
+    order: str = "ABCD"
+    name: str = ""
+
+    @property
+    def codec(self):
+        return compile_codec(self.dtype, self.count, self.order)
+
+    @property
+    def value_codec(self):
+        """Codec for a single value of this tag."""
+        return self.codec if self.dtype == "string" else compile_codec(self.dtype, 1, self.order)
+
+    @property
+    def registers(self):
+        return self.codec.registers
+
+
+class TagMap:
+    """A set of non-overlapping typed ranges."""
+
+    def __init__(self, tags=()):
+        self.tags = sorted(tags, key=lambda tag: (tag.reg_type, tag.address))
+        last_end = {}
+        for tag in self.tags:
+            if tag.address + tag.registers > 65536:
+                raise ValueError(f"{tag.dtype} at {tag.address} runs past the end of the address space")
+            if tag.address < last_end.get(tag.reg_type, 0):
+                raise ValueError(f"{tag.reg_type} tag at {tag.address} overlaps the previous one")
+            last_end[tag.reg_type] = tag.address + tag.registers
+
+    def __bool__(self):
+        return bool(self.tags)
+
+    def layout(self, reg_type, start, count):
+        """Map each value that lies inside ``start..start+count-1`` to ``offset -> (tag, value codec)``."""
+        cells = {}
+        for tag in self.tags:
+            if tag.reg_type != reg_type:
+                continue
+            codec = tag.value_codec
+            for offset in range(tag.address - start, tag.address - start + tag.registers, codec.registers):
+                if 0 <= offset and offset + codec.registers <= count:
+                    cells[offset] = (tag, codec)
+        return cells
+
+    def decode(self, reg_type, address, registers):
+        """Decode every tag that lies entirely inside a block read at ``address``.
+
+        Returns ``[(tag, values), ...]``, one codec call per tag.
+        """
+        decoded = []
+        end = address + len(registers)
+        for tag in self.tags:
+            if tag.reg_type == reg_type and address <= tag.address and tag.address + tag.registers <= end:
+                offset = tag.address - address
+                decoded.append((tag, tag.codec.decode(registers[offset:offset + tag.registers])))
+        return decoded
+
+
+def parse_tag_map(text):
+    """Parse a tag map (see the module docstring); raises ``ValueError`` naming the bad line."""
+    tags = []
+    for line_no, line in enumerate(text.splitlines(), start=1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        parts = line.split()
+        try:
+            if len(parts) < 3:
+                raise ValueError("expected <hr|ir> <address> <type>[*<count>] [order=..] [name=..]")
+            table = parts[0].lower()
+            if table not in TABLES:
+                raise ValueError(f"unknown table {parts[0]!r} (use {', '.join(TABLES)})")
+            address = int(parts[1])
+            if not 0 <= address <= 65535:
+                raise ValueError(f"address {address} is outside 0-65535")
+            dtype, _, count = parts[2].lower().partition("*")
+            count = int(count) if count else 1
+            if count < 1:
+                raise ValueError("count must be at least 1")
+            options = {}
+            for option in parts[3:]:
+                key, sep, value = option.partition("=")
+                if not sep or key not in ("order", "name"):
+                    raise ValueError(f"unknown option {option!r} (use order=, name=)")
+                options[key] = value.upper() if key == "order" else value
+            tag = Tag(TABLES[table], address, dtype, count, **options)
+            tag.codec   # compile now so bad types and orders are reported here
+        except ValueError as e:
+            raise ValueError(f"Line {line_no}: {e}") from None
+        tags.append(tag)
+    return TagMap(tags)
@@ -0,0 +1,79 @@
+"""Turn edited cells into the fewest legal Modbus write requests.
+
+Edits are given as runs ``(address, values)`` of consecutive addresses.
+Touching runs are joined, but gaps are never bridged the way
+``read_planner`` bridges them: writing an address the user did not edit
+would overwrite whatever another master stored there since it was last
+read. Runs longer than the protocol limit are split; a request that
+carries a single value uses the single-write function code (FC5/FC6), any
+longer one the multiple-write code (FC15/FC16).
+"""
+from dataclasses import dataclass
+
+# Maximum quantity per multiple-write request (Modbus Application Protocol v1.1b3).
+MAX_WRITE_COUNT = {
+    "Coils": 1968,              # FC15
+    "Holding Registers": 123,   # FC16
+}
+SINGLE_WRITE_FC = {"Coils": 5, "Holding Registers": 6}
+MULTIPLE_WRITE_FC = {"Coils": 15, "Holding Registers": 16}
+
+
+@dataclass
+class PlannedWrite:
+    reg_type: str
+    function_code: int
+    address: int
+    values: list
+
+    @property
+    def count(self):
+        return len(self.values)
+
+
+def dirty_runs(flags, values, start=0):
+    """Return ``[(address, values), ...]`` for each run of non-zero bytes in ``flags``.
+
+    ``flags`` is a ``bytearray`` with one byte per cell, ``values`` the
+    matching cell values and ``start`` the address of cell 0.
+    """
+    runs = []
+    i = flags.find(1)
+    while i != -1:
+        end = flags.find(0, i)
+        if end == -1:
+            end = len(flags)
+        runs.append((start + i, list(values[i:end])))
+        i = flags.find(1, end)
+    return runs
+
+
+def plan_writes(reg_type, runs, max_counts=MAX_WRITE_COUNT):
+    """Return the list of ``PlannedWrite`` for ``runs`` of ``reg_type``.
+
+    Raises ``ValueError`` for read-only register types and for runs that
+    run past address 65535.
+    """
+    if reg_type not in max_counts:
+        raise ValueError(f"{reg_type} are read-only")
+    limit = max_counts[reg_type]
+
+    merged = []
+    for address, values in sorted(runs, key=lambda run: run[0]):
+        values = list(values)
+        if not values:
+            continue
+        if address < 0 or address + len(values) > 65536:
+            raise ValueError(f"Write of {len(values)} values at {address} is outside 0-65535")
+        if merged and merged[-1][0] + len(merged[-1][1]) == address:
+            merged[-1][1].extend(values)
+        else:
+            merged.append((address, values))
+
+    plan = []
+    for address, values in merged:
+        for offset in range(0, len(values), limit):
+            chunk = values[offset:offset + limit]
+            fc = SINGLE_WRITE_FC[reg_type] if len(chunk) == 1 else MULTIPLE_WRITE_FC[reg_type]
+            plan.append(PlannedWrite(reg_type, fc, address + offset, chunk))
+    return plan